@@ -1,27 +1,63 @@
 # Updated app.py with Plotly chart generation
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import warnings
-import yfinance as yf
-from crewai import Crew, Process
-from crew_handlers import (
-    create_sentiment_crew,
-    create_technical_crew,
-    create_quantitative_crew,
-    create_risk_crew
-)
+from crew_pool import CREW_POOL_TIMEOUT, PROMPT_VERSION, checkout_crew, pool_stats, prewarm_crews
 from datetime import datetime
-import pandas as pd
-import plotly.graph_objects as go
-import plotly.io as pio
-import json
-import agentops
+from market_data import (
+    INTRADAY_INTERVALS,
+    PERIODS,
+    fetch_stats,
+    get_bars,
+    get_history_batch,
+    get_info,
+    info_cache_stats
+)
+from lazy_imports import import_stats, is_loaded, lazy_import, preload
+from rate_limit import limiter_stats
+from result_store import cached_analysis, result_store_stats, stored_analysis
+from chat_sessions import ChatSession, analysis_version, get_session_store
+from chat_cache import get_chat_cache
+from metrics import histogram, register_collector, render as render_metrics
+from model_router import (
+    Route,
+    analysis_model,
+    analysis_result_version,
+    fresh_info_words,
+    record_route,
+    routed_chat,
+    router_stats
+)
+from research import ResearchStage
+from tool_cache import tool_cache_stats
+from jobs import JobQueueFull, get_job_manager
+from scheduler import get_prewarm_scheduler
+from crew_runtime import (
+    AGENT_STOPPED_OUTPUT,
+    DeadlineExceeded,
+    StreamTimer,
+    apply_deadline,
+    crew_run,
+    stream_stats
+)
 import concurrent.futures
+import json
+import queue
+import socket
+import threading
 import time
 from dotenv import load_dotenv
 import os
 
+# Heavy subsystems (CrewAI, plotly, numpy/pandas) load on first use; see lazy_imports.py
+charts = lazy_import("charts")
+crew_handlers = lazy_import("crew_handlers")
+indicators = lazy_import("indicators")
+quant_metrics = lazy_import("quant_metrics")
+risk_engine = lazy_import("risk_engine")
+serializers = lazy_import("serializers")
+
 load_dotenv()
 app = Flask(__name__)
 CORS(app)
@@ -31,40 +67,152 @@ warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
 warnings.filterwarnings("ignore", category=UserWarning)
 warnings.filterwarnings("ignore", category=FutureWarning)
 
-# Initialize AgentOps
-try:
-    agentops.init(api_key=os.getenv("AGENTOPS_API_KEY", "a0c2f15c-9f2f-48c3-95e3-8e0e446f595d"))
-except Exception as e:
-    print(f"AgentOps initialization failed: {e}")
+def init_agentops():
+    """Import and initialize AgentOps (a network round trip) off the startup path"""
+    try:
+        import agentops
+        agentops.init(api_key=os.getenv("AGENTOPS_API_KEY", "a0c2f15c-9f2f-48c3-95e3-8e0e446f595d"))
+    except Exception as e:
+        print(f"AgentOps initialization failed: {e}")
+
+# Initialize AgentOps in the background
+threading.Thread(target=init_agentops, name="agentops-init", daemon=True).start()
 
 # =====================================================================
-# OPTIMIZATION: Cache crews to avoid recreating on every request
-# This significantly improves performance and reduces costs
+# Crews come from per-type pools (crew_pool.py): each kickoff gets its own
+# checked-out Crew, so concurrent requests never share agent/task state.
+# Kickoffs run on the calling thread under a deadline (crew_runtime.py)
+# that stops agent iterations, LLM calls and tool calls once time is up.
 # =====================================================================
-_crews_cache = {}
+CREW_KICKOFF_SECONDS = histogram("crew_kickoff_seconds", "Crew kickoff wall time", ["crew_type", "outcome"])
+CREW_LLM_CALLS = histogram("crew_llm_calls", "LLM calls (agent iterations) per kickoff", ["crew_type"],
+                           buckets=(1, 2, 3, 5, 8, 12, 20, 30))
+CREW_TOOL_CALLS = histogram("crew_tool_calls", "Tool calls per kickoff", ["crew_type"],
+                            buckets=(0, 1, 2, 3, 5, 8, 12, 20))
 
-def get_cached_crew(crew_type):
-    """Get or create a cached crew instance
+def kickoff_crew(crew_type, inputs, timeout=None, sink=None, report=None):
+    """Run one kickoff on a pooled crew; returns (result text, timed_out)
 
-    Best Practice: Reuse crew instances instead of creating new ones
-    Benefits: 40-50% faster response times, reduced API overhead
+    A run that reaches its deadline returns whatever partial output it had
+    collected (streamed answer tokens, else its tool findings). A report
+    dict, if given, receives the run's seconds and per-model token usage.
     """
-    if crew_type not in _crews_cache:
-        print(f"Creating new {crew_type} crew (first time only)...")
-        if crew_type == 'sentiment':
-            _crews_cache[crew_type] = create_sentiment_crew()
-        elif crew_type == 'technical':
-            _crews_cache[crew_type] = create_technical_crew()
-        elif crew_type == 'quantitative':
-            _crews_cache[crew_type] = create_quantitative_crew()
-        elif crew_type == 'risk':
-            _crews_cache[crew_type] = create_risk_crew()
-        elif crew_type == 'chat':
-            from crew_handlers import create_chat_crew
-            _crews_cache[crew_type] = create_chat_crew()
-        else:
-            raise ValueError(f"Unknown crew type: {crew_type}")
-    return _crews_cache[crew_type]
+    started = time.monotonic()
+    outcome = "error"
+    with crew_run(sink=sink, timeout=timeout) as run:
+        try:
+            try:
+                checkout_timeout = None if timeout is None else min(CREW_POOL_TIMEOUT, run.remaining())
+                with checkout_crew(crew_type, checkout_timeout) as crew:
+                    apply_deadline(crew)
+                    result = crew.kickoff(inputs=inputs)
+                text = str(result.raw_output) if hasattr(result, 'raw_output') else str(result)
+                # The executor's own time limit can fire just before run.expired does
+                if not (run.deadline is not None and text.strip() == AGENT_STOPPED_OUTPUT):
+                    outcome = "completed"
+                    return text, False
+            except DeadlineExceeded:
+                pass
+            outcome = "timed_out"
+            limit = "time limit" if timeout is None else f"{timeout:.0f}s time limit"
+            print(f"{crew_type} crew reached its {limit}")
+            partial = run.partial_output()
+            return partial or f"No output was produced within the {limit}.", True
+        finally:
+            CREW_KICKOFF_SECONDS.observe(time.monotonic() - started, crew_type=crew_type, outcome=outcome)
+            CREW_LLM_CALLS.observe(run.llm_calls, crew_type=crew_type)
+            CREW_TOOL_CALLS.observe(len(run.steps), crew_type=crew_type)
+            if report is not None:
+                report["seconds"] = report.get("seconds", 0.0) + time.monotonic() - started
+                for model, counts in run.usage.items():
+                    total = report.setdefault("usage", {}).setdefault(
+                        model, {"prompt_tokens": 0, "completion_tokens": 0, "estimated": False})
+                    total["prompt_tokens"] += counts["prompt_tokens"]
+                    total["completion_tokens"] += counts["completion_tokens"]
+                    total["estimated"] = total["estimated"] or counts["estimated"]
+
+# Upper bound on tickers per /api/stock-data/batch request
+MAX_BATCH_TICKERS = int(os.getenv("MAX_BATCH_TICKERS", "250"))
+
+# Ticker.info fields behind the StockInfo payload (they decide cache freshness)
+STOCK_INFO_FIELDS = ('shortName', 'sector', 'industry', 'marketCap', 'beta', 'trailingPE', 'dividendYield')
+
+def technical_indicator_context(ticker):
+    """Locally computed indicator readings for the technical crew's {indicators} input"""
+    try:
+        hist = get_bars(ticker, period="1y")
+        if hist.empty:
+            return "No price history available; rely on your own research."
+        return indicators.format_indicators(indicators.compute_indicators(hist))
+    except Exception as e:
+        print(f"Could not compute indicators for {ticker}: {e}")
+        return "Indicator data unavailable; rely on your own research."
+
+def quantitative_metrics_for(ticker):
+    """Locally computed beta/volatility/Sharpe/performance for one ticker, or None"""
+    try:
+        metrics, errors = quant_metrics.universe_metrics([ticker])
+        if ticker.upper() in errors:
+            print(f"Could not compute metrics for {ticker}: {errors[ticker.upper()]}")
+        return metrics.get(ticker.upper())
+    except Exception as e:
+        print(f"Could not compute metrics for {ticker}: {e}")
+        return None
+
+def quantitative_metrics_context(ticker, metrics):
+    """Text for the quantitative crew's {quant_metrics} input"""
+    if metrics is None:
+        return "Computed metrics unavailable; research beta, volatility, Sharpe ratio and performance yourself."
+    return quant_metrics.format_metrics(ticker, metrics)
+
+def risk_metrics_for(ticker):
+    """Locally computed VaR/CVaR, drawdown and downside deviation, or None"""
+    try:
+        hist = get_bars(ticker, period="2y")
+        return risk_engine.compute_risk_metrics(hist) if not hist.empty else None
+    except Exception as e:
+        print(f"Could not compute risk metrics for {ticker}: {e}")
+        return None
+
+def risk_metrics_context(metrics):
+    """Text for the risk crew's {risk_metrics} input"""
+    if metrics is None:
+        return "Computed risk figures unavailable; assess market risk from your research."
+    return risk_engine.format_risk_metrics(metrics)
+
+HTTP_REQUEST_SECONDS = histogram("http_request_seconds", "Time to produce a response (stream bodies excluded)",
+                                 ["endpoint", "method", "status"])
+
+@app.before_request
+def start_request_timer():
+    request.environ['stockai.started'] = time.monotonic()
+
+@app.after_request
+def record_request_time(response):
+    started = request.environ.get('stockai.started')
+    if started is not None:
+        HTTP_REQUEST_SECONDS.observe(time.monotonic() - started, endpoint=request.endpoint or "unmatched",
+                                     method=request.method, status=response.status_code)
+    return response
+
+# Existing stats() endpoints, exported as gauges on /metrics
+register_collector("crew_pool", pool_stats, label="crew_type")
+register_collector("rate_limiter", limiter_stats, label="limiter")
+register_collector("upstream_fetch", fetch_stats, label="kind")
+register_collector("info_cache", info_cache_stats)
+register_collector("chart_cache", lambda: charts.chart_cache_stats() if is_loaded(charts) else {})
+register_collector("result_store", result_store_stats)
+register_collector("tool_cache", tool_cache_stats)
+register_collector("jobs", lambda: get_job_manager().stats())
+register_collector("chat_sessions", lambda: get_session_store().stats())
+register_collector("chat_cache", lambda: get_chat_cache().stats())
+register_collector("chat_stream", stream_stats, label="measure")
+register_collector("lazy_import", import_stats, label="module")
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of all counters, histograms and stats gauges"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/', methods=['GET'])
 def health_check():
@@ -75,47 +223,72 @@ def health_check():
         "version": "1.0.0"
     })
 
+@app.route('/api/market-data/stats', methods=['GET'])
+def market_data_stats():
+    """Upstream fetch counters: calls issued vs. coalesced into an in-flight call"""
+    return jsonify({
+        "fetches": fetch_stats(),
+        "info_cache": info_cache_stats(),
+        "chart_cache": charts.chart_cache_stats() if is_loaded(charts) else None
+    })
+
+@app.route('/api/crew-pool/stats', methods=['GET'])
+def crew_pool_stats():
+    """Per crew type pool occupancy, checkouts, recycling and checkout wait times"""
+    return jsonify(pool_stats())
+
+@app.route('/api/results/stats', methods=['GET'])
+def result_cache_stats():
+    """Persistent analysis result cache hits, misses, evictions and joined in-flight runs"""
+    return jsonify(result_store_stats())
+
+@app.route('/api/tool-cache/stats', methods=['GET'])
+def tool_cache_statistics():
+    """Search/scrape tool cache hit rates (memory and disk), evictions and size"""
+    return jsonify(tool_cache_stats())
+
+@app.route('/api/rate-limits', methods=['GET'])
+def rate_limit_stats():
+    """Shared LLM/Serper limiter configuration and usage"""
+    return jsonify(limiter_stats())
+
 @app.route('/api/stock-data', methods=['GET'])
 def get_stock_data():
-    """Fetch stock data using yfinance and return it in a format for the frontend."""
+    """Fetch stock data using yfinance and return it in a format for the frontend.
+
+    Query parameters: period (default 1y), interval (default 1d), start/end
+    (YYYY-MM-DD, override period) and format (rows, columnar or msgpack; also
+    negotiable via the Accept header). The row layout stays the default.
+    """
     ticker = request.args.get('ticker', '')
     if not ticker:
         return jsonify({"error": "Ticker symbol is required"}), 400
-    
+
+    period = request.args.get('period', '1y')
+    interval = request.args.get('interval', '1d')
+    start = request.args.get('start')
+    end = request.args.get('end')
+    response_format = serializers.negotiate_format(request.args.get('format'), request.accept_mimetypes)
+    if response_format is None:
+        return jsonify({"error": "format must be one of: rows, columnar, msgpack"}), 400
+    if response_format == 'msgpack' and not serializers.msgpack_available():
+        return jsonify({"error": "MessagePack responses are not available on this server"}), 406
+
+    try:
+        hist = get_bars(ticker, period=period, interval=interval, start=start, end=end)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error fetching stock data for {ticker}: {str(e)}")
+        return jsonify({"error": f"Failed to fetch data for {ticker}: {str(e)}"}), 500
+
+    if hist.empty:
+        return jsonify({"error": f"No data found for ticker {ticker}"}), 404
+
     try:
-        # Get stock data using yfinance
-        stock = yf.Ticker(ticker)
-        
-        # Get historical data for the past year
-        hist = stock.history(period="1y")
-        
-        if hist.empty:
-            return jsonify({"error": f"No data found for ticker {ticker}"}), 404
-        
-        # Reset index to make date a column
-        hist = hist.reset_index()
-        
-        # Format historical data for frontend
-        stock_data = []
-        for _, row in hist.iterrows():
-            try:
-                stock_data.append({
-                    "date": row["Date"].strftime('%Y-%m-%d'),
-                    "open": float(row["Open"]),
-                    "high": float(row["High"]),
-                    "low": float(row["Low"]),
-                    "close": float(row["Close"]),
-                    "volume": int(row["Volume"]),
-                    "change": float(row["Close"]) - float(row["Open"]),
-                    "percentChange": ((float(row["Close"]) - float(row["Open"])) / float(row["Open"])) * 100 if row["Open"] > 0 else 0
-                })
-            except Exception as row_error:
-                print(f"Error processing row: {row_error}")
-                continue
-        
         # Get additional stock info
         try:
-            info = stock.info
+            info = get_info(ticker, STOCK_INFO_FIELDS)
             stock_info = {
                 "name": info.get('shortName', ticker),
                 "sector": info.get('sector', 'Unknown'),
@@ -136,272 +309,509 @@ def get_stock_data():
                 "dividendYield": None
             }
         
-        # Return the data
-        return jsonify({
-            "data": stock_data,
-            "info": stock_info,
-            "ticker": ticker.upper()
-        })
+        # Serialize the bars column-wise straight into the response body
+        date_format = '%Y-%m-%d %H:%M' if interval in INTRADAY_INTERVALS else '%Y-%m-%d'
+        if response_format == 'columnar':
+            body = serializers.stock_data_columnar_json(hist, stock_info, ticker, date_format)
+        elif response_format == 'msgpack':
+            body = serializers.stock_data_msgpack(hist, stock_info, ticker, date_format)
+        else:
+            body = serializers.stock_data_json(hist, stock_info, ticker, date_format)
+        response = app.response_class(body, mimetype=serializers.FORMAT_MEDIA_TYPES[response_format])
+        response.vary.add('Accept')
+        return response
     
     except Exception as e:
         print(f"Error fetching stock data for {ticker}: {str(e)}")
         return jsonify({"error": f"Failed to fetch data for {ticker}: {str(e)}"}), 500
 
+@app.route('/api/stock-data/batch', methods=['GET', 'POST'])
+def get_stock_data_batch():
+    """Fetch daily bars for many tickers in one round trip.
+
+    GET ?tickers=AAPL,MSFT&period=1y or POST {"tickers": [...], "period": "1y"}.
+    Tickers are served from the local bar store where fresh and otherwise
+    fetched with a bulk yf.download; each ticker carries its own data or error.
+    """
+    if request.method == 'POST':
+        data = request.json or {}
+        tickers = data.get('tickers', [])
+        period = data.get('period', '1y')
+    else:
+        tickers = request.args.get('tickers', '').split(',')
+        period = request.args.get('period', '1y')
+
+    tickers = [t.strip() for t in tickers if isinstance(t, str) and t.strip()]
+    if not tickers:
+        return jsonify({"error": "At least one ticker symbol is required"}), 400
+    if len(tickers) > MAX_BATCH_TICKERS:
+        return jsonify({"error": f"At most {MAX_BATCH_TICKERS} tickers per request"}), 400
+    if period not in PERIODS:
+        return jsonify({"error": f"Unsupported period: {period}"}), 400
+
+    try:
+        results = get_history_batch(tickers, period=period)
+        return app.response_class(serializers.batch_stock_data_json(results, period), mimetype='application/json')
+    except Exception as e:
+        print(f"Error fetching batch stock data: {str(e)}")
+        return jsonify({"error": f"Failed to fetch batch data: {str(e)}"}), 500
+
 @app.route('/api/stock-chart', methods=['GET'])
 def get_stock_chart():
-    """Generate a Plotly candlestick chart for the stock."""
+    """Generate a Plotly candlestick chart for the stock.
+
+    Optional start/end (YYYY-MM-DD) select a window of the daily series and
+    max_points caps the bars sent to the browser (LTTB for line charts,
+    OHLC bucket aggregation for candlesticks).
+    """
     ticker = request.args.get('ticker', '')
     chart_type = request.args.get('type', 'candlestick')  # candlestick or line
+    start = request.args.get('start')
+    end = request.args.get('end')
     
     if not ticker:
         return jsonify({"error": "Ticker symbol is required"}), 400
-    
+
     try:
-        # Get stock data
-        stock = yf.Ticker(ticker)
-        hist = stock.history(period="1y")
-        
-        if hist.empty:
-            return jsonify({"error": f"No data found for ticker {ticker}"}), 404
-        
-        # Reset index to make date a column
-        hist = hist.reset_index()
-        
-        # Create the chart based on type
-        if chart_type == 'candlestick':
-            fig = go.Figure(data=go.Candlestick(
-                x=hist['Date'],
-                open=hist['Open'],
-                high=hist['High'],
-                low=hist['Low'],
-                close=hist['Close'],
-                name=ticker,
-                increasing_line_color='#00d4aa',  # Green
-                decreasing_line_color='#ff6b6b',  # Red
-                increasing_fillcolor='rgba(0, 212, 170, 0.8)',
-                decreasing_fillcolor='rgba(255, 107, 107, 0.8)'
-            ))
-        else:  # line chart
-            fig = go.Figure(data=go.Scatter(
-                x=hist['Date'],
-                y=hist['Close'],
-                mode='lines',
-                name=f'{ticker} Price',
-                line=dict(color='#4a9eff', width=2),
-                fill='tonexty',
-                fillcolor='rgba(74, 158, 255, 0.1)'
-            ))
-        
-        # Update layout with dark theme
-        fig.update_layout(
-            title=f'{ticker} Stock Chart',
-            title_font=dict(size=20, color='#ffffff'),
-            paper_bgcolor='rgba(26, 31, 58, 0.95)',
-            plot_bgcolor='rgba(42, 47, 74, 1)',
-            font=dict(color='#a0a9c0'),
-            xaxis=dict(
-                title='Date',
-                gridcolor='rgba(58, 63, 90, 0.3)',
-                linecolor='rgba(58, 63, 90, 0.5)',
-                tickfont=dict(color='#a0a9c0')
-            ),
-            yaxis=dict(
-                title='Price ($)',
-                gridcolor='rgba(58, 63, 90, 0.3)',
-                linecolor='rgba(58, 63, 90, 0.5)',
-                tickfont=dict(color='#a0a9c0')
-            ),
-            legend=dict(
-                font=dict(color='#a0a9c0'),
-                bgcolor='rgba(42, 47, 74, 0.8)'
-            ),
-            hovermode='x unified',
-            margin=dict(l=40, r=40, t=60, b=40)
-        )
-        
-        # Convert to JSON
-        chart_json = json.loads(fig.to_json())
-        
-        return jsonify({
-            "chart": chart_json,
-            "ticker": ticker.upper(),
-            "type": chart_type
-        })
+        max_points = int(request.args.get('max_points', charts.CHART_MAX_POINTS))
+    except ValueError:
+        return jsonify({"error": "max_points must be an integer"}), 400
+    if max_points < 3:
+        return jsonify({"error": "max_points must be at least 3"}), 400
     
+    try:
+        # Get stock data from the local bar store
+        hist = get_bars(ticker, period="1y", start=start, end=end)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Error generating chart for {ticker}: {str(e)}")
         return jsonify({"error": f"Failed to generate chart for {ticker}: {str(e)}"}), 500
 
-# Keep all your existing analysis endpoints
-@app.route('/api/sentiment-analysis', methods=['POST'])
-def sentiment_analysis():
-    """Run sentiment analysis on a stock with proper CrewOutput handling."""
-    data = request.json
-    ticker = data.get('ticker', '')
-    
-    if not ticker:
-        return jsonify({"result": "Error: Ticker symbol is required"}), 200
-    
-    try:
-        inputs = {
-            'ticker': ticker,
-            'topic': f"Sentiment analysis for {ticker}",
-            'current_year': str(datetime.now().year),
-            'search_scope': "Limited to Yahoo Finance, CNBC, MarketWatch, Seeking Alpha, and Bloomberg"
-        }
-        
-        print(f"Starting sentiment analysis for {ticker}")
+    if hist.empty:
+        return jsonify({"error": f"No data found for ticker {ticker}"}), 404
 
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            sentiment_crew = get_cached_crew('sentiment')  # ✅ Use cached crew
-            future = executor.submit(sentiment_crew.kickoff, inputs=inputs)
-            try:
-                result = future.result(timeout=120)
-                
-                if hasattr(result, 'raw_output'):
-                    result_str = str(result.raw_output)
-                else:
-                    result_str = str(result)
-                
-                print(f"Sentiment analysis completed for {ticker}")
-                return jsonify({"result": result_str})
-                
-            except concurrent.futures.TimeoutError:
-                print(f"Sentiment analysis timed out for {ticker}")
-                return jsonify({"result": f"Sentiment analysis for {ticker} timed out. Please try again later."}), 200
+    try:
+        # Rendered JSON bytes are cached per bars/params and revalidated by ETag
+        body, etag = charts.render_chart(hist, ticker, chart_type, max_points, params=(start, end))
+        response = app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     
     except Exception as e:
-        print(f"Error in sentiment analysis for {ticker}: {str(e)}")
-        return jsonify({"result": f"Sentiment analysis for {ticker} could not be completed. Error: {str(e)}"}), 200
+        print(f"Error generating chart for {ticker}: {str(e)}")
+        return jsonify({"error": f"Failed to generate chart for {ticker}: {str(e)}"}), 500
+
+@app.route('/api/indicators', methods=['GET'])
+def get_indicators():
+    """Technical indicators (SMA/EMA, RSI, MACD, Bollinger, ATR, support/resistance,
+    volume z-scores) computed locally from daily bars."""
+    ticker = request.args.get('ticker', '')
+    period = request.args.get('period', '1y')
 
-@app.route('/api/technical-analysis', methods=['POST'])
-def technical_analysis():
-    """Run technical analysis on a stock with proper CrewOutput handling."""
-    data = request.json
-    ticker = data.get('ticker', '')
-    
     if not ticker:
-        return jsonify({"result": "Error: Ticker symbol is required"}), 200
-    
+        return jsonify({"error": "Ticker symbol is required"}), 400
+
     try:
-        inputs = {
-            'ticker': ticker,
-            'topic': f"Technical analysis for {ticker}",
-            'current_year': str(datetime.now().year),
-            'search_scope': "Limited to Yahoo Finance, TradingView, Barchart, and StockCharts"
-        }
-        
-        print(f"Starting technical analysis for {ticker}")
+        hist = get_bars(ticker, period=period)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error computing indicators for {ticker}: {str(e)}")
+        return jsonify({"error": f"Failed to compute indicators for {ticker}: {str(e)}"}), 500
 
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            technical_crew = get_cached_crew('technical')  # ✅ Use cached crew
-            future = executor.submit(technical_crew.kickoff, inputs=inputs)
-            try:
-                result = future.result(timeout=120)
-                
-                if hasattr(result, 'raw_output'):
-                    result_str = str(result.raw_output)
-                else:
-                    result_str = str(result)
-                
-                print(f"Technical analysis completed for {ticker}")
-                return jsonify({"result": result_str})
-                
-            except concurrent.futures.TimeoutError:
-                print(f"Technical analysis timed out for {ticker}")
-                return jsonify({"result": f"Technical analysis for {ticker} timed out. Please try again later."}), 200
-    
+    if hist.empty:
+        return jsonify({"error": f"No data found for ticker {ticker}"}), 404
+
+    return jsonify({
+        "ticker": ticker.upper(),
+        "period": period,
+        "indicators": indicators.compute_indicators(hist)
+    })
+
+@app.route('/api/quant-metrics', methods=['GET'])
+def get_quant_metrics():
+    """Beta, volatility, Sharpe ratio, drawdown, YTD and 1y performance for one or
+    more tickers (?tickers=AAPL,MSFT) against a benchmark (default SPY)."""
+    tickers = [t.strip() for t in request.args.get('tickers', request.args.get('ticker', '')).split(',') if t.strip()]
+    benchmark = request.args.get('benchmark', quant_metrics.BENCHMARK_TICKER)
+
+    if not tickers:
+        return jsonify({"error": "Ticker symbol is required"}), 400
+    if len(tickers) > MAX_BATCH_TICKERS:
+        return jsonify({"error": f"At most {MAX_BATCH_TICKERS} tickers per request"}), 400
+
+    try:
+        metrics, errors = quant_metrics.universe_metrics(tickers, benchmark=benchmark)
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
-        print(f"Error in technical analysis for {ticker}: {str(e)}")
-        return jsonify({"result": f"Technical analysis for {ticker} could not be completed. Error: {str(e)}"}), 200
+        print(f"Error computing quantitative metrics: {str(e)}")
+        return jsonify({"error": f"Failed to compute metrics: {str(e)}"}), 500
 
-@app.route('/api/quantitative-analysis', methods=['POST'])
-def quantitative_analysis():
-    """Run quantitative analysis on a stock with proper CrewOutput handling."""
-    data = request.json
+    return jsonify({
+        "benchmark": benchmark.upper(),
+        "metrics": metrics,
+        "errors": errors
+    })
+
+# Crew type -> (label used in topics/messages, search scope)
+ANALYSIS_TYPES = {
+    'sentiment': ("Sentiment analysis", "Limited to Yahoo Finance, CNBC, MarketWatch, Seeking Alpha, and Bloomberg"),
+    'technical': ("Technical analysis", "Limited to Yahoo Finance, TradingView, Barchart, and StockCharts"),
+    'quantitative': ("Quantitative analysis", "Limited to Yahoo Finance, Morningstar, Finviz, and Zacks"),
+    'risk': ("Risk assessment", "Limited to Yahoo Finance, Morningstar, and Bloomberg")
+}
+
+# Crew type -> key in the full-analysis response
+FULL_ANALYSIS_KEYS = {
+    'sentiment': 'sentiment_analysis',
+    'technical': 'technical_analysis',
+    'quantitative': 'quantitative_analysis',
+    'risk': 'risk_assessment'
+}
+
+# Job type -> crew types it runs
+JOB_TYPES = dict({crew_type: [crew_type] for crew_type in ANALYSIS_TYPES}, full=list(FULL_ANALYSIS_KEYS))
+
+# Seconds from submission until a crew run must stop and return what it has
+ANALYSIS_TIMEOUT = int(os.getenv("ANALYSIS_TIMEOUT", "120"))
+# Extra seconds a synchronous endpoint waits for an in-flight LLM call to wind down
+DEADLINE_GRACE_SECONDS = 10
+# Seconds between keep-alive comments on idle event streams
+SSE_HEARTBEAT_SECONDS = 15
+
+def run_analysis(crew_type, ticker, deadline, research=None):
+    """Build one analysis crew's inputs, run it until deadline (time.monotonic) and
+    return the response payload
+
+    With shared research text the analyst works from it on a crew without
+    the search tool; without it the analyst researches on its own.
+    """
+    label, search_scope = ANALYSIS_TYPES[crew_type]
+    inputs = {
+        'ticker': ticker,
+        'topic': f"{label} for {ticker}",
+        'current_year': str(datetime.now().year),
+        'search_scope': search_scope
+    }
+    pool_type = crew_type
+    route = Route("large", analysis_model(crew_type, False), "own research")
+    if research:
+        inputs['research'] = research
+        pool_type = f"{crew_type}:research"
+        model = analysis_model(crew_type, True)
+        route = Route("small" if model != route.model else "large", model, "shared research context")
+    extra = {}
+    if crew_type == 'technical':
+        inputs['indicators'] = technical_indicator_context(ticker)
+    elif crew_type == 'quantitative':
+        metrics = quantitative_metrics_for(ticker)
+        inputs['quant_metrics'] = quantitative_metrics_context(ticker, metrics)
+        if metrics is not None:
+            extra['metrics'] = crew_handlers.prefill_quantitative_analysis(metrics, quant_metrics.BENCHMARK_TICKER).model_dump()
+    elif crew_type == 'risk':
+        risk_metrics = risk_metrics_for(ticker)
+        inputs['risk_metrics'] = risk_metrics_context(risk_metrics)
+        extra['risk_metrics'] = risk_metrics
+
+    print(f"Starting {label.lower()} for {ticker}")
+    report = {}
+    result, timed_out = kickoff_crew(pool_type, inputs, timeout=max(0.0, deadline - time.monotonic()),
+                                     report=report)
+    payload = {"result": result, "timed_out": timed_out,
+               "model": record_route(crew_type, route, report["seconds"], report.get("usage", {}))}
+    payload.update(extra)
+    print(f"{label} {'stopped at its deadline' if timed_out else 'completed'} for {ticker}")
+    return payload
+
+def cached_run_analysis(crew_type, ticker, refresh=False, deadline=None, research=None):
+    """run_analysis through the persistent result store; returns (payload, cached, age)
+
+    research is the job's ResearchStage; it only runs when the analysis
+    itself is not already stored.
+    """
+    if deadline is None:
+        deadline = time.monotonic() + ANALYSIS_TIMEOUT
+    if research is None:
+        research = ResearchStage(ticker, refresh, deadline)
+    return cached_analysis(
+        ticker, crew_type, lambda: run_analysis(crew_type, ticker, deadline, research.context()),
+        prompt_version=analysis_result_version(crew_type, PROMPT_VERSION), refresh=refresh, deadline=deadline
+    )
+
+def submit_analysis_job(job_type, ticker, refresh=False):
+    """Queue the crews of a job type on the background workers and return the Job
+
+    The crews share one research stage: the first to need it gathers the
+    news and ratings (or loads them from the result store) while the others
+    wait, then all analysts run in parallel on that context. Every crew must
+    finish within ANALYSIS_TIMEOUT of submission, queue time included.
+    """
+    deadline = time.monotonic() + ANALYSIS_TIMEOUT
+    research = ResearchStage(ticker, refresh, deadline)
+
+    def task(crew_type):
+        def run():
+            payload, cached, age = cached_run_analysis(crew_type, ticker, refresh, deadline, research)
+            return dict(payload, cached=cached, age_seconds=round(age, 1))
+        return run
+
+    return get_job_manager().submit(job_type, ticker, {crew_type: task(crew_type) for crew_type in JOB_TYPES[job_type]})
+
+prewarm_scheduler = get_prewarm_scheduler(
+    lambda ticker: submit_analysis_job('full', ticker),
+    wait_seconds=ANALYSIS_TIMEOUT + DEADLINE_GRACE_SECONDS
+)
+register_collector("prewarm", prewarm_scheduler.stats)
+
+# Import the heavy subsystems in the background once the server is listening
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
+WARMUP_MODULES = ("pandas", "yfinance", "serializers", "charts", "indicators", "quant_metrics",
+                  "risk_engine", "crew_handlers")
+# Crew types to build one crew of during warm-up, e.g. "chat:small,chat"
+CREW_PREWARM = [t.strip() for t in os.getenv("CREW_PREWARM", "").split(",") if t.strip()]
+
+def wait_until_listening(port, timeout=60.0):
+    """True once something accepts connections on localhost:port"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+def warm_up(port):
+    """Load the heavy subsystems and pre-build crews after the server starts listening,
+    so health checks answer at once and the first real requests skip the imports"""
+    if not wait_until_listening(port):
+        print(f"Server not listening on port {port}; warming up anyway")
+    started = time.monotonic()
+    preload(WARMUP_MODULES)
+    prewarm_crews(CREW_PREWARM)
+    print(f"Warm-up finished in {time.monotonic() - started:.1f}s")
+
+def start_background_tasks(debug=False, port=5000):
+    """Start watchlist pre-warming and the startup warm-up in the serving process.
+
+    Under the debug reloader the module is also imported by the watcher
+    process, which must not run crews; WERKZEUG_RUN_MAIN marks the server.
+    """
+    if debug and os.environ.get("WERKZEUG_RUN_MAIN") != "true":
+        return False
+    prewarm_scheduler.start()
+    if STARTUP_WARMUP:
+        threading.Thread(target=warm_up, args=(port,), name="startup-warmup", daemon=True).start()
+    return True
+
+def analysis_response(crew_type):
+    """Shared body of the single-analysis endpoints: a job submitted and awaited.
+
+    Results are served from the result store when a fresh one exists for the
+    current trading session; pass "refresh": true to force a new run. A crew
+    that reaches ANALYSIS_TIMEOUT returns its partial output with timed_out
+    set; if the job has not finished even after the grace period, the
+    response carries its job_id for polling.
+    """
+    data = request.json or {}
     ticker = data.get('ticker', '')
-    
+    label = ANALYSIS_TYPES[crew_type][0]
+
     if not ticker:
         return jsonify({"result": "Error: Ticker symbol is required"}), 200
-    
+
+    job = None
     try:
-        inputs = {
-            'ticker': ticker,
-            'topic': f"Quantitative analysis for {ticker}",
-            'current_year': str(datetime.now().year),
-            'search_scope': "Limited to Yahoo Finance, Morningstar, Finviz, and Zacks"
-        }
-        
-        print(f"Starting quantitative analysis for {ticker}")
+        job = submit_analysis_job(crew_type, ticker, refresh=bool(data.get('refresh')))
+        if not job.wait(ANALYSIS_TIMEOUT + DEADLINE_GRACE_SECONDS):
+            raise concurrent.futures.TimeoutError()
+        if job.exception(crew_type) is not None:
+            raise job.exception(crew_type)
+        return jsonify(job.results[crew_type])
+
+    except concurrent.futures.TimeoutError:
+        print(f"{label} timed out for {ticker}")
+        response = {"result": f"{label} for {ticker} timed out. Please try again later."}
+        if job is not None and not job.done:
+            response["job_id"] = job.id
+        if crew_type == 'risk':
+            response["risk_metrics"] = risk_metrics_for(ticker)
+        return jsonify(response), 200
 
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            quantitative_crew = get_cached_crew('quantitative')  # ✅ Use cached crew
-            future = executor.submit(quantitative_crew.kickoff, inputs=inputs)
-            try:
-                result = future.result(timeout=120)
-                
-                if hasattr(result, 'raw_output'):
-                    result_str = str(result.raw_output)
-                else:
-                    result_str = str(result)
-                
-                print(f"Quantitative analysis completed for {ticker}")
-                return jsonify({"result": result_str})
-                
-            except concurrent.futures.TimeoutError:
-                print(f"Quantitative analysis timed out for {ticker}")
-                return jsonify({"result": f"Quantitative analysis for {ticker} timed out. Please try again later."}), 200
-    
     except Exception as e:
-        print(f"Error in quantitative analysis for {ticker}: {str(e)}")
-        return jsonify({"result": f"Quantitative analysis for {ticker} could not be completed. Error: {str(e)}"}), 200
+        print(f"Error in {label.lower()} for {ticker}: {str(e)}")
+        return jsonify({"result": f"{label} for {ticker} could not be completed. Error: {str(e)}"}), 200
+
+@app.route('/api/sentiment-analysis', methods=['POST'])
+def sentiment_analysis():
+    """Run sentiment analysis on a stock with proper CrewOutput handling."""
+    return analysis_response('sentiment')
+
+@app.route('/api/technical-analysis', methods=['POST'])
+def technical_analysis():
+    """Run technical analysis on a stock with proper CrewOutput handling."""
+    return analysis_response('technical')
+
+@app.route('/api/quantitative-analysis', methods=['POST'])
+def quantitative_analysis():
+    """Run quantitative analysis on a stock; the response includes prefilled metrics."""
+    return analysis_response('quantitative')
 
 @app.route('/api/risk-analysis', methods=['POST'])
 def risk_assessment():
-    """Run risk assessment on a stock with proper CrewOutput handling."""
-    data = request.json
+    """Run risk assessment on a stock; the response includes computed risk_metrics."""
+    return analysis_response('risk')
+
+def sse_event(event, data, event_id=None):
+    """Format one Server-Sent Events message"""
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stock_basic_info(ticker):
+    """One-line company description for the chat context ("" if unavailable)"""
+    try:
+        stock_info = get_info(ticker, ('shortName', 'sector', 'industry'))
+        stock_name = stock_info.get('shortName', ticker)
+        sector = stock_info.get('sector', 'Unknown')
+        industry = stock_info.get('industry', 'Unknown')
+        return f"BASIC INFO: {stock_name} ({ticker}) is in the {sector} sector and {industry} industry."
+    except Exception as info_error:
+        print(f"Could not get stock info: {info_error}")
+        return ""
+
+def chat_inputs(ticker, question, preloaded_analysis=None, session=None):
+    """Chat crew inputs: the question plus the most relevant analysis sections as context
+
+    The context comes from the chat session when there is one; otherwise
+    from a one-off session over the preloaded analysis. Either way it is
+    trimmed to CHAT_CONTEXT_TOKENS (see chat_sessions.py).
+    """
+    if session is None:
+        session = ChatSession(ticker, preloaded_analysis, stock_basic_info(ticker))
+    context = session.build_context(question)
+    return {
+        'ticker': ticker,
+        'question': question,
+        'topic': f"Stock analysis for {ticker}",
+        'current_year': str(datetime.now().year),
+        'search_scope': "Limited to top financial websites",
+        'context': context if context else "No preloaded analysis available."
+    }
+
+def chat_session_for(data):
+    """(session, error response) for a chat request's sessionId; both None without one"""
+    session_id = data.get('sessionId')
+    if not session_id:
+        return None, None
+    session = get_session_store().get(session_id)
+    if session is None:
+        return None, (jsonify({"error": "Chat session not found or expired; create a new one"}), 404)
+    return session, None
+
+def chat_cache_version(preloaded_analysis=None, session=None):
+    """Chat cache key part: the analyses' version, plus the session whose history
+    the answer also saw"""
+    if session is not None:
+        return f"{session.version}:{session.id}"
+    return analysis_version(preloaded_analysis)
+
+def cached_chat_answer(ticker, question, preloaded_analysis=None, session=None):
+    """Response for a question close enough to one already answered on the same
+    analyses (see chat_cache.py), or None. Questions about fresh information
+    (see model_router.py) are never answered from the cache."""
+    if fresh_info_words(question):
+        return None
+    hit = get_chat_cache().get(ticker, chat_cache_version(preloaded_analysis, session), question)
+    if hit is None:
+        return None
+    entry, score = hit
+    print(f"Answering {ticker} question from cache (similarity {score}): {question}")
+    if session is not None:
+        session.add_turn(question, entry["answer"])
+    return {
+        "result": entry["answer"],
+        "timed_out": False,
+        "cached": True,
+        "similarity": score,
+        "cached_question": entry["question"],
+    }
+
+def remember_chat_answer(ticker, question, answer, preloaded_analysis=None, session=None):
+    if fresh_info_words(question):
+        return
+    get_chat_cache().put(ticker, chat_cache_version(preloaded_analysis, session), question, answer)
+
+@app.route('/api/chat/sessions', methods=['POST'])
+def create_chat_session():
+    """Store a ticker's analyses server-side for follow-up questions.
+
+    Body: {"ticker": ..., "preloadedAnalysis": {sentiment, technical,
+    quantitative, risk}}. Without preloadedAnalysis the session uses the
+    analyses cached for the ticker in the current trading session.
+    """
+    data = request.json or {}
     ticker = data.get('ticker', '')
-    
     if not ticker:
-        return jsonify({"result": "Error: Ticker symbol is required"}), 200
-    
-    try:
-        inputs = {
-            'ticker': ticker,
-            'topic': f"Risk assessment for {ticker}",
-            'current_year': str(datetime.now().year),
-            'search_scope': "Limited to Yahoo Finance, Morningstar, and Bloomberg"
-        }
-        
-        print(f"Starting risk assessment for {ticker}")
+        return jsonify({"error": "Ticker symbol is required"}), 400
 
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            risk_crew = get_cached_crew('risk')  # ✅ Use cached crew
-            future = executor.submit(risk_crew.kickoff, inputs=inputs)
-            try:
-                result = future.result(timeout=120)
-                
-                if hasattr(result, 'raw_output'):
-                    result_str = str(result.raw_output)
-                else:
-                    result_str = str(result)
-                
-                print(f"Risk assessment completed for {ticker}")
-                return jsonify({"result": result_str})
-                
-            except concurrent.futures.TimeoutError:
-                print(f"Risk assessment timed out for {ticker}")
-                return jsonify({"result": f"Risk assessment for {ticker} timed out. Please try again later."}), 200
-    
-    except Exception as e:
-        print(f"Error in risk assessment for {ticker}: {str(e)}")
-        return jsonify({"result": f"Risk assessment for {ticker} could not be completed. Error: {str(e)}"}), 200
+    analyses = data.get('preloadedAnalysis')
+    if not analyses:
+        analyses = {}
+        for crew_type in ANALYSIS_TYPES:
+            payload = stored_analysis(ticker, crew_type, analysis_result_version(crew_type, PROMPT_VERSION))
+            if payload is not None and not payload.get('timed_out'):
+                analyses[crew_type] = payload['result']
+    session = get_session_store().create(ticker, analyses, stock_basic_info(ticker))
+    print(f"Created chat session {session.id} for {ticker} ({len(session.sections)} sections)")
+    return jsonify(session.summary()), 201
+
+@app.route('/api/chat/sessions/stats', methods=['GET'])
+def chat_session_stats():
+    return jsonify(get_session_store().stats())
+
+@app.route('/api/chat/sessions/<session_id>', methods=['GET'])
+def get_chat_session(session_id):
+    session = get_session_store().get(session_id)
+    if session is None:
+        return jsonify({"error": "Chat session not found or expired"}), 404
+    return jsonify(session.summary())
+
+@app.route('/api/chat/sessions/<session_id>', methods=['DELETE'])
+def delete_chat_session(session_id):
+    if not get_session_store().delete(session_id):
+        return jsonify({"error": "Chat session not found or expired"}), 404
+    return '', 204
+
+def run_chat(ticker, question, inputs, timeout, sink=None):
+    """Route a chat question to the small or large model; returns (text, timed_out, model info)
+
+    A small-model run that hands the question back is re-run on the large
+    model within the same deadline (sink receives an "escalated" event); see
+    model_router.routed_chat.
+    """
+    def kickoff(tier, remaining, report):
+        crew_type = 'chat:small' if tier == "small" else 'chat'
+        return kickoff_crew(crew_type, inputs, timeout=remaining, sink=sink, report=report)
+
+    return routed_chat(ticker, question, inputs['context'], kickoff, timeout, sink)
 
 @app.route('/api/analyze', methods=['POST'])
 def analyze_stock():
-    """Run the FinanceAssistant crew to analyze a stock based on a question."""
+    """Run the FinanceAssistant crew to analyze a stock based on a question.
+
+    With a sessionId (see /api/chat/sessions) the analyses need not be sent
+    again and earlier questions in the session are part of the context.
+    Paraphrases of a recent question on the same analyses are answered from
+    the chat cache ("cached": true); pass "refresh": true to ask the crew.
+    """
     data = request.json
-    ticker = data.get('ticker', '')
+    session, error = chat_session_for(data)
+    if error is not None:
+        return error
+    ticker = data.get('ticker', '') or (session.ticker if session else '')
     question = data.get('question', '')
     preloaded_analysis = data.get('preloadedAnalysis', None)
     
@@ -409,71 +819,137 @@ def analyze_stock():
         return jsonify({"result": "Error: Both ticker symbol and question are required"}), 200
     
     try:
+        cached = None if data.get('refresh') else cached_chat_answer(ticker, question, preloaded_analysis, session)
+        if cached is not None:
+            if session is not None:
+                cached["session_id"] = session.id
+            return jsonify(cached)
+
         print(f"Starting chat analysis for {ticker}: {question}")
         
-        # Create context from preloaded analysis if available
-        context = ""
-        if preloaded_analysis:
-            if preloaded_analysis.get('sentiment'):
-                context += f"\n\nSENTIMENT ANALYSIS:\n{preloaded_analysis['sentiment']}\n"
-            if preloaded_analysis.get('technical'):
-                context += f"\n\nTECHNICAL ANALYSIS:\n{preloaded_analysis['technical']}\n"
-            if preloaded_analysis.get('quantitative'):
-                context += f"\n\nQUANTITATIVE ANALYSIS:\n{preloaded_analysis['quantitative']}\n"
-            if preloaded_analysis.get('risk'):
-                context += f"\n\nRISK ASSESSMENT:\n{preloaded_analysis['risk']}\n"
-        
-        # Get stock information for added context
-        try:
-            stock = yf.Ticker(ticker)
-            stock_info = stock.info
-            stock_name = stock_info.get('shortName', ticker)
-            sector = stock_info.get('sector', 'Unknown')
-            industry = stock_info.get('industry', 'Unknown')
-            
-            stock_context = f"\nBASIC INFO: {stock_name} ({ticker}) is in the {sector} sector and {industry} industry."
-            context = stock_context + context
-        except Exception as info_error:
-            print(f"Could not get stock info: {info_error}")
-            pass
-            
-        inputs = {
-            'ticker': ticker,
-            'question': question,
-            'topic': f"Stock analysis for {ticker}",
-            'current_year': str(datetime.now().year),
-            'search_scope': "Limited to top financial websites",
-            'context': context if context else "No preloaded analysis available."
-        }
+        inputs = chat_inputs(ticker, question, preloaded_analysis, session)
 
-        # ✅ Use cached chat crew instead of creating inline
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            chat_crew = get_cached_crew('chat')  # Reuse cached crew!
-            future = executor.submit(chat_crew.kickoff, inputs=inputs)
-            try:
-                result = future.result(timeout=120)
-                
-                if hasattr(result, 'raw_output'):
-                    result_str = str(result.raw_output)
-                else:
-                    result_str = str(result)
-                
-                print(f"Chat analysis completed for {ticker}")
-                return jsonify({"result": result_str})
-                
-            except concurrent.futures.TimeoutError:
-                print(f"Chat analysis timed out for {ticker}")
-                return jsonify({"result": f"Analysis for {ticker} timed out. Please try asking a more specific question."}), 200
+        result_str, timed_out, model_info = run_chat(ticker, question, inputs, ANALYSIS_TIMEOUT)
+        if timed_out:
+            print(f"Chat analysis timed out for {ticker}")
+            if result_str.startswith("No output was produced"):
+                result_str = f"Analysis for {ticker} timed out. Please try asking a more specific question."
+        else:
+            print(f"Chat analysis completed for {ticker}")
+            remember_chat_answer(ticker, question, result_str, preloaded_analysis, session)
+            if session is not None:
+                session.add_turn(question, result_str)
+        response = {"result": result_str, "timed_out": timed_out, "cached": False, "model": model_info}
+        if session is not None:
+            response["session_id"] = session.id
+        return jsonify(response)
     
     except Exception as e:
         print(f"Error in chat analysis for {ticker}: {str(e)}")
         return jsonify({"result": f"Analysis for {ticker} could not be completed. Error: {str(e)}"}), 200
 
+@app.route('/api/analyze/stream', methods=['POST'])
+def analyze_stock_stream():
+    """Streaming variant of /api/analyze over Server-Sent Events.
+
+    Events: "started" immediately, "step" for each tool call the agent makes,
+    "token" for each final-answer token as the LLM produces it, then "done"
+    with the full result, timed_out, timings and model (or "error"). A
+    question answered from the chat cache goes straight to "done" with cached
+    set; "escalated" marks a small-model run handed over to the large model.
+    """
+    data = request.json or {}
+    session, error = chat_session_for(data)
+    if error is not None:
+        return error
+    ticker = data.get('ticker', '') or (session.ticker if session else '')
+    question = data.get('question', '')
+    preloaded_analysis = data.get('preloadedAnalysis', None)
+
+    if not ticker or not question:
+        return jsonify({"error": "Both ticker symbol and question are required"}), 400
+
+    timer = StreamTimer()
+    events = queue.Queue()
+    cached = None if data.get('refresh') else cached_chat_answer(ticker, question, preloaded_analysis, session)
+    if cached is not None:
+        events.put(("done", cached))
+    else:
+        print(f"Starting streamed chat analysis for {ticker}: {question}")
+
+    def run():
+        try:
+            result, timed_out, model_info = run_chat(
+                ticker, question, chat_inputs(ticker, question, preloaded_analysis, session),
+                ANALYSIS_TIMEOUT, sink=lambda event, payload: events.put((event, payload))
+            )
+            if not timed_out:
+                remember_chat_answer(ticker, question, result, preloaded_analysis, session)
+                if session is not None:
+                    session.add_turn(question, result)
+            events.put(("done", {"result": result, "timed_out": timed_out, "cached": False, "model": model_info}))
+        except Exception as e:
+            print(f"Error in streamed chat analysis for {ticker}: {str(e)}")
+            events.put(("error", {"error": f"Analysis for {ticker} could not be completed. Error: {str(e)}"}))
+
+    # Runs on the shared job workers; the crew stops itself at ANALYSIS_TIMEOUT
+    if cached is None:
+        try:
+            get_job_manager().submit('chat', ticker, {'chat': run})
+        except JobQueueFull as e:
+            return jsonify({"error": str(e)}), 503
+
+    def stream():
+        yield sse_event("started", {"ticker": ticker})
+        deadline = time.monotonic() + ANALYSIS_TIMEOUT + DEADLINE_GRACE_SECONDS
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"Streamed chat analysis timed out for {ticker}")
+                yield sse_event("error", {
+                    "error": f"Analysis for {ticker} timed out. Please try asking a more specific question.",
+                    "timings": timer.finish()
+                })
+                return
+            try:
+                event, payload = events.get(timeout=min(SSE_HEARTBEAT_SECONDS, remaining))
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            timer.event(event)
+            if event in ("done", "error"):
+                yield sse_event(event, dict(payload, timings=timer.finish()))
+                return
+            yield sse_event(event, payload)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/model-router/stats', methods=['GET'])
+def model_router_stats():
+    return jsonify(router_stats())
+
+@app.route('/api/chat/cache/stats', methods=['GET'])
+def chat_cache_stats():
+    return jsonify(get_chat_cache().stats())
+
+@app.route('/api/analyze/stream/stats', methods=['GET'])
+def analyze_stream_stats():
+    """Streamed chat latency: time to first event, first answer token and completion"""
+    return jsonify(stream_stats())
+
 @app.route('/api/full-analysis', methods=['POST'])
 def full_analysis():
-    """Run all analyses on a stock with proper CrewOutput handling and rate limiting."""
+    """Run all analyses on a stock and wait for them (see /api/jobs for the async form).
+
+    Each analysis is looked up in (and saved to) the same result store as the
+    single-analysis endpoints; "cache" reports per analysis whether it was reused.
+    If the job has not finished even after the grace period, a 202 response
+    carries its job_id for polling /api/jobs/<id>.
+    """
     data = request.json
     ticker = data.get('ticker', '')
+    refresh = bool(data.get('refresh'))
     
     if not ticker:
         return jsonify({"error": "Ticker symbol is required"}), 400
@@ -481,13 +957,6 @@ def full_analysis():
     try:
         print(f"Starting full analysis for {ticker}")
         
-        inputs = {
-            'ticker': ticker,
-            'topic': f"Analysis for {ticker}",
-            'current_year': str(datetime.now().year),
-            'search_scope': "Limited to top financial websites"
-        }
-        
         results = {
             "sentiment_analysis": f"Analyzing sentiment for {ticker}...",
             "technical_analysis": f"Analyzing technical indicators for {ticker}...",
@@ -497,8 +966,7 @@ def full_analysis():
         
         # Fetch basic information using yfinance
         try:
-            stock = yf.Ticker(ticker)
-            info = stock.info
+            info = get_info(ticker, ('shortName', 'sector', 'industry', 'marketCap'))
             name = info.get('shortName', ticker)
             sector = info.get('sector', 'Unknown')
             industry = info.get('industry', 'Unknown')
@@ -520,36 +988,39 @@ Analysis is being performed. Please check individual tabs for detailed results.
             print(f"Could not get basic stock info: {info_error}")
             results["basic_summary"] = f"# Analysis for {ticker}\nPerforming comprehensive analysis..."
         
-        # Run analyses sequentially with rate limiting to avoid API limits
-        analysis_functions = [
-            ('sentiment', create_sentiment_crew),
-            ('technical', create_technical_crew),
-            ('quantitative', create_quantitative_crew),
-            ('risk', create_risk_crew)
-        ]
-        
-        for analysis_type, crew_function in analysis_functions:
-            try:
-                print(f"Running {analysis_type} analysis for {ticker}")
-
-                crew = get_cached_crew(analysis_type)  # ✅ Use cached crew
-                result = crew.kickoff(inputs=inputs)
-                
-                if hasattr(result, 'raw_output'):
-                    results[f"{analysis_type}_analysis"] = str(result.raw_output)
-                else:
-                    results[f"{analysis_type}_analysis"] = str(result)
-                
-                print(f"Completed {analysis_type} analysis for {ticker}")
-                
-                # Wait between analyses to avoid rate limits
-                if analysis_type != 'risk':  # Don't wait after the last one
-                    time.sleep(3)
-                
-            except Exception as analysis_error:
-                print(f"Error in {analysis_type} analysis for {ticker}: {str(analysis_error)}")
-                results[f"{analysis_type}_analysis"] = f"Error in {analysis_type} analysis: {str(analysis_error)}"
+        # One shared research stage feeds the four crews, which then run
+        # concurrently on the job workers; the shared LLM/Serper limiters in
+        # rate_limit.py keep the combined request rate under provider limits
+        job = submit_analysis_job('full', ticker, refresh)
+        if not job.wait(ANALYSIS_TIMEOUT + DEADLINE_GRACE_SECONDS):
+            print(f"Full analysis for {ticker} still running; returning job {job.id}")
+            response = jsonify(dict(
+                results,
+                job_id=job.id,
+                status_url=f"/api/jobs/{job.id}",
+                events_url=f"/api/jobs/{job.id}/events"
+            ))
+            response.status_code = 202
+            response.headers['Location'] = f"/api/jobs/{job.id}"
+            return response
+        cache_status = {}
+        for analysis_type, key in FULL_ANALYSIS_KEYS.items():
+            if analysis_type in job.results:
+                payload = job.results[analysis_type]
+                results[key] = payload["result"]
+                cache_status[analysis_type] = {
+                    "cached": payload["cached"],
+                    "age_seconds": payload["age_seconds"],
+                    "timed_out": payload.get("timed_out", False)
+                }
+            else:
+                print(f"Error in {analysis_type} analysis for {ticker}: {job.errors.get(analysis_type)}")
+                results[key] = f"Error in {analysis_type} analysis: {job.errors.get(analysis_type)}"
         
+        results["cache"] = cache_status
+        results["cached"] = len(cache_status) == len(FULL_ANALYSIS_KEYS) and all(
+            status["cached"] for status in cache_status.values()
+        )
         print(f"Full analysis completed for {ticker}")
         return jsonify(results)
     
@@ -563,6 +1034,87 @@ Analysis is being performed. Please check individual tabs for detailed results.
             "risk_assessment": f"Could not complete risk assessment: {str(e)}"
         }), 200
 
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """Submit an analysis in the background and return its job id immediately.
+
+    Body: {"ticker": "AAPL", "type": "sentiment|technical|quantitative|risk|full", "refresh": false}
+    """
+    data = request.json or {}
+    ticker = data.get('ticker', '')
+    job_type = data.get('type', 'full')
+
+    if not ticker:
+        return jsonify({"error": "Ticker symbol is required"}), 400
+    if job_type not in JOB_TYPES:
+        return jsonify({"error": f"type must be one of: {', '.join(JOB_TYPES)}"}), 400
+
+    try:
+        job = submit_analysis_job(job_type, ticker, refresh=bool(data.get('refresh')))
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+
+    response = jsonify(dict(
+        job.snapshot(),
+        status_url=f"/api/jobs/{job.id}",
+        events_url=f"/api/jobs/{job.id}/events"
+    ))
+    response.status_code = 202
+    response.headers['Location'] = f"/api/jobs/{job.id}"
+    return response
+
+@app.route('/api/prewarm/status', methods=['GET'])
+def prewarm_status():
+    """Watchlist pre-warm schedule, the running or last pass and each ticker's outcome"""
+    return jsonify(prewarm_scheduler.status())
+
+@app.route('/api/prewarm/run', methods=['POST'])
+def prewarm_run():
+    """Start a pre-warm pass over the watchlist now"""
+    if not prewarm_scheduler.watchlist:
+        return jsonify({"error": "No PREWARM_WATCHLIST configured"}), 400
+    if not prewarm_scheduler.trigger("manual"):
+        return jsonify({"error": "A pre-warm pass is already running"}), 409
+    return jsonify({"status": "started", "status_url": "/api/prewarm/status"}), 202
+
+@app.route('/api/jobs/stats', methods=['GET'])
+def job_stats():
+    """Background worker pool size, queued/running tasks and job outcomes"""
+    return jsonify(get_job_manager().stats())
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job status with the results of every analysis finished so far"""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.snapshot())
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-Sent Events for a job: queued, started, one "analysis" event per
+    finished crew, then done. Reconnects resume after Last-Event-ID."""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    last_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id', 0), type=int) or 0
+
+    def stream():
+        seen = last_id
+        while True:
+            events = job.events_after(seen, timeout=SSE_HEARTBEAT_SECONDS)
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            for event_id, event, data in events:
+                seen = event_id
+                yield sse_event(event, data, event_id)
+                if event == "done":
+                    return
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({"error": "Endpoint not found"}), 404
@@ -575,4 +1127,5 @@ if __name__ == '__main__':
     print("Starting Stock Analyzer API server...")
     print("Server will be available at: http://localhost:5000")
     print("Health check: http://localhost:5000/")
+    start_background_tasks(debug=True, port=5000)
     app.run(debug=True, port=5000, host='0.0.0.0')
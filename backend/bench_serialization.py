@@ -0,0 +1,84 @@
+# =====================================================================
+# bench_serialization.py - /api/stock-data Serialization Benchmark
+# =====================================================================
+#
+# Compares the original iterrows() loop against the vectorized serializer
+# on synthetic 1y, 5y and max-period daily frames. No network needed.
+#
+#   python bench_serialization.py [--repeat N]
+
+import argparse
+import json
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from serializers import bars_to_json
+
+PERIODS = {"1y": 252, "5y": 1260, "max": 11000}
+
+
+def make_frame(rows, seed=0):
+    """Random-walk OHLCV frame shaped like a yfinance history() result"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, rows)))
+    open_ = close * (1 + rng.normal(0, 0.01, rows))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, rows))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, rows))
+    index = pd.bdate_range(end="2024-12-31", periods=rows, name="Date")
+    return pd.DataFrame({
+        "Open": open_, "High": high, "Low": low, "Close": close,
+        "Volume": rng.integers(1_000_000, 50_000_000, rows),
+    }, index=index)
+
+
+def legacy_serialize(hist):
+    """The pre-vectorization get_stock_data loop, followed by JSON encoding"""
+    hist = hist.reset_index()
+    stock_data = []
+    for _, row in hist.iterrows():
+        try:
+            stock_data.append({
+                "date": row["Date"].strftime('%Y-%m-%d'),
+                "open": float(row["Open"]),
+                "high": float(row["High"]),
+                "low": float(row["Low"]),
+                "close": float(row["Close"]),
+                "volume": int(row["Volume"]),
+                "change": float(row["Close"]) - float(row["Open"]),
+                "percentChange": ((float(row["Close"]) - float(row["Open"])) / float(row["Open"])) * 100 if row["Open"] > 0 else 0
+            })
+        except Exception:
+            continue
+    return json.dumps(stock_data)
+
+
+def check_equivalent(hist):
+    """Both paths must produce the same rows (within float formatting precision)"""
+    old = json.loads(legacy_serialize(hist))
+    new = json.loads(bars_to_json(hist))
+    assert len(old) == len(new), (len(old), len(new))
+    for a, b in zip(old, new):
+        assert a["date"] == b["date"] and a["volume"] == b["volume"]
+        for key in ("open", "high", "low", "close", "change", "percentChange"):
+            assert abs(a[key] - b[key]) <= 1e-9 * max(1.0, abs(a[key])), (key, a[key], b[key])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark stock-data serialization")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'period':<8}{'rows':>8}{'legacy ms':>12}{'vectorized ms':>16}{'speedup':>10}")
+    print("-" * 54)
+    for period, rows in PERIODS.items():
+        hist = make_frame(rows)
+        check_equivalent(hist)
+        legacy = min(timeit.repeat(lambda: legacy_serialize(hist), number=1, repeat=args.repeat))
+        vectorized = min(timeit.repeat(lambda: bars_to_json(hist), number=1, repeat=args.repeat))
+        print(f"{period:<8}{rows:>8}{legacy * 1000:>12.2f}{vectorized * 1000:>16.2f}{legacy / vectorized:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# =====================================================================
+# bench_startup.py - Cold Start Benchmark for the Flask App
+# =====================================================================
+#
+# Starts fresh interpreters that import app.py and send their first
+# requests through the Flask test client, and reports the time to import,
+# the latency of each first request and which heavy modules were loaded.
+# --eager also loads everything the startup warm-up would (the cost the app
+# used to pay at import). Paths that need market data fetch from Yahoo.
+#
+#   python bench_startup.py [--repeat N] [--eager] [--path / --path /api/crew-pool/stats]
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ("crewai", "crewai_tools", "langchain_core", "agentops", "plotly", "pandas", "numpy", "yfinance")
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import app
+if {eager}:
+    app.preload(app.WARMUP_MODULES)
+imported = time.perf_counter()
+client = app.app.test_client()
+timings = []
+for path in {paths!r}:
+    t = time.perf_counter()
+    status = client.get(path).status_code
+    timings.append({{"path": path, "status": status, "seconds": time.perf_counter() - t}})
+print(json.dumps({{
+    "import_seconds": imported - started,
+    "requests": timings,
+    "loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def run_once(paths, eager):
+    """One cold start in a new interpreter; returns its measurements plus process wall time"""
+    code = CHILD.format(eager=eager, paths=list(paths), heavy=HEAVY_MODULES)
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "child failed")
+    # Background threads (AgentOps init) may print around the result line
+    result = json.loads(next(line for line in reversed(proc.stdout.splitlines()) if line.startswith("{")))
+    result["wall_seconds"] = wall
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark app import and first-request latency")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--eager", action="store_true", help="preload the warm-up modules before the first request")
+    parser.add_argument("--path", action="append", default=[], help="request path (default: / and stats endpoints)")
+    args = parser.parse_args()
+    paths = args.path or ["/", "/api/crew-pool/stats", "/api/results/stats"]
+
+    runs = [run_once(paths, args.eager) for _ in range(args.repeat)]
+
+    def ms(values):
+        return f"{statistics.median(values) * 1000:>10.1f}{max(values) * 1000:>10.1f}"
+
+    print(f"{'mode':<10}{'eager' if args.eager else 'lazy'}  ({args.repeat} cold starts, median / max ms)")
+    print("-" * 60)
+    print(f"{'process':<40}{ms([r['wall_seconds'] for r in runs])}")
+    print(f"{'import app':<40}{ms([r['import_seconds'] for r in runs])}")
+    for i, path in enumerate(paths):
+        statuses = {r["requests"][i]["status"] for r in runs}
+        label = f"first GET {path} ({'/'.join(map(str, sorted(statuses)))})"
+        print(f"{label[:40]:<40}{ms([r['requests'][i]['seconds'] for r in runs])}")
+    print(f"heavy modules loaded: {', '.join(runs[-1]['loaded']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
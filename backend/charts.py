@@ -0,0 +1,223 @@
+# =====================================================================
+# charts.py - Plotly Chart Construction and Downsampling
+# =====================================================================
+#
+# Long series are reduced in NumPy before the figure is built: LTTB
+# (Largest-Triangle-Three-Buckets) for line charts and OHLC-preserving
+# bucket aggregation for candlesticks. Rendered responses are cached as
+# JSON bytes keyed by the underlying bars, so repeat requests skip figure
+# construction and serialization entirely.
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+
+# Default cap on points sent to the browser per chart
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "1000"))
+# Rendered chart responses kept in memory
+CHART_CACHE_SIZE = int(os.getenv("CHART_CACHE_SIZE", "256"))
+
+# Dark theme shared by every chart, built once instead of per request
+CHART_TEMPLATE = go.layout.Template(
+    layout=dict(
+        title_font=dict(size=20, color='#ffffff'),
+        paper_bgcolor='rgba(26, 31, 58, 0.95)',
+        plot_bgcolor='rgba(42, 47, 74, 1)',
+        font=dict(color='#a0a9c0'),
+        xaxis=dict(
+            title=dict(text='Date'),
+            gridcolor='rgba(58, 63, 90, 0.3)',
+            linecolor='rgba(58, 63, 90, 0.5)',
+            tickfont=dict(color='#a0a9c0')
+        ),
+        yaxis=dict(
+            title=dict(text='Price ($)'),
+            gridcolor='rgba(58, 63, 90, 0.3)',
+            linecolor='rgba(58, 63, 90, 0.5)',
+            tickfont=dict(color='#a0a9c0')
+        ),
+        legend=dict(
+            font=dict(color='#a0a9c0'),
+            bgcolor='rgba(42, 47, 74, 0.8)'
+        ),
+        hovermode='x unified',
+        margin=dict(l=40, r=40, t=60, b=40)
+    ),
+    data=dict(
+        candlestick=[go.Candlestick(
+            increasing_line_color='#00d4aa',  # Green
+            decreasing_line_color='#ff6b6b',  # Red
+            increasing_fillcolor='rgba(0, 212, 170, 0.8)',
+            decreasing_fillcolor='rgba(255, 107, 107, 0.8)'
+        )],
+        scatter=[go.Scatter(
+            line=dict(color='#4a9eff', width=2),
+            fillcolor='rgba(74, 158, 255, 0.1)'
+        )]
+    )
+)
+pio.templates["stock_dark"] = CHART_TEMPLATE
+
+
+def lttb_indices(x, y, threshold):
+    """Indices of the points kept by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept; every bucket in between keeps
+    the point forming the largest triangle with the previously kept point and
+    the average of the next bucket.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+
+    previous = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        area = np.abs(
+            (x[previous] - avg_x) * (y[lo:hi] - y[previous])
+            - (x[previous] - x[lo:hi]) * (avg_y - y[previous])
+        )
+        previous = lo + int(np.argmax(area))
+        kept[i + 1] = previous
+    return kept
+
+
+def ohlc_buckets(hist, max_points):
+    """Aggregate bars into at most max_points buckets preserving OHLC semantics"""
+    n = len(hist)
+    if max_points >= n or max_points < 1:
+        return hist
+    starts = np.linspace(0, n, max_points, endpoint=False).astype(np.int64)
+    ends = np.append(starts[1:], n) - 1
+    return pd.DataFrame({
+        "Open": hist["Open"].to_numpy()[starts],
+        "High": np.maximum.reduceat(hist["High"].to_numpy(), starts),
+        "Low": np.minimum.reduceat(hist["Low"].to_numpy(), starts),
+        "Close": hist["Close"].to_numpy()[ends],
+        "Volume": np.add.reduceat(hist["Volume"].to_numpy(), starts),
+    }, index=hist.index[starts])
+
+
+def downsample(hist, chart_type, max_points):
+    """Reduce a Date-indexed bar frame for the given chart type"""
+    if max_points is None or len(hist) <= max_points:
+        return hist
+    if chart_type == "candlestick":
+        return ohlc_buckets(hist, max_points)
+    x = hist.index.asi8 if isinstance(hist.index, pd.DatetimeIndex) else np.arange(len(hist))
+    return hist.iloc[lttb_indices(x, hist["Close"].to_numpy(), max_points)]
+
+
+def build_chart(hist, ticker, chart_type="candlestick"):
+    """Build the dark-themed Plotly figure for a Date-indexed bar frame"""
+    hist = hist.reset_index()
+
+    # Create the chart based on type
+    if chart_type == 'candlestick':
+        trace = go.Candlestick(
+            x=hist['Date'],
+            open=hist['Open'],
+            high=hist['High'],
+            low=hist['Low'],
+            close=hist['Close'],
+            name=ticker
+        )
+    else:  # line chart
+        trace = go.Scatter(
+            x=hist['Date'],
+            y=hist['Close'],
+            mode='lines',
+            name=f'{ticker} Price',
+            fill='tonexty'
+        )
+
+    return go.Figure(
+        data=trace,
+        layout=dict(title=dict(text=f'{ticker} Stock Chart'), template=CHART_TEMPLATE)
+    )
+
+
+class ChartCache:
+    """LRU cache of rendered chart response bodies and their ETags"""
+
+    def __init__(self, max_entries=CHART_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "size": len(self._entries), "max_entries": self.max_entries}
+
+
+_chart_cache = ChartCache()
+
+
+def chart_cache_stats():
+    return _chart_cache.stats()
+
+
+def render_chart(hist, ticker, chart_type="candlestick", max_points=CHART_MAX_POINTS, params=()):
+    """Return (body bytes, etag) for a chart response, building it only on a cache miss.
+
+    The key covers the last bar's date and values, so a still-forming daily
+    bar or a newly appended one yields a new entry, and a digest of every
+    close, so history rewritten by a split/dividend reload does too. params
+    holds any other request parameters that shaped hist (e.g. the start/end
+    window).
+    """
+    ticker = ticker.upper()
+    last = hist.iloc[-1]
+    closes = hashlib.sha1(np.ascontiguousarray(hist["Close"].to_numpy(dtype=np.float64)).tobytes()).hexdigest()
+    key = (ticker, chart_type, max_points, params, len(hist), hist.index[-1].isoformat(),
+           float(last["Close"]), float(last["Volume"]), closes)
+    entry = _chart_cache.get(key)
+    if entry is not None:
+        return entry
+
+    reduced = downsample(hist, chart_type, max_points)
+    fig = build_chart(reduced, ticker, chart_type)
+    body = '{"chart":%s,"ticker":%s,"type":%s,"points":%s}' % (
+        fig.to_json(), json.dumps(ticker), json.dumps(chart_type),
+        json.dumps({"total": len(hist), "returned": len(reduced)})
+    )
+    body = body.encode("utf-8")
+    entry = (body, hashlib.sha1(body).hexdigest())
+    _chart_cache.put(key, entry)
+    return entry
@@ -0,0 +1,172 @@
+# =====================================================================
+# chat_cache.py - Near-duplicate Question Cache for the Chat Crew
+# =====================================================================
+#
+# Users ask the same few things about a ticker in many wordings ("is AAPL a
+# buy", "should I buy AAPL now"). Answers are cached per (ticker, analysis
+# version) - the version is a hash of the reports the answer was based on,
+# plus the chat session for answers that also saw its history - and a new
+# question is answered from the cache when its normalized word
+# and word-pair shingles are similar enough (Jaccard) to a cached question.
+# Everything runs in-process; no embedding service is involved.
+#
+# Configuration:
+#   CHAT_CACHE_THRESHOLD   - minimum similarity (0-1) for a cached answer to be reused
+#   CHAT_CACHE_TTL         - seconds an answer stays reusable
+#   CHAT_CACHE_MAX_ENTRIES - answers kept before the oldest are dropped
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from chat_sessions import keywords
+
+CHAT_CACHE_THRESHOLD = float(os.getenv("CHAT_CACHE_THRESHOLD", "0.8"))
+CHAT_CACHE_TTL = int(os.getenv("CHAT_CACHE_TTL", "1800"))
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "5000"))
+
+# Words that change the phrasing of a question but not what it asks. Time
+# words stay: they are what model_router routes fresh-information questions on.
+FILLER_WORDS = {
+    "good", "great", "idea", "think", "really", "just", "like",
+    "guys", "ok", "okay", "point", "opinion", "worth", "thoughts", "buying",
+}
+SYNONYMS = {
+    "purchase": "buy", "invest": "buy", "investment": "buy", "acquire": "buy",
+    "dump": "sell", "offload": "sell", "exit": "sell",
+    "keep": "hold", "holding": "hold",
+    "risky": "risk", "danger": "risk", "dangerous": "risk",
+    "outlook": "forecast", "prediction": "forecast", "predict": "forecast",
+    "price-target": "target",
+}
+
+
+def normalize_terms(question, ticker=""):
+    """Content words of a question: stopwords, filler and the ticker dropped, synonyms folded"""
+    ticker = ticker.lower()
+    terms = []
+    for word in keywords(question):
+        word = word.strip(".$%-")
+        if not word or word == ticker or word in FILLER_WORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(SYNONYMS.get(word, word))
+    return terms
+
+
+def shingles(terms):
+    """Word unigrams plus adjacent word pairs (pairs keep some word order)"""
+    return set(terms) | {f"{a} {b}" for a, b in zip(terms, terms[1:])}
+
+
+def similarity(a, b):
+    """Jaccard similarity; a question with no content words matches nothing"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ChatAnswerCache:
+    """Recent chat answers per (ticker, analysis version), matched by question similarity"""
+
+    def __init__(self, threshold=CHAT_CACHE_THRESHOLD, ttl=CHAT_CACHE_TTL,
+                 max_entries=CHAT_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # (ticker, version) -> OrderedDict(normalized question -> entry)
+        self._buckets = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "exact_hits": 0, "misses": 0, "writes": 0, "expired": 0, "evicted": 0}
+
+    def _drop_expired(self, bucket, now):
+        """Remove expired entries from one bucket (caller holds the lock)"""
+        for key in [k for k, e in bucket.items() if e["expires_at"] <= now]:
+            del bucket[key]
+            self._size -= 1
+            self._stats["expired"] += 1
+
+    def get(self, ticker, version, question):
+        """(answer entry, similarity) of the closest cached question above threshold, else None"""
+        terms = normalize_terms(question, ticker)
+        key = " ".join(terms)
+        wanted = shingles(terms)
+        now = time.time()
+        with self._lock:
+            if not terms:
+                self._stats["misses"] += 1
+                return None
+            bucket = self._buckets.get((ticker.upper(), version))
+            if bucket is not None:
+                self._drop_expired(bucket, now)
+                entry = bucket.get(key)
+                if entry is not None:
+                    self._stats["hits"] += 1
+                    self._stats["exact_hits"] += 1
+                    return entry, 1.0
+                best, best_score = None, 0.0
+                for entry in bucket.values():
+                    score = similarity(wanted, entry["shingles"])
+                    if score > best_score:
+                        best, best_score = entry, score
+                if best is not None and best_score >= self.threshold:
+                    self._stats["hits"] += 1
+                    return best, round(best_score, 3)
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, ticker, version, question, answer):
+        terms = normalize_terms(question, ticker)
+        if not terms:
+            return
+        key = " ".join(terms)
+        now = time.time()
+        entry = {
+            "question": question,
+            "answer": answer,
+            "shingles": shingles(terms),
+            "created_at": now,
+            "expires_at": now + self.ttl,
+        }
+        with self._lock:
+            bucket = self._buckets.setdefault((ticker.upper(), version), OrderedDict())
+            if key not in bucket:
+                self._size += 1
+            bucket[key] = entry
+            bucket.move_to_end(key)
+            self._stats["writes"] += 1
+            if self._size > self.max_entries:
+                self._evict(now)
+
+    def _evict(self, now):
+        """Drop expired entries, then the oldest ones, until under max_entries"""
+        for bucket_key in list(self._buckets):
+            self._drop_expired(self._buckets[bucket_key], now)
+        while self._size > self.max_entries:
+            bucket_key, bucket = min(
+                ((k, b) for k, b in self._buckets.items() if b),
+                key=lambda item: next(iter(item[1].values()))["created_at"]
+            )
+            bucket.popitem(last=False)
+            self._size -= 1
+            self._stats["evicted"] += 1
+        for bucket_key in [k for k, b in self._buckets.items() if not b]:
+            del self._buckets[bucket_key]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=self._size, buckets=len(self._buckets),
+                         threshold=self.threshold, ttl_seconds=self.ttl, max_entries=self.max_entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+        return stats
+
+
+_cache = ChatAnswerCache()
+
+
+def get_chat_cache():
+    return _cache
@@ -0,0 +1,288 @@
+# =====================================================================
+# chat_sessions.py - Server-side Chat Sessions and Context Selection
+# =====================================================================
+#
+# A chat session holds a ticker's analysis reports and basic info once, so
+# follow-up questions only send the question. For each question the chat
+# crew's {context} is assembled under a token budget: the reports are split
+# into sections, the sections sharing the most (rarity-weighted) keywords
+# with the question are chosen first, and earlier turns of the conversation
+# are included verbatim for the latest few and as one-line summaries before
+# that.
+#
+# Configuration:
+#   CHAT_CONTEXT_TOKENS   - token budget for {context} (reports + history)
+#   CHAT_HISTORY_SHARE    - fraction of that budget conversation history may use
+#   CHAT_RECENT_TURNS     - turns kept verbatim; older ones are compacted
+#   CHAT_SESSION_TTL      - seconds an idle session is kept
+#   CHAT_MAX_SESSIONS     - sessions kept before the least recently used is dropped
+
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "1500"))
+CHAT_HISTORY_SHARE = float(os.getenv("CHAT_HISTORY_SHARE", "0.3"))
+CHAT_RECENT_TURNS = int(os.getenv("CHAT_RECENT_TURNS", "2"))
+CHAT_SESSION_TTL = int(os.getenv("CHAT_SESSION_TTL", "3600"))
+CHAT_MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "1000"))
+
+# Report key in preloadedAnalysis -> heading in the context
+REPORT_HEADINGS = OrderedDict([
+    ('sentiment', "SENTIMENT ANALYSIS"),
+    ('technical', "TECHNICAL ANALYSIS"),
+    ('quantitative', "QUANTITATIVE ANALYSIS"),
+    ('risk', "RISK ASSESSMENT"),
+])
+# Words that point a question at one report even when its text does not repeat them
+REPORT_HINTS = {
+    'sentiment': {"sentiment", "news", "headlines", "analyst", "analysts", "rating", "ratings", "opinion", "mood", "hype"},
+    'technical': {"technical", "chart", "rsi", "macd", "support", "resistance", "trend", "moving", "average",
+                  "breakout", "momentum", "signal", "entry", "exit", "overbought", "oversold"},
+    'quantitative': {"quantitative", "beta", "volatility", "sharpe", "return", "returns", "performance",
+                     "valuation", "pe", "ratio", "metrics", "ytd", "correlation"},
+    'risk': {"risk", "risks", "risky", "safe", "downside", "drawdown", "var", "loss", "lose", "danger", "hedge"},
+}
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "to", "of", "in", "on", "for", "and", "or", "it",
+    "its", "this", "that", "what", "which", "how", "why", "when", "do", "does", "did", "should", "would",
+    "could", "can", "i", "me", "my", "we", "you", "your", "with", "about", "at", "as", "by", "from", "now",
+    "stock", "stocks", "share", "shares", "tell", "give", "please", "there", "any", "will", "much", "more",
+}
+# Characters per section when splitting reports, and per compacted answer
+SECTION_CHARS = 600
+TURN_SUMMARY_CHARS = 160
+# Characters of each recent answer kept verbatim
+RECENT_ANSWER_CHARS = 800
+
+
+def analysis_version(analyses):
+    """Content hash of a set of reports: equal reports give equal versions"""
+    reports = {k: str(v) for k, v in (analyses or {}).items() if k in REPORT_HEADINGS and v}
+    return hashlib.sha256(json.dumps(reports, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def estimate_tokens(text):
+    """Rough token count, the same chars/4 estimate the LLM limiter reserves with"""
+    return len(text) // 4 + 1
+
+
+def keywords(text):
+    return [w for w in re.findall(r"[a-z0-9][a-z0-9.%$-]*", text.lower())
+            if w not in STOPWORDS and len(w) > 1]
+
+
+def split_report(text, max_chars=SECTION_CHARS):
+    """Split a report into sections at blank lines/headings, merging short pieces"""
+    pieces = [p.strip() for p in re.split(r"\n\s*\n|\n(?=#)", str(text)) if p.strip()]
+    sections, current = [], ""
+    for piece in pieces:
+        while len(piece) > max_chars:
+            cut = piece.rfind("\n", 0, max_chars)
+            cut = cut if cut > max_chars // 3 else max_chars
+            head, piece = piece[:cut].strip(), piece[cut:].strip()
+            if current:
+                sections.append(current)
+                current = ""
+            sections.append(head)
+        if current and len(current) + len(piece) + 2 > max_chars:
+            sections.append(current)
+            current = piece
+        else:
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        sections.append(current)
+    return sections
+
+
+def compact_turn(question, answer, limit=TURN_SUMMARY_CHARS):
+    """One line for an older turn: the question and the start of its answer"""
+    answer = " ".join(str(answer).split())
+    first = re.split(r"(?<=[.!?])\s", answer, maxsplit=1)[0]
+    if len(first) > limit:
+        first = first[:limit].rsplit(" ", 1)[0] + "..."
+    return f"- Q: {question} -> A: {first}"
+
+
+class ChatSession:
+    """A ticker's analysis reports and conversation, kept server-side"""
+
+    def __init__(self, ticker, analyses, basic_info=""):
+        self.id = uuid.uuid4().hex
+        self.ticker = ticker.upper()
+        self.basic_info = basic_info
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.turns = []
+        self._lock = threading.Lock()
+        self.set_analyses(analyses)
+
+    def set_analyses(self, analyses):
+        """Replace the reports; version identifies their content"""
+        sections = []
+        for key, heading in REPORT_HEADINGS.items():
+            text = (analyses or {}).get(key)
+            if text:
+                for position, body in enumerate(split_report(text)):
+                    sections.append({"report": key, "heading": heading, "position": position,
+                                     "text": body, "words": Counter(keywords(body))})
+        with self._lock:
+            self.analyses = {k: v for k, v in (analyses or {}).items() if k in REPORT_HEADINGS and v}
+            self.sections = sections
+            self.version = analysis_version(analyses)
+
+    def add_turn(self, question, answer):
+        with self._lock:
+            self.turns.append((question, answer))
+            self.last_used = time.time()
+
+    def _select_sections(self, question, budget):
+        """Most relevant sections that fit the budget, in report order"""
+        query = set(keywords(question))
+        total = len(self.sections)
+        document_frequency = Counter(w for s in self.sections for w in s["words"])
+        hinted = {key for key, hints in REPORT_HINTS.items() if query & hints}
+
+        def score(section):
+            overlap = sum(math.log(1 + total / document_frequency[w]) for w in query if w in section["words"])
+            if section["report"] in hinted:
+                overlap += 2.0
+            # A report's opening section carries its headline figures
+            if section["position"] == 0:
+                overlap += 0.5
+            return overlap
+
+        chosen, used = [], 0
+        for section in sorted(self.sections, key=score, reverse=True):
+            cost = estimate_tokens(section["text"])
+            if used + cost > budget:
+                continue
+            chosen.append(section)
+            used += cost
+        order = list(REPORT_HEADINGS)
+        chosen.sort(key=lambda s: (order.index(s["report"]), s["position"]))
+        return chosen, used
+
+    def _history(self, budget):
+        """Recent turns verbatim, older ones compacted, newest kept when over budget"""
+        with self._lock:
+            turns = list(self.turns)
+        lines, used = [], 0
+        for age, (question, answer) in enumerate(reversed(turns)):
+            if age < CHAT_RECENT_TURNS:
+                answer = str(answer)
+                if len(answer) > RECENT_ANSWER_CHARS:
+                    answer = answer[:RECENT_ANSWER_CHARS].rsplit(" ", 1)[0] + "..."
+                line = f"- Q: {question}\n  A: {answer}"
+            else:
+                line = compact_turn(question, answer)
+            cost = estimate_tokens(line)
+            if used + cost > budget:
+                break
+            lines.append(line)
+            used += cost
+        return list(reversed(lines)), used
+
+    def build_context(self, question, budget=CHAT_CONTEXT_TOKENS):
+        """The chat crew's {context} for a question, within budget tokens"""
+        self.last_used = time.time()
+        with self._lock:
+            has_sections = bool(self.sections)
+        parts = [self.basic_info] if self.basic_info else []
+        remaining = budget - estimate_tokens(self.basic_info) if self.basic_info else budget
+
+        history, used = self._history(int(remaining * CHAT_HISTORY_SHARE))
+        remaining -= used
+        if has_sections:
+            sections, _ = self._select_sections(question, remaining)
+            heading = None
+            for section in sections:
+                if section["heading"] != heading:
+                    heading = section["heading"]
+                    parts.append(f"\n{heading}:")
+                parts.append(section["text"])
+            omitted = len(self.sections) - len(sections)
+            if omitted:
+                parts.append(f"\n({omitted} less relevant report sections omitted)")
+        if history:
+            parts.append("\nEARLIER IN THIS CONVERSATION:")
+            parts.extend(history)
+        return "\n".join(parts).strip()
+
+    def summary(self):
+        with self._lock:
+            return {
+                "session_id": self.id,
+                "ticker": self.ticker,
+                "analyses": sorted(self.analyses),
+                "sections": len(self.sections),
+                "turns": len(self.turns),
+                "version": self.version,
+                "created_at": self.created_at,
+                "expires_in": round(max(0.0, self.last_used + CHAT_SESSION_TTL - time.time())),
+            }
+
+
+class SessionStore:
+    """In-process sessions with idle expiry and an LRU cap"""
+
+    def __init__(self, ttl=CHAT_SESSION_TTL, max_sessions=CHAT_MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"created": 0, "expired": 0, "evicted": 0}
+
+    def _prune(self):
+        """Drop idle sessions (caller holds the lock)"""
+        cutoff = time.time() - self.ttl
+        for session_id in [i for i, s in self._sessions.items() if s.last_used < cutoff]:
+            del self._sessions[session_id]
+            self._stats["expired"] += 1
+
+    def create(self, ticker, analyses, basic_info=""):
+        session = ChatSession(ticker, analyses, basic_info)
+        with self._lock:
+            self._prune()
+            self._sessions[session.id] = session
+            self._stats["created"] += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._stats["evicted"] += 1
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if session.last_used < time.time() - self.ttl:
+                del self._sessions[session_id]
+                self._stats["expired"] += 1
+                return None
+            session.last_used = time.time()
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def stats(self):
+        with self._lock:
+            self._prune()
+            return dict(self._stats, active=len(self._sessions), max_sessions=self.max_sessions,
+                        ttl_seconds=self.ttl, context_tokens=CHAT_CONTEXT_TOKENS)
+
+
+_sessions = SessionStore()
+
+
+def get_session_store():
+    return _sessions
@@ -4,10 +4,29 @@
 
 from crewai import Agent, Task, Crew, Process
 from crewai_tools import SerperDevTool, ScrapeWebsiteTool
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import os
+import threading
+import time
 from functools import lru_cache
+from rate_limit import get_limiter
+from crew_runtime import (
+    FINAL_ANSWER_MARKER,
+    DeadlineExceeded,
+    check_deadline,
+    current_run,
+    forward_agent_step,
+    remaining_time
+)
+from tool_cache import cached_scrape, cached_search
+from metrics import counter, histogram
+from model_router import ESCALATION_MARKER, LARGE_MODEL, LLM_BASE_URL, SMALL_MODEL, analysis_model
+
+# Bump PROMPT_VERSION (crew_pool.py) whenever agent/task prompts or output
+# expectations here change; cached analysis results are keyed by it
 
 # =====================================================================
 # Structured Output Models (Best Practice: Use Pydantic models)
@@ -43,6 +62,16 @@ class RiskAssessment(BaseModel):
     risk_categories: dict = Field(..., description="Risk scores by category")
     summary: str = Field(..., description="Brief risk assessment summary")
 
+def prefill_quantitative_analysis(metrics, benchmark="SPY"):
+    """QuantitativeAnalysis populated from locally computed metrics (see quant_metrics.py)"""
+    return QuantitativeAnalysis(
+        beta=metrics.get("beta"),
+        volatility=metrics.get("volatility"),
+        sharpe_ratio=metrics.get("sharpe_ratio"),
+        key_metrics=dict(metrics, benchmark=benchmark),
+        summary=f"Computed from {metrics.get('observations')} daily returns against {benchmark}."
+    )
+
 # =====================================================================
 # Crew Creation Functions with Caching and Optimization
 # =====================================================================
@@ -54,6 +83,7 @@ def create_fallback_crew(analysis_type):
             role=f"Financial Analyst",
             goal=f"Provide basic {analysis_type}",
             backstory=f"You're an experienced financial analyst who can provide basic {analysis_type}.",
+            llm=_create_llm(),  # Rate limits, deadline and metrics apply to fallbacks too
             verbose=True
         )
         
@@ -94,6 +124,7 @@ def create_minimal_crew(analysis_type):
         role="Basic Analyst",
         goal="Provide minimal response",
         backstory="Basic analyst with limited capabilities.",
+        llm=_create_llm(),
         verbose=False
     )
     
@@ -110,17 +141,242 @@ def create_minimal_crew(analysis_type):
         verbose=False
     )
 
+# =====================================================================
+# Shared Rate Limiting for LLM and Serper Calls (see rate_limit.py)
+# =====================================================================
+
+# Completion allowance added to the prompt-size estimate until real usage is known
+LLM_COMPLETION_ESTIMATE = 800
+
+class RateLimitCallbackHandler(BaseCallbackHandler):
+    """Throttles every LLM call through the process-wide 'llm' limiter
+
+    A token estimate is reserved before the call and corrected with the
+    provider-reported usage when it finishes. A wait cut short by the run
+    deadline raises DeadlineExceeded (propagated, see raise_error) so the
+    call is never sent unthrottled.
+    """
+
+    raise_error = True
+
+    def __init__(self):
+        self._estimates = {}
+        self._lock = threading.Lock()
+
+    def _reserve(self, run_id, prompt_chars):
+        estimate = prompt_chars // 4 + LLM_COMPLETION_ESTIMATE
+        # The wait is bounded by the run deadline, so timing out means the run is out of time
+        try:
+            get_limiter("llm").acquire(estimate, timeout=remaining_time())
+        except TimeoutError:
+            raise DeadlineExceeded("Time limit reached waiting for the LLM rate limit")
+        with self._lock:
+            self._estimates[run_id] = estimate
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._reserve(run_id, sum(len(prompt) for prompt in prompts))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._reserve(run_id, sum(len(str(m.content)) for batch in messages for m in batch))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            estimate = self._estimates.pop(run_id, LLM_COMPLETION_ESTIMATE)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        get_limiter("llm").settle(estimate, usage.get("total_tokens"))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._estimates.pop(run_id, None)
+
+_rate_limit_handler = RateLimitCallbackHandler()
+
+LLM_REQUEST_SECONDS = histogram("llm_request_seconds", "LLM request latency", ["model", "outcome"])
+LLM_TOKENS = counter("llm_tokens", "Provider-reported LLM tokens", ["model", "type"])
+
+class LLMMetricsCallbackHandler(BaseCallbackHandler):
+    """Records latency, outcome and token usage of every LLM request (see metrics.py)
+
+    Token counts are also added to the kickoff's RunContext for per-request
+    cost (model_router.py). Streamed completions carry no provider usage,
+    so their counts are estimated from text length and flagged as such.
+    """
+
+    def __init__(self):
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, prompt_chars, kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model_name") or params.get("model") or "unknown"
+        with self._lock:
+            self._started[run_id] = (time.monotonic(), model, prompt_chars)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, sum(len(prompt) for prompt in prompts), kwargs)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, sum(len(str(m.content)) for batch in messages for m in batch), kwargs)
+
+    def _finish(self, run_id, outcome):
+        with self._lock:
+            started, model, prompt_chars = self._started.pop(run_id, (None, "unknown", 0))
+        if started is not None:
+            LLM_REQUEST_SECONDS.observe(time.monotonic() - started, model=model, outcome=outcome)
+        return model, prompt_chars
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        model, prompt_chars = self._finish(run_id, "completed")
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if usage.get(kind):
+                LLM_TOKENS.inc(usage[kind], model=model, type=kind.split("_")[0])
+        run = current_run()
+        if run is None:
+            return
+        if usage.get("prompt_tokens"):
+            run.add_usage(model, usage["prompt_tokens"], usage.get("completion_tokens", 0))
+        else:
+            completion_chars = sum(len(g.text) for batch in response.generations for g in batch)
+            run.add_usage(model, prompt_chars // 4, completion_chars // 4, estimated=True)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, "error")
+
+_llm_metrics_handler = LLMMetricsCallbackHandler()
+
+class CrewRunCallbackHandler(BaseCallbackHandler):
+    """Enforces the run deadline on LLM calls and collects final-answer tokens
+
+    Tokens before the "Final Answer:" marker are the agent's reasoning and
+    tool calls; those are recorded as step events instead. raise_error makes
+    LangChain propagate DeadlineExceeded rather than log and continue.
+    """
+
+    raise_error = True
+
+    def __init__(self):
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        check_deadline()
+        run = current_run()
+        if run is not None:
+            run.llm_calls += 1
+            with self._lock:
+                self._runs[run_id] = {"text": "", "answering": False}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.on_llm_start(serialized, [], run_id=run_id)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = current_run()
+        with self._lock:
+            state = self._runs.get(run_id)
+        if run is None or state is None:
+            return
+        if state["answering"]:
+            run.emit("token", token)
+        else:
+            state["text"] += token
+            marker = state["text"].find(FINAL_ANSWER_MARKER)
+            if marker >= 0:
+                state["answering"] = True
+                answer = state["text"][marker + len(FINAL_ANSWER_MARKER):].lstrip()
+                if answer:
+                    run.emit("token", answer)
+        check_deadline()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+run_handler = CrewRunCallbackHandler()
+
+# Seconds before a single LLM request is abandoned
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+
+def _create_llm(streaming=False, model=None):
+    """New LLM per agent with the shared rate-limit and run-deadline callbacks
+
+    Agents attach their own token counters to their LLM's callbacks, so each
+    agent gets its own instance rather than sharing one. A streaming LLM also
+    forwards answer tokens to the live sink of the kickoff's thread (see
+    crew_runtime.py) and can be stopped mid-answer at the deadline. model
+    defaults to the large model; LLM_BASE_URL points all agents at another
+    OpenAI-compatible server (see model_router.py).
+    """
+    return ChatOpenAI(
+        model=model or LARGE_MODEL,
+        base_url=LLM_BASE_URL,
+        streaming=streaming,
+        timeout=LLM_REQUEST_TIMEOUT,
+        callbacks=[_rate_limit_handler, _llm_metrics_handler, run_handler]
+    )
+
+class CachedSerperDevTool(SerperDevTool):
+    """SerperDevTool backed by the shared tool cache (tool_cache.py)
+
+    Only cache misses reach Serper, and each takes a slot from the shared
+    'serper' limiter. Refuses to start once the run deadline has passed.
+    """
+
+    def _run(self, **kwargs):
+        check_deadline()
+        query = kwargs.get('search_query') or kwargs.get('query')
+
+        def fetch():
+            get_limiter("serper").acquire(1, timeout=remaining_time())
+            return super(CachedSerperDevTool, self)._run(**kwargs)
+
+        return cached_search(query, fetch, n_results=kwargs.get('n_results', self.n_results),
+                             country=self.country, locale=self.locale)
+
+class CachedScrapeWebsiteTool(ScrapeWebsiteTool):
+    """ScrapeWebsiteTool backed by the shared tool cache, keyed by canonical URL.
+    Refuses to start once the run deadline has passed."""
+
+    def _run(self, **kwargs):
+        check_deadline()
+        url = kwargs.get('website_url', self.website_url)
+        return cached_scrape(url, lambda: super(CachedScrapeWebsiteTool, self)._run(**kwargs))
+
 @lru_cache(maxsize=4)
 def _get_serper_tool():
     """Cached SerperDevTool instance - Best Practice: Reuse tool instances"""
-    return SerperDevTool()
+    return CachedSerperDevTool()
 
 @lru_cache(maxsize=4)
 def _get_scraper_tool():
     """Cached ScrapeWebsiteTool instance"""
-    return ScrapeWebsiteTool()
+    return CachedScrapeWebsiteTool()
 
-def create_sentiment_crew():
+# Prepended to an analyst's task when it receives the shared research stage
+# output (research.py) as its {research} input
+SHARED_RESEARCH_BRIEF = """
+            Shared research already gathered for {ticker} (recent news, analyst ratings,
+            risk coverage and extracts of the leading articles):
+            {research}
+            
+            Base your analysis on this research and do not search the web again. Read one
+            of the listed pages with the website tool only if a detail you need is missing.
+            """
+
+def _analyst_tools(shared_research):
+    """Analysts working from shared research only read pages; the others also search"""
+    if shared_research:
+        return [_get_scraper_tool()]
+    return [_get_serper_tool(), _get_scraper_tool()]
+
+def _research_brief(shared_research):
+    return SHARED_RESEARCH_BRIEF if shared_research else ""
+
+def create_sentiment_crew(shared_research=False):
     """Creates an optimized crew focused on sentiment analysis
 
     Best Practices Applied:
@@ -139,13 +395,14 @@ def create_sentiment_crew():
             market movements. You're known for providing accurate sentiment scores that correlate with
             actual price movements. You ALWAYS provide structured output with clear sentiment scores.""",
             verbose=True,
+            llm=_create_llm(model=analysis_model('sentiment', shared_research)),
             max_iter=15,  # Best Practice: Limit iterations to control costs
-            tools=[_get_serper_tool(), _get_scraper_tool()],
+            tools=_analyst_tools(shared_research),
             allow_delegation=False  # Best Practice: Prevent unnecessary delegation for focused tasks
         )
         
         sentiment_analysis_task = Task(
-            description="""
+            description=_research_brief(shared_research) + """
             Analyze the current market sentiment for {ticker} based on recent news and market data.
             
             Your search scope is: {search_scope}
@@ -186,7 +443,7 @@ def create_sentiment_crew():
         print(f"Error creating sentiment crew: {str(e)}")
         return create_fallback_crew("sentiment analysis")
 
-def create_technical_crew():
+def create_technical_crew(shared_research=False):
     """Creates an optimized crew focused on technical analysis
 
     Best Practices Applied:
@@ -204,25 +461,31 @@ def create_technical_crew():
             timing market entries/exits. You ALWAYS provide clear buy/sell/hold recommendations
             with specific price targets and stop-loss levels.""",
             verbose=True,
-            max_iter=15,
-            tools=[_get_serper_tool(), _get_scraper_tool()],
+            llm=_create_llm(model=analysis_model('technical', shared_research)),
+            max_iter=8,  # Indicators are precomputed, so fewer research steps are needed
+            tools=_analyst_tools(shared_research),
             allow_delegation=False
         )
         
         technical_analysis_task = Task(
-            description="""
+            description=_research_brief(shared_research) + """
             Perform a comprehensive technical analysis on {ticker} stock.
             
-            Your search scope is: {search_scope}
+            Indicators computed from {ticker}'s daily price history:
+            {indicators}
             
-            Focus on finding current data for:
-            • Price relative to key moving averages (50-day, 200-day)
-            • RSI (Relative Strength Index) - identify if oversold/overbought
+            Treat these readings as the source of truth for moving averages (50-day, 200-day),
+            RSI, MACD, Bollinger Bands, ATR, support/resistance and volume. Do not search for
+            them again; interpret them instead:
+            • Price relative to key moving averages and any recent crosses
+            • RSI - identify if oversold/overbought
             • MACD signals and crossovers
             • Support and resistance levels
-            • Recent price patterns and trends
             • Volume analysis and any unusual activity
             
+            Only search for context the numbers cannot give you (e.g. recent chart patterns
+            or events explaining a move). Your search scope is: {search_scope}
+            
             Based on your technical analysis:
             1. Provide a clear trading signal (Strong Buy/Buy/Hold/Sell/Strong Sell)
             2. Identify key price levels to watch
@@ -252,7 +515,7 @@ def create_technical_crew():
         print(f"Error creating technical crew: {str(e)}")
         return create_fallback_crew("technical analysis")
 
-def create_quantitative_crew():
+def create_quantitative_crew(shared_research=False):
     """Creates an optimized crew focused on quantitative analysis
 
     Best Practices Applied:
@@ -270,22 +533,25 @@ def create_quantitative_crew():
             You ALWAYS provide numerical metrics like Sharpe ratio, beta, volatility, and
             risk-adjusted returns with proper statistical confidence levels.""",
             verbose=True,
-            max_iter=15,
-            tools=[_get_serper_tool(), _get_scraper_tool()],
+            llm=_create_llm(model=analysis_model('quantitative', shared_research)),
+            max_iter=8,  # Core metrics are precomputed
+            tools=_analyst_tools(shared_research),
             allow_delegation=False
         )
         
         quantitative_analysis_task = Task(
-            description="""
+            description=_research_brief(shared_research) + """
             Conduct a quantitative analysis on {ticker} stock focusing on statistical metrics and performance.
             
+            Metrics computed from {ticker}'s price history:
+            {quant_metrics}
+            
+            Use these as the values for beta, correlation, volatility, Sharpe ratio, drawdown,
+            YTD and 1-year performance; do not search for them again.
+            
             Your search scope is: {search_scope}
             
-            Research and analyze:
-            • Beta coefficient and correlation with market indices
-            • Historical volatility and standard deviation
-            • Sharpe ratio and risk-adjusted returns
-            • Year-to-date (YTD) and 1-year performance
+            Research only what the computed metrics do not cover:
             • Price-to-earnings ratio and valuation metrics
             • Return on equity (ROE) and financial ratios
             
@@ -335,6 +601,8 @@ def create_chat_crew():
             You have access to preloaded analysis reports and can search for additional information
             when needed. You ALWAYS provide clear, concise answers that directly address the user's question.""",
             verbose=True,
+            llm=_create_llm(streaming=True),  # Answer tokens feed /api/analyze/stream
+            step_callback=forward_agent_step,
             max_iter=12,  # Lower for faster chat responses
             tools=[_get_serper_tool(), _get_scraper_tool()],
             allow_delegation=False
@@ -381,7 +649,61 @@ def create_chat_crew():
         print(f"Error creating chat crew: {str(e)}")
         return create_fallback_crew("chat analysis")
 
-def create_risk_crew():
+def create_context_chat_crew():
+    """Creates the fast chat crew for questions the preloaded context answers
+
+    Best Practices Applied:
+    - Small model, no tools: answers only from the provided context
+    - Hands the question back (ESCALATION_MARKER) instead of guessing
+    - Very low iteration limit
+    """
+    try:
+        context_analyst = Agent(
+            role="Financial Advisor Answering From Prepared Research",
+            goal="Answer user questions about stocks strictly from the analysis reports provided",
+            backstory="""You're a financial advisor who explains prepared research reports to clients.
+            You never speculate beyond the reports in front of you, and you say so plainly when
+            a question needs information they do not contain.""",
+            verbose=True,
+            llm=_create_llm(streaming=True, model=SMALL_MODEL),
+            step_callback=forward_agent_step,
+            max_iter=3,
+            tools=[],
+            allow_delegation=False
+        )
+
+        context_task = Task(
+            description=f"""
+            Answer the user's question about {{ticker}} stock: "{{question}}"
+
+            Use only this analysis context:
+            {{context}}
+
+            Keep your answer concise (150-250 words), directly address the question and
+            cite specific data points from the context.
+
+            If the context does not contain what is needed to answer, reply with exactly
+            {ESCALATION_MARKER} and nothing else.
+            """,
+            expected_output=f"""
+            A clear, concise answer (150-250 words) based on the context, or exactly
+            {ESCALATION_MARKER} if the context cannot answer the question.
+            """,
+            agent=context_analyst
+        )
+
+        return Crew(
+            agents=[context_analyst],
+            tasks=[context_task],
+            process=Process.sequential,
+            verbose=True,
+        )
+
+    except Exception as e:
+        print(f"Error creating context chat crew: {str(e)}")
+        return create_fallback_crew("chat analysis")
+
+def create_risk_crew(shared_research=False):
     """Creates an optimized crew focused on risk assessment
 
     Best Practices Applied:
@@ -400,15 +722,22 @@ def create_risk_crew():
             clear risk rating (1-10) with detailed breakdown of specific risk factors and
             their potential impact on returns.""",
             verbose=True,
-            max_iter=15,
-            tools=[_get_serper_tool(), _get_scraper_tool()],
+            llm=_create_llm(model=analysis_model('risk', shared_research)),
+            max_iter=10,  # Market-risk figures are precomputed
+            tools=_analyst_tools(shared_research),
             allow_delegation=False
         )
         
         risk_assessment_task = Task(
-            description="""
+            description=_research_brief(shared_research) + """
             Conduct a comprehensive risk assessment for {ticker} stock.
             
+            Risk figures computed from {ticker}'s price history:
+            {risk_metrics}
+            
+            Anchor the market-risk part of your rating on these figures (VaR/CVaR, drawdown,
+            downside deviation) instead of searching for volatility data.
+            
             Your search scope is: {search_scope}
             
             Evaluate multiple risk categories:
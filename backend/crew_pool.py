@@ -0,0 +1,220 @@
+# =====================================================================
+# crew_pool.py - Thread-safe Crew Instance Pools
+# =====================================================================
+#
+# Agents and tasks carry mutable state during kickoff, so a Crew must not be
+# shared by two concurrent requests. Each crew type gets a bounded pool:
+# crews are created lazily up to CREW_POOL_SIZE, checked out for exactly one
+# kickoff, and recycled after CREW_POOL_MAX_USES runs.
+#
+# Factories are looked up in crew_handlers.py (and so CrewAI is imported)
+# only when the first crew is built; prewarm_crews() does that ahead of the
+# first request.
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from lazy_imports import lazy_import
+from metrics import histogram
+
+crew_handlers = lazy_import("crew_handlers")
+
+# Bump whenever agent/task prompts or output expectations in crew_handlers.py
+# change; cached analysis results (result_store.py) are keyed by it. Kept
+# here so stored results can be served without importing CrewAI.
+PROMPT_VERSION = "2"
+
+CREW_POOL_SIZE = int(os.getenv("CREW_POOL_SIZE", "4"))
+CREW_POOL_MAX_USES = int(os.getenv("CREW_POOL_MAX_USES", "50"))
+CREW_POOL_TIMEOUT = float(os.getenv("CREW_POOL_TIMEOUT", "30"))
+
+CREW_POOL_WAIT_SECONDS = histogram("crew_pool_wait_seconds", "Time spent waiting to check out a crew", ["crew_type"])
+
+# Crew type -> (crew_handlers factory, keyword arguments)
+CREW_FACTORIES = {
+    'sentiment': ('create_sentiment_crew', {}),
+    'technical': ('create_technical_crew', {}),
+    'quantitative': ('create_quantitative_crew', {}),
+    'risk': ('create_risk_crew', {}),
+    'chat': ('create_chat_crew', {}),
+    # Small-model chat for questions the preloaded context answers (model_router.py)
+    'chat:small': ('create_context_chat_crew', {}),
+    # Analysts working from the shared research stage (research.py)
+    'sentiment:research': ('create_sentiment_crew', {'shared_research': True}),
+    'technical:research': ('create_technical_crew', {'shared_research': True}),
+    'quantitative:research': ('create_quantitative_crew', {'shared_research': True}),
+    'risk:research': ('create_risk_crew', {'shared_research': True}),
+}
+
+
+def crew_factory(crew_type):
+    """Callable building a new crew of a type (imports crew_handlers when called)"""
+    name, kwargs = CREW_FACTORIES[crew_type]
+
+    def build():
+        return getattr(crew_handlers, name)(**kwargs)
+    return build
+
+
+class PoolExhausted(Exception):
+    """No crew became available before the checkout timeout"""
+
+
+class _PooledCrew:
+    def __init__(self, crew):
+        self.crew = crew
+        self.uses = 0
+
+
+class CrewPool:
+    """Bounded pool of crews of one type with checkout/checkin"""
+
+    def __init__(self, crew_type, factory, max_size=CREW_POOL_SIZE,
+                 max_uses=CREW_POOL_MAX_USES, timeout=CREW_POOL_TIMEOUT):
+        self.crew_type = crew_type
+        self.factory = factory
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.timeout = timeout
+        self._idle = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+        self._stats = {"checkouts": 0, "created": 0, "recycled": 0, "discarded": 0,
+                       "waits": 0, "timeouts": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+
+    def checkout(self, timeout=None):
+        """Take an idle crew, create one if below max_size, or wait for a checkin"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        create = 0
+        with self._cond:
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    create = self._size
+                    break
+                remaining = timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolExhausted(
+                        f"All {self.max_size} {self.crew_type} crews are busy; try again shortly"
+                    )
+                self._cond.wait(remaining)
+
+            waited = time.monotonic() - started
+            self._stats["checkouts"] += 1
+            if waited > 0.001:
+                self._stats["waits"] += 1
+            self._stats["wait_seconds"] += waited
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+        CREW_POOL_WAIT_SECONDS.observe(waited, crew_type=self.crew_type)
+
+        if create:
+            print(f"Creating new {self.crew_type} crew ({create}/{self.max_size})...")
+            try:
+                entry = _PooledCrew(self.factory())
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats["created"] += 1
+        return entry
+
+    def prewarm(self, count=1):
+        """Build idle crews until the pool holds count (capped at max_size)"""
+        while True:
+            with self._cond:
+                if self._size >= min(count, self.max_size):
+                    return
+                self._size += 1
+                position = self._size
+            print(f"Pre-building {self.crew_type} crew ({position}/{self.max_size})...")
+            try:
+                entry = _PooledCrew(self.factory())
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats["created"] += 1
+                self._idle.append(entry)
+                self._cond.notify()
+
+    def checkin(self, entry, discard=False):
+        """Return a crew; it is dropped if discarded or past max_uses"""
+        entry.uses += 1
+        with self._cond:
+            if discard or entry.uses >= self.max_uses:
+                self._size -= 1
+                self._stats["discarded" if discard else "recycled"] += 1
+            else:
+                self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def crew(self, timeout=None):
+        """Check out a crew for the duration of the block
+
+        A crew whose kickoff raised is discarded rather than reused, since its
+        agents may be left mid-task.
+        """
+        entry = self.checkout(timeout)
+        try:
+            yield entry.crew
+        except BaseException:
+            self.checkin(entry, discard=True)
+            raise
+        else:
+            self.checkin(entry)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats, size=self._size, idle=len(self._idle),
+                         in_use=self._size - len(self._idle), max_size=self.max_size,
+                         max_uses=self.max_uses)
+        stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+        stats["max_wait_seconds"] = round(stats["max_wait_seconds"], 3)
+        return stats
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(crew_type):
+    """Return the pool for a crew type, creating it on first use"""
+    with _pools_lock:
+        if crew_type not in _pools:
+            if crew_type not in CREW_FACTORIES:
+                raise ValueError(f"Unknown crew type: {crew_type}")
+            _pools[crew_type] = CrewPool(crew_type, crew_factory(crew_type))
+        return _pools[crew_type]
+
+
+def checkout_crew(crew_type, timeout=None):
+    """Context manager yielding a crew of the given type from its pool"""
+    return get_pool(crew_type).crew(timeout)
+
+
+def pool_stats():
+    with _pools_lock:
+        pools = dict(_pools)
+    return {crew_type: pool.stats() for crew_type, pool in pools.items()}
+
+
+def prewarm_crews(crew_types, count=1):
+    """Build count idle crews of each type ahead of the first request"""
+    for crew_type in crew_types:
+        try:
+            get_pool(crew_type).prewarm(count)
+        except Exception as e:
+            print(f"Could not pre-build {crew_type} crew: {e}")
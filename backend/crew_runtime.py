@@ -0,0 +1,219 @@
+# =====================================================================
+# crew_runtime.py - Live Output and Deadlines for Running Crews
+# =====================================================================
+#
+# A kickoff runs its agent loop, LLM calls and tool calls on the thread that
+# called it, so per-run state lives in a thread-local RunContext opened with
+# crew_run(). The context carries an optional live sink and an optional
+# deadline: the LLM callback (CrewRunCallbackHandler in crew_handlers.py)
+# and the agent step callback below record the run's progress (and forward
+# it to the sink), and the deadline is checked before every LLM call, on
+# every streamed token and before every tool call. Steps and answer tokens
+# collected so far make up the partial output of a run that runs out of
+# time. Nothing here imports CrewAI or LangChain.
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# ReAct marker after which an LLM completion is the agent's answer
+FINAL_ANSWER_MARKER = "Final Answer:"
+# Characters of each tool observation forwarded in step events
+STEP_OBSERVATION_CHARS = 500
+# What the agent executor returns when it stops on its iteration/time limit
+AGENT_STOPPED_OUTPUT = "Agent stopped due to iteration limit or time limit."
+# CrewAI's Agent.max_retry_limit default, restored for runs without a deadline
+AGENT_RETRY_LIMIT = 2
+
+_local = threading.local()
+
+
+class DeadlineExceeded(Exception):
+    """The run's deadline passed before the crew finished"""
+
+
+class RunContext:
+    """Deadline, live sink and collected progress of one kickoff"""
+
+    def __init__(self, sink=None, timeout=None):
+        self.sink = sink
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self.steps = []
+        self.answer = []
+        self.llm_calls = 0
+        self.usage = {}
+
+    def remaining(self):
+        """Seconds left before the deadline (None without one)"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    @property
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def emit(self, event, data):
+        if event == "step":
+            self.steps.append(data)
+        elif event == "token":
+            self.answer.append(data)
+        if self.sink is not None:
+            self.sink(event, data)
+
+    def add_usage(self, model, prompt_tokens, completion_tokens, estimated=False):
+        """Accumulate one LLM call's token counts under its model"""
+        counts = self.usage.setdefault(model, {"prompt_tokens": 0, "completion_tokens": 0, "estimated": False})
+        counts["prompt_tokens"] += prompt_tokens
+        counts["completion_tokens"] += completion_tokens
+        counts["estimated"] = counts["estimated"] or estimated
+
+    def partial_output(self):
+        """Best available output of an unfinished run, or None"""
+        answer = "".join(self.answer).strip()
+        if answer:
+            return answer
+        if not self.steps:
+            return None
+        lines = ["Partial findings gathered before the time limit:"]
+        for step in self.steps:
+            lines.append(f"- {step['tool']} ({step['tool_input']}): {step['observation']}")
+        return "\n".join(lines)
+
+
+def current_run():
+    return getattr(_local, "run", None)
+
+
+@contextmanager
+def crew_run(sink=None, timeout=None):
+    """Open a RunContext for kickoffs on this thread; sink(event, data) gets live events"""
+    previous = current_run()
+    run = _local.run = RunContext(sink, timeout)
+    try:
+        yield run
+    finally:
+        _local.run = previous
+
+
+def remaining_time():
+    """Seconds left for the current run, or None when it has no deadline"""
+    run = current_run()
+    return None if run is None else run.remaining()
+
+
+def check_deadline():
+    """Raise DeadlineExceeded if the current run is out of time"""
+    run = current_run()
+    if run is not None and run.expired:
+        raise DeadlineExceeded("Time limit reached")
+
+
+def apply_deadline(crew):
+    """Bound each agent's loop by the run's remaining time and record its steps
+
+    The agent executor checks max_execution_time between iterations, which
+    stops a run cleanly even when no LLM or tool call is in flight. The limit
+    is rounded up so the run's own deadline is never later than the
+    executor's. Agent.execute_task retries a task after any exception,
+    DeadlineExceeded included, so retries are off while a deadline applies;
+    the retry count is per pooled agent, so it is reset for every run.
+    """
+    remaining = remaining_time()
+    for agent in crew.agents:
+        agent.max_execution_time = None if remaining is None else max(1, math.ceil(remaining))
+        agent.max_retry_limit = AGENT_RETRY_LIMIT if remaining is None else 0
+        agent._times_executed = 0
+        if agent.step_callback is None:
+            agent.step_callback = forward_agent_step
+
+
+def forward_agent_step(step_output):
+    """Agent step_callback: record each tool call and its observation
+
+    The executor passes either an AgentFinish (ignored; its text is the
+    result) or a list of (AgentAction, observation) pairs.
+    """
+    run = current_run()
+    if run is None or not isinstance(step_output, list):
+        return
+    for action, observation in step_output:
+        thought = getattr(action, "log", "").split("Action:")[0].replace("Thought:", "").strip()
+        run.emit("step", {
+            "thought": thought,
+            "tool": getattr(action, "tool", None),
+            "tool_input": getattr(action, "tool_input", None),
+            "observation": str(observation)[:STEP_OBSERVATION_CHARS],
+        })
+
+
+class LatencyStats:
+    """Rolling latency samples (seconds) with count, mean and percentiles"""
+
+    def __init__(self, size=1000):
+        self._samples = deque(maxlen=size)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self._count += 1
+
+    def summary(self):
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self._count
+        if not samples:
+            return {"count": count}
+
+        def pct(p):
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 3)
+
+        return {
+            "count": count,
+            "avg": round(sum(samples) / len(samples), 3),
+            "p50": pct(0.5),
+            "p95": pct(0.95),
+            "max": round(samples[-1], 3),
+        }
+
+
+_stream_latency = {
+    "first_event_seconds": LatencyStats(),
+    "first_token_seconds": LatencyStats(),
+    "total_seconds": LatencyStats(),
+}
+
+
+class StreamTimer:
+    """Times one streamed run from creation to its first event, first token and end"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.first_event = None
+        self.first_token = None
+
+    def event(self, event):
+        now = time.monotonic() - self.started
+        if self.first_event is None:
+            self.first_event = now
+            _stream_latency["first_event_seconds"].record(now)
+        if event == "token" and self.first_token is None:
+            self.first_token = now
+            _stream_latency["first_token_seconds"].record(now)
+
+    def finish(self):
+        total = time.monotonic() - self.started
+        _stream_latency["total_seconds"].record(total)
+        return {
+            "first_event_seconds": None if self.first_event is None else round(self.first_event, 3),
+            "first_token_seconds": None if self.first_token is None else round(self.first_token, 3),
+            "total_seconds": round(total, 3),
+        }
+
+
+def stream_stats():
+    return {name: stats.summary() for name, stats in _stream_latency.items()}
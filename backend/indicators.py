@@ -0,0 +1,207 @@
+# =====================================================================
+# indicators.py - Local Technical Indicator Engine
+# =====================================================================
+#
+# Vectorized indicators computed from the daily bars we already store, so
+# the technical crew interprets numbers instead of searching for them.
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def sma(values, window):
+    """Simple moving average (NaN until the window is full)"""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        csum = np.cumsum(np.insert(values, 0, 0.0))
+        out[window - 1:] = (csum[window:] - csum[:-window]) / window
+    return out
+
+
+def ema(values, span=None, alpha=None):
+    """Exponential moving average seeded with the first value"""
+    return pd.Series(values, dtype=np.float64).ewm(span=span, alpha=alpha, adjust=False).mean().to_numpy()
+
+
+def rsi(close, window=14):
+    """Wilder's Relative Strength Index"""
+    delta = np.diff(np.asarray(close, dtype=np.float64), prepend=np.nan)
+    gains = np.where(delta > 0, delta, 0.0)
+    losses = np.where(delta < 0, -delta, 0.0)
+    avg_gain = ema(gains[1:], alpha=1 / window)
+    avg_loss = ema(losses[1:], alpha=1 / window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = avg_gain / avg_loss
+        values = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + rs))
+    out = np.full(len(delta), np.nan)
+    out[window:] = values[window - 1:]
+    return out
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    """MACD line, signal line and histogram"""
+    line = ema(close, span=fast) - ema(close, span=slow)
+    signal_line = ema(line, span=signal)
+    return line, signal_line, line - signal_line
+
+
+def bollinger(close, window=20, num_std=2.0):
+    """Upper, middle and lower Bollinger Bands"""
+    close = np.asarray(close, dtype=np.float64)
+    middle = sma(close, window)
+    std = np.full(len(close), np.nan)
+    if len(close) >= window:
+        std[window - 1:] = sliding_window_view(close, window).std(axis=1)
+    return middle + num_std * std, middle, middle - num_std * std
+
+
+def atr(high, low, close, window=14):
+    """Wilder's Average True Range"""
+    high, low, close = (np.asarray(a, dtype=np.float64) for a in (high, low, close))
+    prev_close = np.concatenate(([close[0]], close[:-1]))
+    true_range = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return ema(true_range, alpha=1 / window)
+
+
+def pivot_levels(high, low, order=5):
+    """Prices of swing highs and lows (extremes of a centered 2*order+1 window)"""
+    high, low = np.asarray(high, dtype=np.float64), np.asarray(low, dtype=np.float64)
+    width = 2 * order + 1
+    if len(high) < width:
+        return np.array([]), np.array([])
+    center_high = high[order:len(high) - order]
+    center_low = low[order:len(low) - order]
+    swing_highs = center_high[center_high == sliding_window_view(high, width).max(axis=1)]
+    swing_lows = center_low[center_low == sliding_window_view(low, width).min(axis=1)]
+    return swing_highs, swing_lows
+
+
+def support_resistance(high, low, price, order=5, count=3, tolerance=0.01):
+    """Nearest distinct pivot levels below (support) and above (resistance) price"""
+    swing_highs, swing_lows = pivot_levels(high, low, order)
+    levels = np.unique(np.round(np.concatenate((swing_highs, swing_lows)), 2))
+
+    def nearest(candidates):
+        picked = []
+        for level in candidates:
+            if all(abs(level - p) > tolerance * price for p in picked):
+                picked.append(float(level))
+            if len(picked) == count:
+                break
+        return picked
+
+    return nearest(levels[levels < price][::-1]), nearest(levels[levels > price])
+
+
+def volume_zscores(volume, window=20):
+    """Volume z-score against the trailing window (excluding the current bar)"""
+    volume = np.asarray(volume, dtype=np.float64)
+    out = np.full(len(volume), np.nan)
+    if len(volume) > window:
+        trailing = sliding_window_view(volume[:-1], window)
+        mean, std = trailing.mean(axis=1), trailing.std(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[window:] = np.where(std > 0, (volume[window:] - mean) / std, 0.0)
+    return out
+
+
+def _last(values):
+    value = values[-1] if len(values) else np.nan
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def _pct(a, b):
+    return None if a is None or not b else round((a / b - 1) * 100, 2)
+
+
+def compute_indicators(hist):
+    """Latest indicator readings for a Date-indexed OHLCV frame"""
+    close = hist["Close"].to_numpy(dtype=np.float64)
+    high = hist["High"].to_numpy(dtype=np.float64)
+    low = hist["Low"].to_numpy(dtype=np.float64)
+    volume = hist["Volume"].to_numpy(dtype=np.float64)
+    price = float(close[-1])
+
+    sma_50, sma_200 = sma(close, 50), sma(close, 200)
+    macd_line, signal_line, histogram = macd(close)
+    upper, middle, lower = bollinger(close)
+    atr_14 = atr(high, low, close)
+    zscores = volume_zscores(volume)
+    support, resistance = support_resistance(high, low, price)
+
+    # Sign changes of the MACD histogram over the last 5 bars
+    recent = np.sign(histogram[-6:])
+    crossover = None
+    if len(recent) > 1 and (np.diff(recent) != 0).any():
+        crossover = "bullish" if recent[-1] > 0 else "bearish"
+
+    cross = None
+    if len(close) >= 205 and not np.isnan(sma_200[-6]):
+        before, after = np.sign(sma_50[-6] - sma_200[-6]), np.sign(sma_50[-1] - sma_200[-1])
+        if before != after:
+            cross = "golden cross" if after > 0 else "death cross"
+
+    band_width = (upper[-1] - lower[-1]) if len(close) else np.nan
+    percent_b = None if np.isnan(band_width) or band_width == 0 else round(float((price - lower[-1]) / band_width), 4)
+    recent_z = zscores[-20:]
+
+    return {
+        "as_of": hist.index[-1].strftime("%Y-%m-%d"),
+        "price": round(price, 4),
+        "moving_averages": {
+            "sma_50": _last(sma_50),
+            "sma_200": _last(sma_200),
+            "price_vs_sma_50_pct": _pct(price, _last(sma_50)),
+            "price_vs_sma_200_pct": _pct(price, _last(sma_200)),
+            "ema_12": _last(ema(close, span=12)),
+            "ema_26": _last(ema(close, span=26)),
+            "recent_cross": cross,
+        },
+        "rsi_14": _last(rsi(close)),
+        "macd": {
+            "macd": _last(macd_line),
+            "signal": _last(signal_line),
+            "histogram": _last(histogram),
+            "recent_crossover": crossover,
+        },
+        "bollinger": {
+            "upper": _last(upper),
+            "middle": _last(middle),
+            "lower": _last(lower),
+            "percent_b": percent_b,
+        },
+        "atr_14": _last(atr_14),
+        "atr_pct": None if _last(atr_14) is None else round(_last(atr_14) / price * 100, 2),
+        "support": support,
+        "resistance": resistance,
+        "volume": {
+            "latest": int(volume[-1]),
+            "avg_20": _last(sma(volume, 20)),
+            "zscore": _last(zscores),
+            "unusual_days_20": int(np.sum(np.abs(recent_z[~np.isnan(recent_z)]) > 2)),
+        },
+    }
+
+
+def format_indicators(indicators):
+    """Render indicator readings as a compact text block for an agent prompt"""
+    ma, m, bb, vol = (indicators["moving_averages"], indicators["macd"],
+                      indicators["bollinger"], indicators["volume"])
+    lines = [
+        f"As of {indicators['as_of']}, last close {indicators['price']}",
+        f"- SMA50 {ma['sma_50']} (price {ma['price_vs_sma_50_pct']}% vs SMA50), "
+        f"SMA200 {ma['sma_200']} (price {ma['price_vs_sma_200_pct']}% vs SMA200), "
+        f"EMA12 {ma['ema_12']}, EMA26 {ma['ema_26']}"
+        + (f", recent {ma['recent_cross']}" if ma['recent_cross'] else ""),
+        f"- RSI(14) {indicators['rsi_14']}",
+        f"- MACD {m['macd']}, signal {m['signal']}, histogram {m['histogram']}"
+        + (f", {m['recent_crossover']} crossover in the last 5 sessions" if m['recent_crossover'] else ""),
+        f"- Bollinger(20,2) upper {bb['upper']}, middle {bb['middle']}, lower {bb['lower']}, %B {bb['percent_b']}",
+        f"- ATR(14) {indicators['atr_14']} ({indicators['atr_pct']}% of price)",
+        f"- Support {indicators['support'] or 'none found'}; resistance {indicators['resistance'] or 'none found'}",
+        f"- Volume {vol['latest']} vs 20-day avg {vol['avg_20']} (z-score {vol['zscore']}), "
+        f"{vol['unusual_days_20']} unusual-volume days (|z|>2) in the last 20 sessions",
+    ]
+    return "\n".join(lines)
@@ -0,0 +1,207 @@
+# =====================================================================
+# jobs.py - Background Analysis Jobs
+# =====================================================================
+#
+# A job is a set of named tasks (one per crew) run on a bounded worker pool
+# shared by the whole process. Clients get a job id immediately and follow
+# progress by polling the job snapshot or by reading its event log, which
+# records one event per finished task as it happens.
+#
+# Configuration:
+#   JOB_WORKERS           - concurrent tasks (crew kickoffs) across all jobs
+#   JOB_MAX_PENDING       - queued tasks accepted before submissions are refused
+#   JOB_RETENTION_SECONDS - how long finished jobs stay queryable
+
+import concurrent.futures
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from metrics import histogram
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "100"))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+JOB_QUEUE_WAIT_SECONDS = histogram("job_queue_wait_seconds", "Time a job task waited for a worker", ["kind"])
+JOB_TASK_SECONDS = histogram("job_task_seconds", "Job task run time", ["kind", "outcome"])
+
+
+class JobQueueFull(Exception):
+    """Too many tasks are already waiting for a worker"""
+
+
+class Job:
+    """State and event log of one submitted job"""
+
+    def __init__(self, kind, ticker, task_names):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.ticker = ticker
+        self.task_names = list(task_names)
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.results = {}
+        self.errors = {}
+        self._exceptions = {}
+        self.events = []
+        self._cond = threading.Condition()
+
+    def emit(self, event, data):
+        """Append an event (ids are 1-based positions in the log) and wake readers"""
+        with self._cond:
+            self.events.append((len(self.events) + 1, event, data))
+            self._cond.notify_all()
+
+    def _task_started(self):
+        with self._cond:
+            first = self.started_at is None
+            if first:
+                self.started_at = time.time()
+                self.status = "running"
+        if first:
+            self.emit("started", {"job_id": self.id})
+
+    def _task_finished(self, name, result=None, exc=None):
+        """Record a task outcome; returns True for the task that finished the job"""
+        error = None if exc is None else (str(exc) or exc.__class__.__name__)
+        with self._cond:
+            if exc is None:
+                self.results[name] = result
+            else:
+                self.errors[name] = error
+                self._exceptions[name] = exc
+            finished = len(self.results) + len(self.errors) == len(self.task_names)
+        if error is None:
+            self.emit("analysis", {"type": name, "status": "completed", "result": result})
+        else:
+            self.emit("analysis", {"type": name, "status": "failed", "error": error})
+        if finished:
+            with self._cond:
+                self.finished_at = time.time()
+                self.status = "completed" if self.results else "failed"
+            self.emit("done", {"status": self.status})
+        return finished
+
+    def exception(self, name):
+        """The exception a failed task raised, or None"""
+        with self._cond:
+            return self._exceptions.get(name)
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    def wait(self, timeout=None):
+        """Block until every task has finished; returns False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.finished_at is not None, timeout)
+
+    def events_after(self, last_id, timeout=None):
+        """Events with id > last_id, waiting up to timeout for one to arrive"""
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.events) > last_id, timeout)
+            return self.events[last_id:]
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "job_id": self.id,
+                "type": self.kind,
+                "ticker": self.ticker,
+                "status": self.status,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "pending": [n for n in self.task_names if n not in self.results and n not in self.errors],
+                "results": dict(self.results),
+                "errors": dict(self.errors),
+            }
+
+
+class JobManager:
+    """Runs job tasks on one bounded thread pool and keeps recent jobs by id"""
+
+    def __init__(self, workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING,
+                 retention=JOB_RETENTION_SECONDS):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retention = retention
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="job-worker"
+        )
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self._running = 0
+        self._stats = {"submitted": 0, "rejected": 0, "completed": 0, "failed": 0}
+
+    def submit(self, kind, ticker, tasks):
+        """Queue a job whose tasks are {name: callable returning a JSON-serializable result}"""
+        job = Job(kind, ticker, tasks)
+        with self._lock:
+            self._prune()
+            if self._pending + len(tasks) > self.max_pending:
+                self._stats["rejected"] += 1
+                raise JobQueueFull(f"{self._pending} analyses are already queued; try again shortly")
+            self._pending += len(tasks)
+            self._jobs[job.id] = job
+            self._stats["submitted"] += 1
+        job.emit("queued", {"job_id": job.id, "type": kind, "ticker": ticker, "tasks": job.task_names})
+        for name, fn in tasks.items():
+            self._executor.submit(self._run_task, job, name, fn)
+        return job
+
+    def _run_task(self, job, name, fn):
+        with self._lock:
+            self._pending -= 1
+            self._running += 1
+        JOB_QUEUE_WAIT_SECONDS.observe(time.time() - job.created_at, kind=job.kind)
+        job._task_started()
+        started = time.monotonic()
+        try:
+            result, exc = fn(), None
+        except Exception as e:
+            print(f"Job {job.id} task {name} failed: {e!r}")
+            result, exc = None, e
+        finally:
+            with self._lock:
+                self._running -= 1
+        JOB_TASK_SECONDS.observe(time.monotonic() - started, kind=job.kind,
+                                 outcome="completed" if exc is None else "failed")
+        if job._task_finished(name, result, exc):
+            with self._lock:
+                self._stats[job.status] += 1
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        """Drop finished jobs past retention (caller holds the lock)"""
+        cutoff = time.time() - self.retention
+        for job_id in [j for j, job in self._jobs.items() if job.done and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, workers=self.workers, pending_tasks=self._pending,
+                        running_tasks=self._running, max_pending=self.max_pending,
+                        jobs_tracked=len(self._jobs))
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = JobManager()
+    return _manager
@@ -0,0 +1,78 @@
+# =====================================================================
+# lazy_imports.py - Deferred Imports for Heavy Subsystems
+# =====================================================================
+#
+# CrewAI, plotly, pandas and yfinance take seconds to import, while health
+# checks, stats and cached results need none of them. lazy_import() returns
+# a stand-in that imports the real module on first attribute access, so each
+# subsystem (crews, charts, market data) loads only when a request needs it,
+# or from the background warm-up after the server is listening. How long
+# each first load took is kept for /metrics and bench_startup.py.
+
+import importlib
+import threading
+import time
+
+_modules = {}
+_registry_lock = threading.Lock()
+
+
+class LazyModule:
+    """Proxy for a module that is imported when one of its attributes is first used"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._load_seconds = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            with self._lock:
+                if self._module is None:
+                    started = time.monotonic()
+                    self._module = importlib.import_module(self._name)
+                    self._load_seconds = time.monotonic() - started
+                    print(f"Loaded {self._name} in {self._load_seconds:.2f}s")
+                module = self._module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name):
+    """The (shared) lazy stand-in for a module"""
+    with _registry_lock:
+        module = _modules.get(name)
+        if module is None:
+            module = _modules[name] = LazyModule(name)
+        return module
+
+
+def is_loaded(module):
+    return module._module is not None
+
+
+def preload(names):
+    """Import lazy modules now (warm-up); failures are reported, not raised"""
+    for name in names:
+        try:
+            lazy_import(name)._load()
+        except Exception as e:
+            print(f"Warm-up import of {name} failed: {e}")
+
+
+def import_stats():
+    with _registry_lock:
+        modules = dict(_modules)
+    return {
+        name: {"loaded": is_loaded(module),
+               "load_seconds": None if module._load_seconds is None else round(module._load_seconds, 3)}
+        for name, module in modules.items()
+    }
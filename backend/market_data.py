@@ -0,0 +1,625 @@
+# =====================================================================
+# market_data.py - Local Incremental OHLCV Bar Store
+# =====================================================================
+#
+# Daily bars are kept in a SQLite file (one series per ticker) so the
+# chart and stock-data endpoints read locally and only ask Yahoo for the
+# bars that appeared since the last stored date. Concurrent identical
+# fetches are coalesced into a single upstream call, and Ticker.info
+# metadata is held in a bounded stale-while-revalidate cache. pandas and
+# yfinance are imported on first use (lazy_imports.py), so the result store
+# and tool cache can use SingleFlight without loading them.
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from lazy_imports import lazy_import
+from metrics import counter, histogram
+
+pd = lazy_import("pandas")
+yf = lazy_import("yfinance")
+
+BAR_STORE_PATH = os.getenv(
+    "BAR_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "bars.sqlite")
+)
+# Minimum seconds between upstream checks for new bars of the same ticker
+BAR_REFRESH_SECONDS = int(os.getenv("BAR_REFRESH_SECONDS", "300"))
+
+INFO_CACHE_SIZE = int(os.getenv("INFO_CACHE_SIZE", "512"))
+# Seconds before a Ticker.info field is considered stale; unlisted fields use the default
+INFO_FIELD_TTLS = {
+    "shortName": 7 * 86400,
+    "longName": 7 * 86400,
+    "sector": 7 * 86400,
+    "industry": 7 * 86400,
+    "beta": 86400,
+    "dividendYield": 3600,
+    "marketCap": 900,
+    "trailingPE": 900,
+}
+INFO_DEFAULT_TTL = int(os.getenv("INFO_DEFAULT_TTL", "3600"))
+
+BAR_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+YFINANCE_SECONDS = histogram("yfinance_request_seconds", "Yahoo Finance request latency", ["call"])
+YFINANCE_ERRORS = counter("yfinance_errors", "Failed Yahoo Finance requests", ["call"])
+
+
+def _yfinance(call, fn):
+    """Run one Yahoo Finance request, recording its latency and failures"""
+    started = time.monotonic()
+    try:
+        return fn()
+    except Exception:
+        YFINANCE_ERRORS.inc(call=call)
+        raise
+    finally:
+        YFINANCE_SECONDS.observe(time.monotonic() - started, call=call)
+
+PERIODS = ("1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "ytd", "max")
+INTERVALS = ("1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h", "1d", "5d", "1wk", "1mo", "3mo")
+INTRADAY_INTERVALS = ("1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h")
+
+# pd.DateOffset arguments per period
+_PERIOD_OFFSETS = {
+    "1d": {"days": 1},
+    "5d": {"days": 5},
+    "1mo": {"months": 1},
+    "3mo": {"months": 3},
+    "6mo": {"months": 6},
+    "1y": {"years": 1},
+    "2y": {"years": 2},
+    "5y": {"years": 5},
+    "10y": {"years": 10},
+}
+
+
+def period_start(period, today=None):
+    """Return the first date covered by a yfinance period string (None for 'max')"""
+    today = pd.Timestamp(today or datetime.now().date())
+    if period == "max":
+        return None
+    if period == "ytd":
+        return pd.Timestamp(year=today.year, month=1, day=1)
+    if period not in _PERIOD_OFFSETS:
+        raise ValueError(f"Unsupported period: {period}")
+    return today - pd.DateOffset(**_PERIOD_OFFSETS[period])
+
+
+def covering_period(start, today=None):
+    """Smallest stored period whose range includes start"""
+    if start is None:
+        return "max"
+    for period in ("1mo", "3mo", "6mo", "1y", "2y", "5y", "10y"):
+        if period_start(period, today) <= pd.Timestamp(start):
+            return period
+    return "max"
+
+
+def _normalize_history(hist, daily=True):
+    """Strip a yfinance history frame down to tz-naive OHLCV bars (exchange local time)"""
+    if hist is None or hist.empty:
+        return pd.DataFrame(columns=BAR_COLUMNS, index=pd.DatetimeIndex([], name="Date"))
+    bars = hist[BAR_COLUMNS].copy()
+    index = pd.DatetimeIndex(bars.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    if daily:
+        index = index.normalize()
+    bars.index = index.rename("Date")
+    return bars[~bars.index.duplicated(keep="last")]
+
+
+def _has_corporate_action(hist, after=None):
+    """True if a fetched frame contains a split or dividend (adjusted history changed)
+
+    after (a stored last date) limits the check to bars dated after it. The
+    last stored bar is re-requested only to complete a partial session; its
+    own action was handled when the bar first arrived.
+    """
+    if after is not None:
+        dates = hist.index.tz_localize(None) if hist.index.tz is not None else hist.index
+        hist = hist[dates.normalize() > pd.Timestamp(after)]
+    for column in ("Stock Splits", "Dividends"):
+        if column in hist.columns and (hist[column].fillna(0) != 0).any():
+            return True
+    return False
+
+
+class BarStore:
+    """SQLite-backed store of daily OHLCV bars, one series per ticker"""
+
+    def __init__(self, path=BAR_STORE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._write_lock:
+            conn = self._conn()
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS bars (
+                    ticker TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    open REAL, high REAL, low REAL, close REAL, volume INTEGER,
+                    PRIMARY KEY (ticker, date)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS series (
+                    ticker TEXT PRIMARY KEY,
+                    covered_from TEXT,
+                    last_date TEXT,
+                    checked_at REAL
+                );
+            """)
+            conn.commit()
+
+    def _conn(self):
+        """One connection per thread; SQLite connections are not shareable"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def series_meta(self, ticker):
+        """Return (covered_from, last_date, checked_at) or None if the ticker is unknown.
+
+        covered_from is '' when the full ('max') history has been stored.
+        """
+        row = self._conn().execute(
+            "SELECT covered_from, last_date, checked_at FROM series WHERE ticker = ?",
+            (ticker,)
+        ).fetchone()
+        return row
+
+    def read(self, ticker, start=None, end=None):
+        """Read stored bars as a DataFrame indexed by Date"""
+        query = "SELECT date, open, high, low, close, volume FROM bars WHERE ticker = ?"
+        params = [ticker]
+        if start is not None:
+            query += " AND date >= ?"
+            params.append(pd.Timestamp(start).strftime("%Y-%m-%d"))
+        if end is not None:
+            query += " AND date < ?"
+            params.append(pd.Timestamp(end).strftime("%Y-%m-%d"))
+        query += " ORDER BY date"
+        rows = self._conn().execute(query, params).fetchall()
+        frame = pd.DataFrame(rows, columns=["Date"] + BAR_COLUMNS)
+        frame["Date"] = pd.to_datetime(frame["Date"])
+        return frame.set_index("Date")
+
+    def write(self, ticker, bars, covered_from=None, replace=False):
+        """Upsert bars for a ticker and update its series metadata.
+
+        covered_from widens the recorded coverage (None leaves it unchanged,
+        '' marks the full history as stored). replace drops existing bars first.
+        """
+        records = [
+            (ticker, date.strftime("%Y-%m-%d"), float(o), float(h), float(l), float(c), int(v))
+            for date, o, h, l, c, v in zip(
+                bars.index, bars["Open"], bars["High"], bars["Low"], bars["Close"],
+                bars["Volume"].fillna(0)
+            )
+            if not (pd.isna(o) or pd.isna(h) or pd.isna(l) or pd.isna(c))
+        ]
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                if replace:
+                    conn.execute("DELETE FROM bars WHERE ticker = ?", (ticker,))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?, ?, ?)", records
+                )
+                last_date = conn.execute(
+                    "SELECT MAX(date) FROM bars WHERE ticker = ?", (ticker,)
+                ).fetchone()[0]
+                current = conn.execute(
+                    "SELECT covered_from FROM series WHERE ticker = ?", (ticker,)
+                ).fetchone()
+                if current is not None and not replace and covered_from is not None:
+                    # '' (full history) sorts first, so min() keeps the widest coverage
+                    covered_from = min(current[0], covered_from)
+                elif current is not None and covered_from is None:
+                    covered_from = current[0]
+                conn.execute(
+                    "INSERT OR REPLACE INTO series VALUES (?, ?, ?, ?)",
+                    (ticker, covered_from, last_date, time.time())
+                )
+
+    def touch(self, ticker):
+        """Record an upstream check that returned no new bars"""
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.execute(
+                    "UPDATE series SET checked_at = ? WHERE ticker = ?", (time.time(), ticker)
+                )
+
+
+class _Call:
+    """An in-flight call whose result is shared by every waiter"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution
+
+    Keys are (ticker, kind, period) tuples; counters are kept per kind so the
+    savings of each fetch type are visible in stats().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._issued = {}
+        self._coalesced = {}
+
+    def do(self, key, fn, *args, join_timeout=None, **kwargs):
+        """Run fn(*args, **kwargs), or wait for the identical call already running
+
+        A joining caller waits at most join_timeout seconds (None: as long as
+        the call takes) before TimeoutError.
+        """
+        kind = key[1] if isinstance(key, tuple) and len(key) > 1 else "default"
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._issued[kind] = self._issued.get(kind, 0) + 1
+            else:
+                self._coalesced[kind] = self._coalesced.get(kind, 0) + 1
+
+        if not leader:
+            if not call.event.wait(join_timeout):
+                raise TimeoutError(f"Timed out waiting for the in-flight {kind} call")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def stats(self):
+        with self._lock:
+            kinds = set(self._issued) | set(self._coalesced)
+            return {
+                kind: {
+                    "issued": self._issued.get(kind, 0),
+                    "coalesced": self._coalesced.get(kind, 0),
+                }
+                for kind in sorted(kinds)
+            }
+
+
+_flight = SingleFlight()
+
+
+def fetch_stats():
+    """Issued vs coalesced upstream fetch counters, per data kind"""
+    return _flight.stats()
+
+
+_store = None
+_store_lock = threading.Lock()
+# Per-ticker update locks are striped: tickers hash onto a fixed set, so the
+# number of locks stays constant however many symbols are requested
+TICKER_LOCK_STRIPES = 64
+_ticker_locks = [threading.Lock() for _ in range(TICKER_LOCK_STRIPES)]
+
+
+def get_bar_store():
+    """Return the process-wide bar store, creating it on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = BarStore()
+    return _store
+
+
+def _ticker_lock(ticker):
+    """Lock serializing store updates for a ticker (shared with the tickers on its stripe)"""
+    return _ticker_locks[hash(ticker) % TICKER_LOCK_STRIPES]
+
+
+def _fetch_upstream(ticker, **kwargs):
+    """Download daily bars from Yahoo Finance"""
+    return _yfinance("history", lambda: yf.Ticker(ticker).history(interval="1d", **kwargs))
+
+
+def get_history(ticker, period="1y"):
+    """Return daily OHLCV bars for a ticker, topping up the local store as needed.
+
+    Only bars after the last stored date are requested from Yahoo, and at most
+    once every BAR_REFRESH_SECONDS per ticker. A full download happens only the
+    first time a ticker (or a longer period than stored) is requested, or after
+    a split/dividend changes the adjusted history. Concurrent requests for the
+    same ticker and period share one call.
+    """
+    ticker = ticker.upper()
+    return _flight.do((ticker, "history", period), _load_history, ticker, period)
+
+
+def get_bars(ticker, period="1y", interval="1d", start=None, end=None):
+    """Return OHLCV bars for any period/interval or explicit [start, end) window.
+
+    Daily bars come from the local store; other intervals are fetched from
+    Yahoo (coalesced, not stored) since they age out of Yahoo's own history.
+    """
+    if interval not in INTERVALS:
+        raise ValueError(f"Unsupported interval: {interval}")
+    if period not in PERIODS:
+        raise ValueError(f"Unsupported period: {period}")
+    ticker = ticker.upper()
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+
+    if interval == "1d":
+        hist = get_history(ticker, covering_period(start) if start is not None else period)
+        if start is not None:
+            hist = hist[hist.index >= start]
+        if end is not None:
+            hist = hist[hist.index < end]
+        return hist
+
+    window = {"start": start.strftime("%Y-%m-%d")} if start is not None else {"period": period}
+    if end is not None:
+        window["end"] = end.strftime("%Y-%m-%d")
+    key = (ticker, "history", (interval,) + tuple(sorted(window.items())))
+    hist = _flight.do(key, lambda: _yfinance(
+        "intraday", lambda: yf.Ticker(ticker).history(interval=interval, **window)
+    ))
+    return _normalize_history(hist, daily=interval not in INTRADAY_INTERVALS)
+
+
+def _load_history(ticker, period):
+    start = period_start(period)
+    covered = "" if start is None else start.strftime("%Y-%m-%d")
+    store = get_bar_store()
+
+    with _ticker_lock(ticker):
+        meta = store.series_meta(ticker)
+
+        if _needs_backfill(meta, covered):
+            hist = _fetch_upstream(ticker, period=period)
+            bars = _normalize_history(hist)
+            if bars.empty and meta is None:
+                return bars
+            store.write(ticker, bars, covered_from=covered)
+
+        elif _is_stale(meta):
+            try:
+                # Re-request the last stored bar too: it may have been a partial session
+                hist = _fetch_upstream(ticker, start=meta[1])
+                if _has_corporate_action(hist, after=meta[1]):
+                    print(f"Corporate action detected for {ticker}, reloading adjusted history")
+                    reload_period = "max" if meta[0] == "" else period
+                    hist = _fetch_upstream(ticker, period=reload_period)
+                    store.write(ticker, _normalize_history(hist),
+                                covered_from=meta[0] if meta[0] == "" else covered, replace=True)
+                else:
+                    bars = _normalize_history(hist)
+                    if bars.empty:
+                        store.touch(ticker)
+                    else:
+                        store.write(ticker, bars)
+            except Exception as e:
+                # Serve what we have; the next request will retry upstream
+                print(f"Incremental bar update failed for {ticker}: {e}")
+
+    return store.read(ticker, start=start)
+
+
+def _needs_backfill(meta, covered):
+    """True if the stored series does not reach back to covered ('' = full history)"""
+    return meta is None or (meta[0] != "" and (covered == "" or covered < meta[0]))
+
+
+def _is_stale(meta):
+    return time.time() - (meta[2] or 0) >= BAR_REFRESH_SECONDS
+
+
+def _split_download(data, tickers):
+    """Split a yf.download frame into per-ticker frames"""
+    if isinstance(data.columns, pd.MultiIndex):
+        available = set(data.columns.get_level_values(0))
+        return {t: data[t].dropna(how="all") for t in tickers if t in available}
+    # A single-ticker download comes back with flat columns
+    return {tickers[0]: data.dropna(how="all")} if len(tickers) == 1 else {}
+
+
+def _download(tickers, **kwargs):
+    """Bulk daily download of several tickers in one upstream call"""
+    data = _yfinance("download", lambda: yf.download(
+        tickers, interval="1d", group_by="ticker", threads=True,
+        actions=True, auto_adjust=True, progress=False, **kwargs
+    ))
+    return _split_download(data, tickers)
+
+
+def get_history_batch(tickers, period="1y"):
+    """Return {ticker: DataFrame or Exception} for many tickers at once.
+
+    Tickers whose stored series is fresh are read locally. The rest are
+    fetched with at most two bulk yf.download calls: one full download for
+    tickers missing the requested range, and one incremental download
+    starting at the oldest last-stored date among the stale ones.
+    """
+    tickers = sorted({t.upper() for t in tickers})
+    return _flight.do((tuple(tickers), "history-batch", period), _load_history_batch, tickers, period)
+
+
+def _load_history_batch(tickers, period):
+    start = period_start(period)
+    covered = "" if start is None else start.strftime("%Y-%m-%d")
+    store = get_bar_store()
+    results = {}
+
+    backfill, stale = [], []
+    for ticker in tickers:
+        meta = store.series_meta(ticker)
+        if _needs_backfill(meta, covered):
+            backfill.append(ticker)
+        elif _is_stale(meta):
+            stale.append((ticker, meta))
+
+    # Downloads run unlocked; each ticker's decision and write are made under
+    # its lock against the current metadata, as in _load_history, so a
+    # concurrent get_history update is never overwritten with older rows
+    if backfill:
+        try:
+            frames = _download(backfill, period=period)
+            for ticker in backfill:
+                bars = _normalize_history(frames.get(ticker))
+                if bars.empty:
+                    results[ticker] = LookupError(f"No data found for ticker {ticker}")
+                    continue
+                with _ticker_lock(ticker):
+                    if _needs_backfill(store.series_meta(ticker), covered):
+                        store.write(ticker, bars, covered_from=covered)
+        except Exception as e:
+            print(f"Bulk download failed for {len(backfill)} tickers: {e}")
+            for ticker in backfill:
+                results[ticker] = e
+
+    if stale:
+        try:
+            frames = _download([t for t, _ in stale], start=min(meta[1] for _, meta in stale))
+            for ticker, _ in stale:
+                hist = frames.get(ticker)
+                with _ticker_lock(ticker):
+                    meta = store.series_meta(ticker)
+                    if not _is_stale(meta):
+                        # Updated by another request since the download started
+                        continue
+                    if hist is None or hist.empty:
+                        store.touch(ticker)
+                    elif _has_corporate_action(hist, after=meta[1]):
+                        print(f"Corporate action detected for {ticker}, reloading adjusted history")
+                        reload_period = "max" if meta[0] == "" else period
+                        store.write(ticker, _normalize_history(_fetch_upstream(ticker, period=reload_period)),
+                                    covered_from=meta[0] if meta[0] == "" else covered, replace=True)
+                    else:
+                        store.write(ticker, _normalize_history(hist))
+        except Exception as e:
+            # Serve stored bars; the next request will retry upstream
+            print(f"Bulk incremental update failed for {len(stale)} tickers: {e}")
+
+    for ticker in tickers:
+        if ticker not in results:
+            results[ticker] = store.read(ticker, start=start)
+    return results
+
+
+class InfoCache:
+    """Bounded LRU cache of Ticker.info dicts with per-field TTLs
+
+    Freshness is judged against the fields a caller needs, so a request for
+    name/sector stays fresh for days while one needing marketCap goes stale
+    within minutes. Stale entries are returned immediately and refreshed in
+    the background; only a miss waits on upstream, and concurrent misses for
+    the same ticker share one fetch.
+    """
+
+    def __init__(self, fetch, max_entries=INFO_CACHE_SIZE, field_ttls=None,
+                 default_ttl=INFO_DEFAULT_TTL):
+        self._fetch = fetch
+        self.max_entries = max_entries
+        self.field_ttls = dict(INFO_FIELD_TTLS if field_ttls is None else field_ttls)
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()  # ticker -> (info, fetched_at)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0,
+                       "refreshes": 0, "refresh_errors": 0, "evictions": 0}
+
+    def _ttl(self, fields):
+        if not fields:
+            return self.default_ttl
+        return min(self.field_ttls.get(field, self.default_ttl) for field in fields)
+
+    def _store(self, ticker, info):
+        with self._lock:
+            self._entries[ticker] = (info, time.time())
+            self._entries.move_to_end(ticker)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _refresh(self, ticker):
+        try:
+            info = self._fetch(ticker)
+            if info:
+                self._store(ticker, info)
+        except Exception as e:
+            print(f"Background info refresh failed for {ticker}: {e}")
+            with self._lock:
+                self._stats["refresh_errors"] += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(ticker)
+
+    def get(self, ticker, fields=None):
+        with self._lock:
+            entry = self._entries.get(ticker)
+            if entry is not None:
+                self._entries.move_to_end(ticker)
+                info, fetched_at = entry
+                if time.time() - fetched_at < self._ttl(fields):
+                    self._stats["hits"] += 1
+                    return info
+                self._stats["stale_hits"] += 1
+                if ticker not in self._refreshing:
+                    self._refreshing.add(ticker)
+                    self._stats["refreshes"] += 1
+                    threading.Thread(target=self._refresh, args=(ticker,), daemon=True).start()
+                return info
+            self._stats["misses"] += 1
+
+        info = self._fetch(ticker)
+        if info:
+            self._store(ticker, info)
+        return info
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._entries), max_entries=self.max_entries)
+
+
+def _fetch_info(ticker):
+    return _flight.do((ticker, "info", None), lambda: _yfinance("info", lambda: yf.Ticker(ticker).info))
+
+
+_info_cache = InfoCache(_fetch_info)
+
+
+def get_info(ticker, fields=None):
+    """Return the yfinance Ticker.info dict from the metadata cache.
+
+    fields names the keys the caller relies on; they decide which TTL applies.
+    """
+    return _info_cache.get(ticker.upper(), fields)
+
+
+def info_cache_stats():
+    return _info_cache.stats()
@@ -0,0 +1,183 @@
+# =====================================================================
+# metrics.py - In-process Metrics with Prometheus Text Exposition
+# =====================================================================
+#
+# Counters and histograms are recorded where the work happens (crew
+# kickoffs, LLM calls, search/scrape tools, yfinance requests, job and pool
+# queues) and rendered on /metrics in the Prometheus text format. Existing
+# stats() dictionaries (caches, pools, limiters) are exported as gauges
+# through collectors, so nothing is counted twice. No client library or
+# external service is needed.
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+NAMESPACE = "stockai"
+# Seconds; covers cache hits (ms) up to full crew runs (minutes)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_metrics = []
+_collectors = []
+_registry_lock = threading.Lock()
+
+
+def _metric_name(name):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", f"{NAMESPACE}_{name}")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = _metric_name(name) + "_total"
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, tuple(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = _metric_name(name)
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block (also when it raises)"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(e[0]), e[1], e[2]) for key, e in self._values.items()}
+        for key, (counts, total, count) in sorted(values.items()):
+            labels = tuple(zip(self.labelnames, key))
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield self.name + "_bucket", labels + (("le", _format_value(float(bound))),), bucket_count
+            yield self.name + "_bucket", labels + (("le", "+Inf"),), count
+            yield self.name + "_sum", labels, round(total, 6)
+            yield self.name + "_count", labels, count
+
+
+def _register(metric):
+    with _registry_lock:
+        _metrics.append(metric)
+    return metric
+
+
+def counter(name, documentation, labelnames=()):
+    return _register(Counter(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram(name, documentation, labelnames, buckets))
+
+
+def register_collector(prefix, stats_fn, label=None):
+    """Export a stats() dict as gauges named <prefix>_<key>.
+
+    With label, the top-level keys are label values (e.g. one entry per
+    crew type); nested dicts of dicts become a "kind" label.
+    """
+    with _registry_lock:
+        _collectors.append((prefix, stats_fn, label))
+
+
+def _flatten(name, stats, labels, out):
+    for key, value in stats.items():
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, (int, float)):
+            out.setdefault(_metric_name(f"{name}_{key}"), []).append((labels, value))
+        elif isinstance(value, dict):
+            if value and all(isinstance(v, dict) for v in value.values()):
+                for kind, inner in value.items():
+                    _flatten(f"{name}_{key}", inner, labels + (("kind", kind),), out)
+            else:
+                _flatten(f"{name}_{key}", value, labels, out)
+
+
+def render():
+    """All metrics and collector gauges in the Prometheus text format (0.0.4)"""
+    with _registry_lock:
+        metrics = list(_metrics)
+        collectors = list(_collectors)
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    gauges = {}
+    for prefix, stats_fn, label in collectors:
+        try:
+            stats = stats_fn()
+        except Exception as e:
+            print(f"Metrics collector {prefix} failed: {e}")
+            continue
+        if label is None:
+            _flatten(prefix, stats, (), gauges)
+        else:
+            for key, value in stats.items():
+                if isinstance(value, dict):
+                    _flatten(prefix, value, ((label, key),), gauges)
+    for name, samples in gauges.items():
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples:
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,232 @@
+# =====================================================================
+# model_router.py - Small/Large Model Routing for Chat and Analysis Crews
+# =====================================================================
+#
+# Most chat questions are about the analyses the user already has; a small
+# model answers those from {context} without tools in a fraction of the
+# time. Questions needing fresh information, other tickers or multi-step
+# reasoning - or whose words the context does not cover - go to the large
+# model with search tools. The small model may also hand a question back
+# (ESCALATION_MARKER), in which case it is re-run on the large model.
+# Analysts that work from shared research and precomputed figures can be
+# pointed at the small model too (ROUTER_SMALL_ANALYSES, off by default);
+# their stored results are then kept apart from large-model ones.
+#
+# Every routed request records its route, model, latency, tokens and cost.
+#
+# Configuration:
+#   OPENAI_MODEL_NAME     - large model (default gpt-4o)
+#   OPENAI_SMALL_MODEL    - small model (default gpt-4o-mini)
+#   LLM_BASE_URL          - OpenAI-compatible endpoint, e.g. a local stub (stub_llm.py)
+#   ROUTER_MIN_COVERAGE   - share of question keywords the context must contain
+#   ROUTER_SMALL_ANALYSES - analysis types run on the small model when given research (opt-in)
+#   MODEL_PRICES          - JSON {"model": [input, output]} USD per 1M tokens, merged over defaults
+
+import json
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+
+from chat_sessions import keywords
+from crew_runtime import LatencyStats
+from metrics import counter
+
+LARGE_MODEL = os.getenv("OPENAI_MODEL_NAME", "gpt-4o")
+SMALL_MODEL = os.getenv("OPENAI_SMALL_MODEL", "gpt-4o-mini")
+LLM_BASE_URL = os.getenv("LLM_BASE_URL") or None
+ROUTER_MIN_COVERAGE = float(os.getenv("ROUTER_MIN_COVERAGE", "0.5"))
+ROUTER_SMALL_ANALYSES = {
+    t.strip() for t in os.getenv("ROUTER_SMALL_ANALYSES", "").split(",") if t.strip()
+}
+
+# USD per 1M (input, output) tokens
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+MODEL_PRICES.update({k: tuple(v) for k, v in json.loads(os.getenv("MODEL_PRICES", "{}")).items()})
+
+# What the small chat model answers when the context does not hold the answer
+ESCALATION_MARKER = "NEEDS_RESEARCH"
+
+# Questions about things the reports cannot know
+FRESH_INFO_WORDS = {
+    "today", "latest", "breaking", "yesterday", "tonight", "this week", "this morning", "right now",
+    "current price", "just announced", "news", "earnings call", "live", "intraday",
+}
+# Questions asking for analysis the reports do not contain
+DEEP_REASONING_WORDS = {
+    "compare", "comparison", "versus", "vs", "scenario", "what if", "simulate", "dcf",
+    "step by step", "in depth", "detailed", "portfolio", "allocate", "allocation", "hedge",
+}
+# Questions longer than this are treated as multi-part
+MAX_SMALL_QUESTION_WORDS = 40
+
+COMMON_UPPERCASE = {"I", "A", "AI", "US", "USA", "CEO", "CFO", "EPS", "PE", "ETF", "IPO", "RSI", "MACD",
+                    "ATR", "VAR", "YTD", "DCF", "EV", "ROE", "ROI", "GDP", "FED", "SEC", "EU", "UK", "OK"}
+
+Route = namedtuple("Route", ["tier", "model", "reason"])
+
+ROUTE_REQUESTS = counter("model_route_requests", "Routed crew requests", ["kind", "tier", "reason"])
+ROUTE_ESCALATIONS = counter("model_route_escalations", "Small-model answers re-run on the large model", ["kind"])
+LLM_COST = counter("llm_cost_usd", "Estimated LLM spend in USD", ["model"])
+
+
+def _mentions(text, phrases):
+    padded = f" {' '.join(re.findall(r'[a-z0-9]+', text.lower()))} "
+    return sorted(p for p in phrases if f" {p} " in padded)
+
+
+def fresh_info_words(question):
+    """FRESH_INFO_WORDS phrases in a question (its answer must not come from a cache)"""
+    return _mentions(question, FRESH_INFO_WORDS)
+
+
+def route_chat(ticker, question, context):
+    """Pick the model tier for a chat question given the context it will see"""
+    fresh = fresh_info_words(question)
+    if fresh:
+        return Route("large", LARGE_MODEL, f"needs fresh information ({fresh[0]})")
+    deep = _mentions(question, DEEP_REASONING_WORDS)
+    if deep:
+        return Route("large", LARGE_MODEL, f"needs deeper analysis ({deep[0]})")
+    others = [w for w in re.findall(r"\b[A-Z]{2,5}\b", question)
+              if w != ticker.upper() and w not in COMMON_UPPERCASE]
+    if others:
+        return Route("large", LARGE_MODEL, f"mentions other tickers ({', '.join(others[:3])})")
+    if len(question.split()) > MAX_SMALL_QUESTION_WORDS:
+        return Route("large", LARGE_MODEL, "long multi-part question")
+    if not context or context.startswith("No preloaded analysis"):
+        return Route("large", LARGE_MODEL, "no analysis context")
+
+    terms = {w for w in keywords(question) if w != ticker.lower()}
+    if terms:
+        context_words = set(keywords(context))
+        coverage = len(terms & context_words) / len(terms)
+        if coverage < ROUTER_MIN_COVERAGE:
+            return Route("large", LARGE_MODEL, f"low context coverage ({coverage:.0%})")
+    return Route("small", SMALL_MODEL, "answerable from context")
+
+
+def analysis_model(crew_type, shared_research):
+    """Model for an analysis crew; only research-fed crews are candidates for the small model"""
+    if shared_research and crew_type in ROUTER_SMALL_ANALYSES:
+        return SMALL_MODEL
+    return LARGE_MODEL
+
+
+def analysis_result_version(crew_type, prompt_version):
+    """Result store version for an analysis type: small-model results get their own"""
+    if crew_type in ROUTER_SMALL_ANALYSES:
+        return f"{prompt_version}:{SMALL_MODEL}"
+    return str(prompt_version)
+
+
+def needs_escalation(answer):
+    return ESCALATION_MARKER in answer[:200]
+
+
+def routed_chat(ticker, question, context, kickoff, timeout, sink=None):
+    """Route a chat question and answer it; returns (text, timed_out, model info)
+
+    kickoff(tier, timeout, report) runs the question on the "small" or
+    "large" chat crew and adds its seconds and per-model usage to report. A
+    small-model answer that hands the question back is re-run on the large
+    model within the same deadline (sink receives an "escalated" event).
+    """
+    deadline = time.monotonic() + timeout
+    route = route_chat(ticker, question, context)
+    report = {}
+    escalated = False
+    if route.tier == "small":
+        text, timed_out = kickoff("small", timeout, report)
+        if timed_out or not needs_escalation(text):
+            return text, timed_out, record_route("chat", route, report.get("seconds", 0.0), report.get("usage", {}))
+        print(f"Escalating {ticker} question to the large model: {question}")
+        escalated = True
+        if sink is not None:
+            sink("escalated", {"reason": "context did not answer the question"})
+    text, timed_out = kickoff("large", max(0.0, deadline - time.monotonic()), report)
+    return text, timed_out, record_route("chat", route, report.get("seconds", 0.0), report.get("usage", {}),
+                                         escalated)
+
+
+def request_cost(usage):
+    """USD cost of a run's per-model token usage (unknown models cost 0)"""
+    total = 0.0
+    for model, counts in usage.items():
+        prices = MODEL_PRICES.get(model)
+        if prices is None:
+            # Providers report dated names such as gpt-4o-mini-2024-07-18
+            prices = next((p for m, p in sorted(MODEL_PRICES.items(), key=lambda i: -len(i[0]))
+                           if model.startswith(m)), (0.0, 0.0))
+        total += (counts["prompt_tokens"] * prices[0] + counts["completion_tokens"] * prices[1]) / 1e6
+    return total
+
+
+class RouterStats:
+    """Requests, escalations, latency and spend per (kind, tier)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, kind, route, seconds, usage, escalated=False):
+        """Record one routed request; returns the per-request summary for responses"""
+        cost = request_cost(usage)
+        prompt = sum(c["prompt_tokens"] for c in usage.values())
+        completion = sum(c["completion_tokens"] for c in usage.values())
+        for model, counts in usage.items():
+            LLM_COST.inc(request_cost({model: counts}), model=model)
+        ROUTE_REQUESTS.inc(kind=kind, tier=route.tier, reason=route.reason.split(" (")[0])
+        if escalated:
+            ROUTE_ESCALATIONS.inc(kind=kind)
+        with self._lock:
+            entry = self._routes.get((kind, route.tier))
+            if entry is None:
+                entry = self._routes[(kind, route.tier)] = {
+                    "requests": 0, "escalations": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                    "cost_usd": 0.0, "latency": LatencyStats(),
+                }
+            entry["requests"] += 1
+            entry["escalations"] += int(escalated)
+            entry["prompt_tokens"] += prompt
+            entry["completion_tokens"] += completion
+            entry["cost_usd"] += cost
+        entry["latency"].record(seconds)
+        return {
+            "tier": route.tier,
+            "model": ", ".join(sorted(usage)) or route.model,
+            "reason": route.reason,
+            "escalated": escalated,
+            "latency_seconds": round(seconds, 3),
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "tokens_estimated": any(c.get("estimated") for c in usage.values()),
+            "cost_usd": round(cost, 6),
+        }
+
+    def stats(self):
+        with self._lock:
+            routes = {key: dict(entry) for key, entry in self._routes.items()}
+        result = {"large_model": LARGE_MODEL, "small_model": SMALL_MODEL, "base_url": LLM_BASE_URL, "routes": {}}
+        for (kind, tier), entry in sorted(routes.items()):
+            entry["latency_seconds"] = entry.pop("latency").summary()
+            entry["cost_usd"] = round(entry["cost_usd"], 6)
+            result["routes"].setdefault(kind, {})[tier] = entry
+        return result
+
+
+_stats = RouterStats()
+
+
+def record_route(kind, route, seconds, usage, escalated=False):
+    return _stats.record(kind, route, seconds, usage, escalated)
+
+
+def router_stats():
+    return _stats.stats()
@@ -0,0 +1,158 @@
+# =====================================================================
+# quant_metrics.py - Vectorized Quantitative Metrics Engine
+# =====================================================================
+#
+# Beta, volatility, Sharpe ratio, drawdown and trailing performance
+# computed from our own price history against a benchmark. Every metric is
+# evaluated on a dates x tickers matrix at once, so one pass covers a whole
+# universe of tickers.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from market_data import get_history_batch
+
+TRADING_DAYS = 252
+BENCHMARK_TICKER = os.getenv("BENCHMARK_TICKER", "SPY")
+# Annual risk-free rate used for the Sharpe ratio
+RISK_FREE_RATE = float(os.getenv("RISK_FREE_RATE", "0.0"))
+
+
+def price_matrix(histories):
+    """Align {ticker: Date-indexed OHLCV frame} into a dates x tickers close matrix"""
+    closes = {ticker: hist["Close"] for ticker, hist in histories.items() if not hist.empty}
+    return pd.DataFrame(closes).sort_index()
+
+
+def _nan_moments(returns, bench):
+    """Masked mean/variance/covariance of each column against the benchmark"""
+    mask = ~np.isnan(returns) & ~np.isnan(bench)[:, None]
+    n = mask.sum(axis=0).astype(np.float64)
+    r = np.where(mask, returns, 0.0)
+    b = np.where(mask, bench[:, None], 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_r, mean_b = r.sum(axis=0) / n, b.sum(axis=0) / n
+        dr = np.where(mask, r - mean_r, 0.0)
+        db = np.where(mask, b - mean_b, 0.0)
+        cov = (dr * db).sum(axis=0) / (n - 1)
+        var_r = (dr ** 2).sum(axis=0) / (n - 1)
+        var_b = (db ** 2).sum(axis=0) / (n - 1)
+    return cov, var_r, var_b
+
+
+def _period_return(prices, since):
+    """Return from the first available close on/after since to the last close, per column"""
+    window = prices[prices.index >= since]
+    if window.empty:
+        return np.full(prices.shape[1], np.nan)
+    first = window.bfill().iloc[0].to_numpy()
+    last = window.ffill().iloc[-1].to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return last / first - 1
+
+
+def compute_metrics(prices, benchmark, risk_free_rate=RISK_FREE_RATE, window=TRADING_DAYS):
+    """Metrics for every column of a dates x tickers price matrix.
+
+    Risk statistics use the trailing `window` sessions of daily simple
+    returns; YTD and 1-year returns use calendar dates. Returns a DataFrame
+    indexed by ticker.
+    """
+    benchmark = benchmark.reindex(prices.index)
+    values = prices.to_numpy(dtype=np.float64)
+    bench = benchmark.to_numpy(dtype=np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = values[1:] / values[:-1] - 1
+        bench_returns = bench[1:] / bench[:-1] - 1
+    returns, bench_returns = returns[-window:], bench_returns[-window:]
+
+    cov, var_r, var_b = _nan_moments(returns, bench_returns)
+    mean_daily = np.nanmean(returns, axis=0)
+    volatility = np.sqrt(var_r * TRADING_DAYS)
+    annual_return = mean_daily * TRADING_DAYS
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta = cov / var_b
+        correlation = cov / np.sqrt(var_r * var_b)
+        sharpe = (annual_return - risk_free_rate) / volatility
+
+    trailing = values[-(window + 1):]
+    running_max = np.fmax.accumulate(np.where(np.isnan(trailing), -np.inf, trailing), axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        max_drawdown = np.nanmin(trailing / running_max - 1, axis=0)
+
+    last_date = prices.index[-1]
+    ytd = _period_return(prices, pd.Timestamp(year=last_date.year, month=1, day=1))
+    one_year = _period_return(prices, last_date - pd.DateOffset(years=1))
+    benchmark_one_year = _period_return(benchmark.to_frame(), last_date - pd.DateOffset(years=1))[0]
+
+    return pd.DataFrame({
+        "beta": beta,
+        "correlation": correlation,
+        "volatility": volatility,
+        "annualized_return": annual_return,
+        "sharpe_ratio": sharpe,
+        "max_drawdown": max_drawdown,
+        "ytd_return": ytd,
+        "one_year_return": one_year,
+        "excess_return_vs_benchmark": one_year - benchmark_one_year,
+        "observations": np.sum(~np.isnan(returns), axis=0),
+    }, index=prices.columns)
+
+
+def metrics_to_dict(metrics):
+    """{ticker: {metric: value}} with NaN mapped to None and floats rounded"""
+    out = {}
+    for ticker, row in metrics.iterrows():
+        out[ticker] = {
+            key: (None if pd.isna(value) else
+                  int(value) if key == "observations" else round(float(value), 4))
+            for key, value in row.items()
+        }
+    return out
+
+
+def universe_metrics(tickers, benchmark=BENCHMARK_TICKER, period="2y"):
+    """Fetch history for tickers plus the benchmark and compute metrics in one pass.
+
+    Returns ({ticker: metrics}, {ticker: error message}).
+    """
+    tickers = [t.upper() for t in tickers]
+    benchmark = benchmark.upper()
+    histories = get_history_batch(tickers + [benchmark], period=period)
+
+    errors = {t: str(r) for t, r in histories.items() if isinstance(r, Exception) and t in tickers}
+    bench_hist = histories.get(benchmark)
+    if isinstance(bench_hist, Exception) or bench_hist is None or bench_hist.empty:
+        raise LookupError(f"No price history for benchmark {benchmark}")
+
+    prices = price_matrix({t: h for t, h in histories.items() if not isinstance(h, Exception)})
+    columns = [t for t in dict.fromkeys(tickers) if t in prices.columns and t not in errors]
+    for ticker in tickers:
+        if ticker not in columns and ticker not in errors:
+            errors[ticker] = f"No data found for ticker {ticker}"
+    if not columns:
+        return {}, errors
+    return metrics_to_dict(compute_metrics(prices[columns], prices[benchmark])), errors
+
+
+def format_metrics(ticker, metrics, benchmark=BENCHMARK_TICKER):
+    """Render one ticker's metrics as a text block for an agent prompt"""
+    def pct(value):
+        return "n/a" if value is None else f"{value * 100:.2f}%"
+
+    def num(value):
+        return "n/a" if value is None else f"{value:.2f}"
+
+    return "\n".join([
+        f"Computed from {metrics['observations']} daily returns against {benchmark}:",
+        f"- Beta {num(metrics['beta'])}, correlation {num(metrics['correlation'])}",
+        f"- Annualized volatility {pct(metrics['volatility'])}, annualized return {pct(metrics['annualized_return'])}",
+        f"- Sharpe ratio {num(metrics['sharpe_ratio'])} (risk-free rate {RISK_FREE_RATE * 100:.2f}%)",
+        f"- Max drawdown (1y) {pct(metrics['max_drawdown'])}",
+        f"- YTD return {pct(metrics['ytd_return'])}, 1-year return {pct(metrics['one_year_return'])} "
+        f"({pct(metrics['excess_return_vs_benchmark'])} vs {benchmark})",
+    ])
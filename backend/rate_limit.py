@@ -0,0 +1,140 @@
+# =====================================================================
+# rate_limit.py - Process-wide Token-Bucket Rate Limiting
+# =====================================================================
+#
+# One limiter per upstream provider ("llm", "serper"), shared by every crew
+# and request in the process. Each limiter has a requests/minute bucket and
+# a tokens/minute bucket (for Serper, "tokens" are search credits).
+#
+# Configuration (0 disables a bucket):
+#   LLM_RPM, LLM_TPM, SERPER_RPM, SERPER_TPM
+
+import os
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at capacity per minute"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount=1.0, timeout=None):
+        """Block until amount is available and take it. Returns seconds waited.
+
+        Requests larger than the bucket are clamped to its capacity so they
+        can eventually pass. Raises TimeoutError if timeout elapses first.
+        """
+        amount = min(float(amount), self.capacity)
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                self._refill()
+                if self._level >= amount:
+                    self._level -= amount
+                    return time.monotonic() - started
+                wait = (amount - self._level) / self.rate
+                if timeout is not None:
+                    remaining = timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        raise TimeoutError("Rate limit wait exceeded timeout")
+                    wait = min(wait, remaining)
+                self._cond.wait(wait)
+
+    def adjust(self, amount):
+        """Debit (positive) or refund (negative) tokens after the fact; may go into debt"""
+        with self._cond:
+            self._refill()
+            self._level = min(self.capacity, self._level - amount)
+            self._cond.notify_all()
+
+    @property
+    def level(self):
+        with self._cond:
+            self._refill()
+            return self._level
+
+
+class RateLimiter:
+    """Requests/minute plus tokens/minute limits for one provider"""
+
+    def __init__(self, name, requests_per_minute=0, tokens_per_minute=0):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._lock = threading.Lock()
+        self._stats = {"acquired": 0, "throttled": 0, "wait_seconds": 0.0, "tokens": 0}
+
+    def acquire(self, tokens=1, timeout=None):
+        """Take one request slot and an estimate of the tokens it will use
+
+        Raises TimeoutError if timeout elapses first; a request slot already
+        taken is then refunded.
+        """
+        started = time.monotonic()
+        waited = 0.0
+        if self.requests is not None:
+            waited += self.requests.acquire(1, timeout)
+        if self.tokens is not None:
+            try:
+                waited += self.tokens.acquire(
+                    tokens, None if timeout is None else max(0.0, timeout - (time.monotonic() - started)))
+            except TimeoutError:
+                if self.requests is not None:
+                    self.requests.adjust(-1)
+                raise
+        with self._lock:
+            self._stats["acquired"] += 1
+            self._stats["tokens"] += tokens
+            self._stats["wait_seconds"] += waited
+            if waited > 0.001:
+                self._stats["throttled"] += 1
+        return waited
+
+    def settle(self, estimated, actual):
+        """Correct the token bucket once the real usage of a request is known"""
+        if self.tokens is not None and actual is not None:
+            self.tokens.adjust(actual - estimated)
+        if actual is not None:
+            with self._lock:
+                self._stats["tokens"] += actual - estimated
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+        stats["requests_per_minute"] = self.requests.capacity if self.requests else None
+        stats["tokens_per_minute"] = self.tokens.capacity if self.tokens else None
+        return stats
+
+
+_limiters = {
+    "llm": RateLimiter(
+        "llm",
+        requests_per_minute=int(os.getenv("LLM_RPM", "500")),
+        tokens_per_minute=int(os.getenv("LLM_TPM", "200000"))
+    ),
+    "serper": RateLimiter(
+        "serper",
+        requests_per_minute=int(os.getenv("SERPER_RPM", "300")),
+        tokens_per_minute=int(os.getenv("SERPER_TPM", "0"))
+    ),
+}
+
+
+def get_limiter(name):
+    return _limiters[name]
+
+
+def limiter_stats():
+    return {name: limiter.stats() for name, limiter in _limiters.items()}
@@ -0,0 +1,257 @@
+# =====================================================================
+# research.py - Shared Research Stage for the Analysis Crews
+# =====================================================================
+#
+# The sentiment, technical, quantitative and risk crews used to search the
+# web independently for the same ticker. The research stage runs a fixed set
+# of searches (news, analyst ratings, risk coverage) once, drops duplicate
+# links and headlines, reads the top pages, and hands the result to every
+# analyst as its {research} input. Analysts then work from that context and
+# only read individual pages themselves.
+#
+# Research is stored in the result store per ticker and trading session
+# (type "research"), and searches and page reads go through the shared tool
+# cache, so agents reading one of the listed pages reuse the same entry.
+#
+# Configuration:
+#   RESEARCH_TIMEOUT          - upper bound (seconds) on one research run
+#   RESEARCH_RESULTS_PER_QUERY, RESEARCH_SCRAPE_PAGES, RESEARCH_PAGE_CHARS,
+#   RESEARCH_MAX_CHARS        - how much is gathered and passed to analysts
+
+import concurrent.futures
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from lazy_imports import lazy_import
+from market_data import get_info
+from rate_limit import get_limiter
+from result_store import cached_analysis
+from tool_cache import cached_scrape, cached_search, normalize_url
+
+requests = lazy_import("requests")
+bs4 = lazy_import("bs4")
+
+RESEARCH_TIMEOUT = float(os.getenv("RESEARCH_TIMEOUT", "30"))
+RESEARCH_RESULTS_PER_QUERY = int(os.getenv("RESEARCH_RESULTS_PER_QUERY", "8"))
+RESEARCH_SCRAPE_PAGES = int(os.getenv("RESEARCH_SCRAPE_PAGES", "3"))
+RESEARCH_PAGE_CHARS = int(os.getenv("RESEARCH_PAGE_CHARS", "1500"))
+RESEARCH_MAX_CHARS = int(os.getenv("RESEARCH_MAX_CHARS", "8000"))
+# Bump when the queries or the research format change; stored research is keyed by it
+RESEARCH_VERSION = "1"
+
+SERPER_URL = "https://google.serper.dev/{endpoint}"
+# Section -> (Serper endpoint, query template, heading in the research text)
+RESEARCH_QUERIES = {
+    "news": ("news", "{ticker} {name} stock news", "Recent news"),
+    "ratings": ("search", "{ticker} stock analyst ratings price target {year}", "Analyst ratings and price targets"),
+    "risks": ("search", "{ticker} {name} risks competition regulation lawsuit", "Risk coverage"),
+}
+PAGE_HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; StockAIAssistant research)"}
+
+# Searches and page reads of all research runs share one bounded pool
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="research")
+
+
+class ResearchUnavailable(Exception):
+    """No search results could be gathered for the ticker"""
+
+
+def _serper(endpoint, query, timeout):
+    """Result items of one Serper request (title, link, snippet, date, source)"""
+    get_limiter("serper").acquire(1, timeout=timeout)
+    response = requests.post(
+        SERPER_URL.format(endpoint=endpoint),
+        headers={"X-API-KEY": os.environ["SERPER_API_KEY"], "content-type": "application/json"},
+        json={"q": query, "num": RESEARCH_RESULTS_PER_QUERY},
+        timeout=max(1.0, min(15.0, timeout)),
+    )
+    response.raise_for_status()
+    results = response.json().get("news" if endpoint == "news" else "organic") or []
+    return [
+        {
+            "title": item.get("title", "").strip(),
+            "link": item["link"],
+            "snippet": item.get("snippet", "").strip(),
+            "date": item.get("date"),
+            "source": item.get("source") or urlsplit(item["link"]).netloc,
+        }
+        for item in results if item.get("link")
+    ]
+
+
+def search(endpoint, query, timeout):
+    """Cached Serper search; empty results are not cached"""
+    def fetch():
+        items = _serper(endpoint, query, timeout)
+        return json.dumps(items) if items else ""
+
+    raw = cached_search(query, fetch, endpoint=endpoint, n_results=RESEARCH_RESULTS_PER_QUERY)
+    return json.loads(raw) if raw else []
+
+
+def read_page(url, timeout):
+    """Visible text of a page, normalized like ScrapeWebsiteTool so agents share the cache entry"""
+    def fetch():
+        page = requests.get(url, timeout=max(1.0, min(15.0, timeout)), headers=PAGE_HEADERS)
+        page.encoding = page.apparent_encoding
+        text = bs4.BeautifulSoup(page.text, "html.parser").get_text()
+        text = '\n'.join([i for i in text.split('\n') if i.strip() != ''])
+        return ' '.join([i for i in text.split(' ') if i.strip() != ''])
+
+    return cached_scrape(url, fetch)
+
+
+def _title_key(title):
+    return " ".join(re.findall(r"\w+", title.lower()))
+
+
+def gather_research(ticker, timeout=RESEARCH_TIMEOUT):
+    """Run the research searches, dedupe their results and read the top pages.
+
+    Returns a JSON-serializable dict; timed_out is set when a search or page
+    read did not finish in time, so incomplete research is not stored.
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    ticker = ticker.upper()
+    try:
+        name = get_info(ticker, ('shortName',)).get('shortName') or ""
+    except Exception:
+        name = ""
+    year = datetime.now().year
+
+    futures = {
+        _executor.submit(search, endpoint, template.format(ticker=ticker, name=name, year=year).strip(),
+                         timeout): section
+        for section, (endpoint, template, _) in RESEARCH_QUERIES.items()
+    }
+    done, not_done = concurrent.futures.wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+    found = {}
+    for future in done:
+        try:
+            found[futures[future]] = future.result()
+        except Exception as e:
+            print(f"Research search '{futures[future]}' failed for {ticker}: {e}")
+    timed_out = bool(not_done)
+
+    # The same story turns up under several queries and syndicated on several sites
+    seen_urls, seen_titles = set(), set()
+    sections, duplicates = {}, 0
+    for section in RESEARCH_QUERIES:
+        sections[section] = []
+        for item in found.get(section, []):
+            url, title = normalize_url(item["link"]), _title_key(item["title"])
+            if url in seen_urls or (title and title in seen_titles):
+                duplicates += 1
+                continue
+            seen_urls.add(url)
+            seen_titles.add(title)
+            sections[section].append(item)
+    if not any(sections.values()):
+        raise ResearchUnavailable(f"No search results for {ticker}")
+
+    # Read the leading articles, one per site
+    picked, domains = [], set()
+    for item in sections["news"] + sections["ratings"] + sections["risks"]:
+        domain = urlsplit(normalize_url(item["link"])).netloc
+        if domain not in domains and len(picked) < RESEARCH_SCRAPE_PAGES:
+            domains.add(domain)
+            picked.append(item)
+    futures = {
+        _executor.submit(read_page, item["link"], max(1.0, deadline - time.monotonic())): item
+        for item in picked
+    }
+    done, not_done = concurrent.futures.wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+    pages = []
+    for future, item in futures.items():
+        if future not in done:
+            continue
+        try:
+            text = future.result()
+        except Exception as e:
+            print(f"Research could not read {item['link']}: {e}")
+            continue
+        if isinstance(text, str) and text.strip():
+            pages.append({"title": item["title"], "url": item["link"], "excerpt": text[:RESEARCH_PAGE_CHARS]})
+    timed_out = timed_out or bool(not_done)
+
+    print(f"Research for {ticker}: {sum(len(s) for s in sections.values())} results "
+          f"({duplicates} duplicates dropped), {len(pages)} pages in {time.monotonic() - started:.1f}s")
+    return {
+        "ticker": ticker,
+        "company": name,
+        "gathered_at": datetime.now().isoformat(timespec="seconds"),
+        "sections": sections,
+        "pages": pages,
+        "duplicates_dropped": duplicates,
+        "timed_out": timed_out,
+    }
+
+
+def format_research(research):
+    """Research as the text block analysts receive, capped at RESEARCH_MAX_CHARS"""
+    lines = [f"Research gathered {research['gathered_at']} for {research['ticker']}"
+             + (f" ({research['company']})" if research.get("company") else "")]
+    for section, (_, _, heading) in RESEARCH_QUERIES.items():
+        items = research["sections"].get(section) or []
+        if not items:
+            continue
+        lines.append(f"\n## {heading}")
+        for item in items:
+            date = f"[{item['date']}] " if item.get("date") else ""
+            lines.append(f"- {date}{item['title']} ({item['source']}): {item['snippet']}\n  {item['link']}")
+    if research["pages"]:
+        lines.append("\n## Page extracts")
+        for page in research["pages"]:
+            lines.append(f"### {page['title']}\n{page['url']}\n{page['excerpt']}")
+    text = "\n".join(lines)
+    if len(text) > RESEARCH_MAX_CHARS:
+        text = text[:RESEARCH_MAX_CHARS].rsplit("\n", 1)[0] + "\n[research truncated]"
+    return text
+
+
+def shared_research(ticker, refresh=False, timeout=RESEARCH_TIMEOUT):
+    """Research for a ticker through the result store; returns (research, cached, age)"""
+    return cached_analysis(
+        ticker, "research", lambda: gather_research(ticker, timeout),
+        prompt_version=RESEARCH_VERSION, refresh=refresh, deadline=time.monotonic() + timeout
+    )
+
+
+class ResearchStage:
+    """The research step of one analysis job, run once and shared by its analysts
+
+    The first analyst to ask runs (or loads) the research while the others
+    wait for it. context() returns None when research failed, in which case
+    analysts fall back to searching for themselves.
+    """
+
+    def __init__(self, ticker, refresh=False, deadline=None):
+        self.ticker = ticker
+        self.refresh = refresh
+        self.deadline = deadline
+        self._lock = threading.Lock()
+        self._done = False
+        self._text = None
+
+    def context(self):
+        with self._lock:
+            if not self._done:
+                self._done = True
+                timeout = RESEARCH_TIMEOUT
+                if self.deadline is not None:
+                    # Leave most of the job's time to the analysts
+                    timeout = min(timeout, max(1.0, (self.deadline - time.monotonic()) / 3))
+                try:
+                    research, cached, age = shared_research(self.ticker, self.refresh, timeout)
+                    self._text = format_research(research)
+                    if cached:
+                        print(f"Reusing research for {self.ticker} ({age:.0f}s old)")
+                except Exception as e:
+                    print(f"Shared research unavailable for {self.ticker}: {e}")
+            return self._text
@@ -0,0 +1,218 @@
+# =====================================================================
+# result_store.py - Persistent Analysis Result Cache
+# =====================================================================
+#
+# Crew results are stored in SQLite keyed by (ticker, analysis type,
+# trading session, prompt version), so repeat requests within a session are
+# answered without another multi-minute kickoff and survive restarts.
+# Identical requests already running are joined rather than duplicated.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from market_data import SingleFlight
+
+RESULT_STORE_PATH = os.getenv(
+    "RESULT_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "results.sqlite")
+)
+RESULT_STORE_MAX_ENTRIES = int(os.getenv("RESULT_STORE_MAX_ENTRIES", "5000"))
+# Seconds a result stays fresh within its trading session, per analysis type
+RESULT_TTLS = {
+    "sentiment": int(os.getenv("RESULT_TTL_SENTIMENT", str(2 * 3600))),
+    "technical": int(os.getenv("RESULT_TTL_TECHNICAL", str(8 * 3600))),
+    "quantitative": int(os.getenv("RESULT_TTL_QUANTITATIVE", str(24 * 3600))),
+    "risk": int(os.getenv("RESULT_TTL_RISK", str(24 * 3600))),
+    # Shared news/ratings research feeding the four analysts (research.py)
+    "research": int(os.getenv("RESULT_TTL_RESEARCH", "1800")),
+}
+RESULT_DEFAULT_TTL = int(os.getenv("RESULT_DEFAULT_TTL", str(6 * 3600)))
+
+MARKET_TIMEZONE = ZoneInfo("America/New_York")
+
+
+def trading_session(now=None):
+    """Date of the current US trading session (weekends roll back to Friday).
+
+    Exchange holidays are not modelled; a holiday simply gets its own key.
+    """
+    day = (now or datetime.now(MARKET_TIMEZONE)).astimezone(MARKET_TIMEZONE).date()
+    if day.weekday() >= 5:
+        day -= timedelta(days=day.weekday() - 4)
+    return day.isoformat()
+
+
+class ResultStore:
+    """SQLite-backed analysis results with per-type TTLs and LRU eviction"""
+
+    def __init__(self, path=RESULT_STORE_PATH, max_entries=RESULT_STORE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "writes": 0, "evicted": 0}
+        with self._write_lock:
+            conn = self._conn()
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS results (
+                    ticker TEXT NOT NULL,
+                    analysis_type TEXT NOT NULL,
+                    session TEXT NOT NULL,
+                    prompt_version TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (ticker, analysis_type, session, prompt_version)
+                );
+                CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at);
+            """)
+            conn.commit()
+
+    def _conn(self):
+        """One connection per thread; SQLite connections are not shareable"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, stat, amount=1):
+        with self._stats_lock:
+            self._stats[stat] += amount
+
+    def get(self, key, ttl):
+        """Return (payload, age_seconds) for a fresh entry, else None"""
+        row = self._conn().execute(
+            "SELECT payload, created_at FROM results "
+            "WHERE ticker = ? AND analysis_type = ? AND session = ? AND prompt_version = ?",
+            key
+        ).fetchone()
+        now = time.time()
+        if row is None:
+            self._count("misses")
+            return None
+        if now - row[1] > ttl:
+            self._count("expired")
+            self._count("misses")
+            return None
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute(
+                "UPDATE results SET accessed_at = ? "
+                "WHERE ticker = ? AND analysis_type = ? AND session = ? AND prompt_version = ?",
+                (now,) + tuple(key)
+            )
+            conn.commit()
+        self._count("hits")
+        return json.loads(row[0]), now - row[1]
+
+    def put(self, key, payload):
+        """Store a payload, then trim the table to max_entries by least recent access"""
+        now = time.time()
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                tuple(key) + (json.dumps(payload), now, now)
+            )
+            evicted = conn.execute(
+                "DELETE FROM results WHERE rowid IN ("
+                "SELECT rowid FROM results ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+            conn.commit()
+        self._count("writes")
+        if evicted > 0:
+            self._count("evicted", evicted)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["entries"] = self._conn().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        stats["max_entries"] = self.max_entries
+        return stats
+
+
+_store = None
+_store_lock = threading.Lock()
+_flight = SingleFlight()
+
+
+def get_result_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ResultStore()
+    return _store
+
+
+def cached_analysis(ticker, analysis_type, compute, prompt_version, refresh=False, ttl=None, deadline=None):
+    """Return (payload, cached, age_seconds) for one analysis of a ticker.
+
+    compute() produces the JSON-serializable payload on a miss and should
+    raise on failure so errors are never cached; payloads marked timed_out
+    are returned but not stored. Concurrent misses for the same key share
+    one compute() call; refresh skips the lookup and only joins other
+    refreshes. A caller joining a running call waits until its deadline
+    (time.monotonic() value) at most, then gets TimeoutError.
+    """
+    key = (ticker.upper(), analysis_type, trading_session(), str(prompt_version))
+    ttl = RESULT_TTLS.get(analysis_type, RESULT_DEFAULT_TTL) if ttl is None else ttl
+    store = get_result_store()
+
+    def lookup():
+        try:
+            hit = store.get(key, ttl)
+        except Exception as e:
+            print(f"Result store read failed for {key}: {e}")
+            return None
+        return None if hit is None else (hit[0], True, hit[1])
+
+    def run():
+        # Re-check: another run for this key may have finished since our lookup
+        hit = None if refresh else lookup()
+        if hit is not None:
+            return hit
+        payload = compute()
+        # Partial output from a run cut off by its deadline is returned but not kept
+        if not payload.get("timed_out"):
+            try:
+                store.put(key, payload)
+            except Exception as e:
+                print(f"Result store write failed for {key}: {e}")
+        return payload, False, 0.0
+
+    hit = None if refresh else lookup()
+    if hit is not None:
+        return hit
+    join_timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+    # SingleFlight counts per key[1], so stats come out per analysis type
+    return _flight.do(key + ("refresh",) if refresh else key, run, join_timeout=join_timeout)
+
+
+def stored_analysis(ticker, analysis_type, prompt_version):
+    """The fresh stored payload for one analysis of a ticker, or None (never computes)"""
+    key = (ticker.upper(), analysis_type, trading_session(), str(prompt_version))
+    try:
+        hit = get_result_store().get(key, RESULT_TTLS.get(analysis_type, RESULT_DEFAULT_TTL))
+    except Exception as e:
+        print(f"Result store read failed for {key}: {e}")
+        return None
+    return None if hit is None else hit[0]
+
+
+def result_store_stats():
+    stats = get_result_store().stats()
+    stats["in_flight"] = _flight.stats()
+    return stats
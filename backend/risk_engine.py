@@ -0,0 +1,131 @@
+# =====================================================================
+# risk_engine.py - Historical, Parametric and Monte Carlo VaR/CVaR
+# =====================================================================
+#
+# Computed risk numbers for the risk crew, so its 1-10 rating rests on
+# repeatable figures rather than web searches alone. Simulation is fully
+# vectorized and seedable.
+
+import os
+from statistics import NormalDist
+
+import numpy as np
+
+TRADING_DAYS = 252
+RISK_CONFIDENCE = float(os.getenv("RISK_CONFIDENCE", "0.95"))
+RISK_HORIZON_DAYS = int(os.getenv("RISK_HORIZON_DAYS", "10"))
+MONTE_CARLO_PATHS = int(os.getenv("MONTE_CARLO_PATHS", "10000"))
+RISK_SEED = int(os.getenv("RISK_SEED", "42"))
+
+
+def log_returns(close):
+    close = np.asarray(close, dtype=np.float64)
+    close = close[~np.isnan(close)]
+    return np.diff(np.log(close))
+
+
+def _tail(losses, confidence):
+    """VaR and CVaR (expected shortfall) of a loss sample, as positive fractions"""
+    var = float(np.quantile(losses, confidence))
+    tail = losses[losses >= var]
+    return var, float(tail.mean()) if len(tail) else var
+
+
+def historical_var(returns, confidence=RISK_CONFIDENCE, horizon=1):
+    """Empirical VaR/CVaR from overlapping `horizon`-day log returns"""
+    if horizon > 1:
+        csum = np.concatenate(([0.0], np.cumsum(returns)))
+        returns = csum[horizon:] - csum[:-horizon]
+    return _tail(-np.expm1(returns), confidence)
+
+
+def parametric_var(returns, confidence=RISK_CONFIDENCE, horizon=1):
+    """Gaussian VaR/CVaR with mean and volatility scaled to the horizon"""
+    mu = returns.mean() * horizon
+    sigma = returns.std(ddof=1) * np.sqrt(horizon)
+    z = NormalDist().inv_cdf(confidence)
+    var_log = -(mu - z * sigma)
+    # Expected shortfall of a normal: mu - sigma * pdf(z) / (1 - confidence)
+    es_log = -(mu - sigma * NormalDist().pdf(z) / (1 - confidence))
+    return float(-np.expm1(-var_log)), float(-np.expm1(-es_log))
+
+
+def monte_carlo_var(returns, confidence=RISK_CONFIDENCE, horizon=RISK_HORIZON_DAYS,
+                    paths=MONTE_CARLO_PATHS, seed=RISK_SEED, method="bootstrap"):
+    """Simulated VaR/CVaR over `horizon` days.
+
+    method "bootstrap" resamples historical daily returns (keeps fat tails);
+    "gbm" draws normal log returns with the sample mean and volatility.
+    All paths are drawn as one (paths, horizon) array.
+    """
+    rng = np.random.default_rng(seed)
+    if method == "gbm":
+        draws = rng.normal(returns.mean(), returns.std(ddof=1), size=(paths, horizon))
+    else:
+        draws = returns[rng.integers(0, len(returns), size=(paths, horizon))]
+    path_returns = draws.sum(axis=1)
+    return _tail(-np.expm1(path_returns), confidence)
+
+
+def max_drawdown(close):
+    close = np.asarray(close, dtype=np.float64)
+    close = close[~np.isnan(close)]
+    return float(np.min(close / np.maximum.accumulate(close) - 1))
+
+
+def downside_deviation(returns, target=0.0):
+    """Annualized root-mean-square of returns below target"""
+    shortfall = np.minimum(returns - target, 0.0)
+    return float(np.sqrt(np.mean(shortfall ** 2)) * np.sqrt(TRADING_DAYS))
+
+
+def compute_risk_metrics(hist, confidence=RISK_CONFIDENCE, horizon=RISK_HORIZON_DAYS,
+                         paths=MONTE_CARLO_PATHS, seed=RISK_SEED):
+    """Risk summary for a Date-indexed OHLCV frame (all losses as positive fractions)"""
+    close = hist["Close"].to_numpy(dtype=np.float64)
+    returns = log_returns(close)
+    if len(returns) < 30:
+        raise ValueError("At least 30 daily returns are needed for risk metrics")
+
+    def pair(values):
+        return {"var": round(values[0], 4), "cvar": round(values[1], 4)}
+
+    return {
+        "as_of": hist.index[-1].strftime("%Y-%m-%d"),
+        "observations": int(len(returns)),
+        "confidence": confidence,
+        "horizon_days": horizon,
+        "one_day": {
+            "historical": pair(historical_var(returns, confidence)),
+            "parametric": pair(parametric_var(returns, confidence)),
+        },
+        "horizon": {
+            "historical": pair(historical_var(returns, confidence, horizon)),
+            "parametric": pair(parametric_var(returns, confidence, horizon)),
+            "monte_carlo": dict(pair(monte_carlo_var(returns, confidence, horizon, paths, seed)),
+                                paths=paths, seed=seed),
+        },
+        "max_drawdown": round(max_drawdown(close), 4),
+        "downside_deviation": round(downside_deviation(returns), 4),
+        "annualized_volatility": round(float(returns.std(ddof=1) * np.sqrt(TRADING_DAYS)), 4),
+    }
+
+
+def format_risk_metrics(metrics):
+    """Render risk metrics as a text block for an agent prompt"""
+    def pct(value):
+        return f"{value * 100:.2f}%"
+
+    one_day, horizon = metrics["one_day"], metrics["horizon"]
+    level = f"{metrics['confidence'] * 100:.0f}%"
+    days = metrics["horizon_days"]
+    return "\n".join([
+        f"Computed from {metrics['observations']} daily returns (as of {metrics['as_of']}), losses at {level} confidence:",
+        f"- 1-day VaR: historical {pct(one_day['historical']['var'])}, parametric {pct(one_day['parametric']['var'])}; "
+        f"CVaR: historical {pct(one_day['historical']['cvar'])}, parametric {pct(one_day['parametric']['cvar'])}",
+        f"- {days}-day VaR: historical {pct(horizon['historical']['var'])}, parametric {pct(horizon['parametric']['var'])}, "
+        f"Monte Carlo {pct(horizon['monte_carlo']['var'])} ({horizon['monte_carlo']['paths']} paths); "
+        f"Monte Carlo CVaR {pct(horizon['monte_carlo']['cvar'])}",
+        f"- Max drawdown {pct(metrics['max_drawdown'])}, downside deviation {pct(metrics['downside_deviation'])} (annualized), "
+        f"volatility {pct(metrics['annualized_volatility'])} (annualized)",
+    ])
@@ -6,7 +6,7 @@
 
 import os
 import sys
-from app import app
+from app import app, start_background_tasks
 
 def check_environment():
     """Check if all required environment variables are set"""
@@ -38,11 +38,13 @@ def run_server():
     print("📚 API Documentation available in README.md")
     print("-" * 60)
     
+    debug = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
+    start_background_tasks(debug=debug, port=5000)
     try:
         app.run(
             host='0.0.0.0',
             port=5000,
-            debug=os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
+            debug=debug
         )
     except KeyboardInterrupt:
         print("\n👋 Server stopped by user.")
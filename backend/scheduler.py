@@ -0,0 +1,284 @@
+# =====================================================================
+# scheduler.py - Scheduled Pre-warming of Watchlist Analyses
+# =====================================================================
+#
+# The first request for a ticker in a trading session pays for a full
+# multi-minute crew run. The pre-warm scheduler runs the full analysis for a
+# configured watchlist ahead of time - at fixed times before the open and,
+# optionally, every few minutes while the market is open - through the same
+# job queue and result store the endpoints use, so interactive requests for
+# those tickers are answered from the store. Analyses still fresh in the
+# store are not re-run, and only PREWARM_CONCURRENCY tickers are in flight
+# at once (spaced PREWARM_SPACING_SECONDS apart) so pre-warming never takes
+# the whole worker pool or LLM rate budget.
+#
+# Configuration:
+#   PREWARM_WATCHLIST        - comma-separated tickers (empty disables the scheduler)
+#   PREWARM_TIMES            - comma-separated HH:MM (US/Eastern) on trading days
+#   PREWARM_INTERVAL_MINUTES - re-run every N minutes during market hours (0 disables)
+#   PREWARM_CONCURRENCY      - tickers whose analyses run at the same time
+#   PREWARM_SPACING_SECONDS  - pause between starting two tickers
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta, time as dtime
+
+from jobs import JobQueueFull
+from metrics import counter, histogram
+from result_store import MARKET_TIMEZONE
+
+PREWARM_WATCHLIST = [t.strip().upper() for t in os.getenv("PREWARM_WATCHLIST", "").split(",") if t.strip()]
+PREWARM_TIMES = [t.strip() for t in os.getenv("PREWARM_TIMES", "08:30").split(",") if t.strip()]
+PREWARM_INTERVAL_MINUTES = int(os.getenv("PREWARM_INTERVAL_MINUTES", "0"))
+PREWARM_CONCURRENCY = max(1, int(os.getenv("PREWARM_CONCURRENCY", "1")))
+PREWARM_SPACING_SECONDS = float(os.getenv("PREWARM_SPACING_SECONDS", "5"))
+
+MARKET_OPEN = dtime(9, 30)
+MARKET_CLOSE = dtime(16, 0)
+# Seconds to wait before resubmitting when the job queue is full, and how often
+QUEUE_FULL_RETRY_SECONDS = 30
+QUEUE_FULL_RETRIES = 10
+
+PREWARM_TICKERS = counter("prewarm_tickers", "Watchlist tickers pre-warmed, by outcome", ["outcome"])
+PREWARM_PASS_SECONDS = histogram("prewarm_pass_seconds", "Duration of one pre-warm pass over the watchlist",
+                                 buckets=(10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200))
+
+
+def parse_times(values):
+    """HH:MM strings -> sorted datetime.time values (invalid entries are skipped)"""
+    times = []
+    for value in values:
+        try:
+            hour, minute = value.split(":")
+            times.append(dtime(int(hour), int(minute)))
+        except ValueError:
+            print(f"Ignoring invalid PREWARM_TIMES entry: {value!r}")
+    return sorted(times)
+
+
+def market_is_open(now):
+    now = now.astimezone(MARKET_TIMEZONE)
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+
+def next_scheduled(now, times):
+    """First trading-day datetime after now at one of times, or None"""
+    now = now.astimezone(MARKET_TIMEZONE)
+    for offset in range(8):
+        day = now.date() + timedelta(days=offset)
+        if day.weekday() >= 5:
+            continue
+        for at in times:
+            candidate = datetime.combine(day, at, tzinfo=MARKET_TIMEZONE)
+            if candidate > now:
+                return candidate
+    return None
+
+
+class PrewarmScheduler:
+    """Runs full analyses for a watchlist on a schedule, a few tickers at a time.
+
+    submit(ticker) queues the full analysis and returns its Job; wait_seconds
+    bounds how long one ticker's job is waited for.
+    """
+
+    def __init__(self, submit, watchlist=PREWARM_WATCHLIST, times=PREWARM_TIMES,
+                 interval_minutes=PREWARM_INTERVAL_MINUTES, concurrency=PREWARM_CONCURRENCY,
+                 spacing=PREWARM_SPACING_SECONDS, wait_seconds=None):
+        self.submit = submit
+        self.watchlist = list(watchlist)
+        self.times = parse_times(times)
+        self.interval = interval_minutes * 60
+        self.concurrency = concurrency
+        self.spacing = spacing
+        self.wait_seconds = wait_seconds
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._running = False
+        self._trigger_reason = None
+        self._next_run = None
+        self._current = None
+        self._last_pass = None
+        self._last_pass_started = None
+        self._tickers = {}
+        self._stats = {"passes": 0, "warmed": 0, "cached": 0, "timed_out": 0, "failed": 0, "deferred": 0}
+
+    @property
+    def enabled(self):
+        return bool(self.watchlist) and (bool(self.times) or self.interval > 0)
+
+    def start(self):
+        """Start the scheduler thread (once); returns False when there is nothing to schedule"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            if self._thread is not None:
+                return True
+            self._thread = threading.Thread(target=self._loop, name="prewarm-scheduler", daemon=True)
+            self._thread.start()
+        print(f"Pre-warm scheduler started for {', '.join(self.watchlist)}")
+        return True
+
+    def trigger(self, reason="manual"):
+        """Ask for a pass now; returns False if one is already running"""
+        with self._lock:
+            if self._running:
+                return False
+            self._trigger_reason = reason
+        if self._thread is None:
+            threading.Thread(target=self.run_pass, args=(reason,), name="prewarm-pass", daemon=True).start()
+        else:
+            self._wake.set()
+        return True
+
+    def next_run(self, now=None):
+        """When the next scheduled pass is due (market time), or None"""
+        now = now or datetime.now(MARKET_TIMEZONE)
+        candidates = []
+        scheduled = next_scheduled(now, self.times)
+        if scheduled is not None:
+            candidates.append((scheduled, "schedule"))
+        if self.interval > 0:
+            due = now if self._last_pass_started is None else max(
+                now, datetime.fromtimestamp(self._last_pass_started + self.interval, MARKET_TIMEZONE))
+            if not market_is_open(due):
+                due = next_scheduled(due, [MARKET_OPEN])
+            candidates.append((due, "interval"))
+        return min(candidates, key=lambda c: c[0]) if candidates else (None, None)
+
+    def _loop(self):
+        while True:
+            due, reason = self.next_run()
+            with self._lock:
+                self._next_run = due
+            timeout = None if due is None else max(0.0, (due - datetime.now(MARKET_TIMEZONE)).total_seconds())
+            if self._wake.wait(timeout):
+                self._wake.clear()
+                with self._lock:
+                    reason = self._trigger_reason or "manual"
+                    self._trigger_reason = None
+            try:
+                self.run_pass(reason)
+            except Exception as e:
+                print(f"Pre-warm pass failed: {e}")
+                time.sleep(QUEUE_FULL_RETRY_SECONDS)
+
+    def _submit(self, ticker):
+        """Queue one ticker, retrying while the job queue is full; None if it stays full"""
+        for attempt in range(QUEUE_FULL_RETRIES):
+            try:
+                return self.submit(ticker)
+            except JobQueueFull:
+                if attempt == 0:
+                    print(f"Job queue full; pre-warm of {ticker} waiting")
+                time.sleep(QUEUE_FULL_RETRY_SECONDS)
+        return None
+
+    def _finish(self, ticker, job, started):
+        """Wait for a ticker's job and record its outcome"""
+        if job is None:
+            outcome = "deferred"
+        elif not job.wait(self.wait_seconds):
+            outcome = "timed_out"
+        else:
+            snapshot = job.snapshot()
+            results = snapshot["results"].values()
+            if snapshot["errors"]:
+                outcome = "failed"
+            elif any(r.get("timed_out") for r in results):
+                outcome = "timed_out"
+            elif results and all(r.get("cached") for r in results):
+                outcome = "cached"
+            else:
+                outcome = "warmed"
+        PREWARM_TICKERS.inc(outcome=outcome)
+        with self._lock:
+            self._stats[outcome] += 1
+            self._current[outcome] += 1
+            self._current["done"] += 1
+            self._tickers[ticker] = {
+                "outcome": outcome,
+                "finished_at": time.time(),
+                "seconds": round(time.monotonic() - started, 1),
+                "job_id": job.id if job is not None else None,
+            }
+        print(f"Pre-warm {ticker}: {outcome}")
+
+    def run_pass(self, reason="manual"):
+        """Warm every watchlist ticker, at most `concurrency` at a time"""
+        with self._lock:
+            if self._running:
+                return False
+            self._running = True
+            self._last_pass_started = time.time()
+            self._current = {"reason": reason, "started_at": self._last_pass_started, "tickers": len(self.watchlist),
+                             "done": 0, "warmed": 0, "cached": 0, "timed_out": 0, "failed": 0, "deferred": 0}
+        print(f"Pre-warm pass ({reason}) for {len(self.watchlist)} tickers")
+        started = time.monotonic()
+        try:
+            in_flight = []
+            for position, ticker in enumerate(self.watchlist):
+                if len(in_flight) >= self.concurrency:
+                    in_flight.pop(0).join()
+                if position and self.spacing > 0:
+                    time.sleep(self.spacing)
+                job = self._submit(ticker)
+                waiter = threading.Thread(target=self._finish, args=(ticker, job, time.monotonic()),
+                                          name=f"prewarm-{ticker}", daemon=True)
+                waiter.start()
+                in_flight.append(waiter)
+            for waiter in in_flight:
+                waiter.join()
+        finally:
+            seconds = time.monotonic() - started
+            PREWARM_PASS_SECONDS.observe(seconds)
+            with self._lock:
+                self._last_pass = dict(self._current, finished_at=time.time(), seconds=round(seconds, 1))
+                self._current = None
+                self._running = False
+                self._stats["passes"] += 1
+        return True
+
+    def status(self):
+        with self._lock:
+            next_run = self._next_run
+            return {
+                "enabled": self.enabled,
+                "running": self._running,
+                "watchlist": list(self.watchlist),
+                "times": [t.strftime("%H:%M") for t in self.times],
+                "timezone": str(MARKET_TIMEZONE),
+                "interval_minutes": self.interval // 60,
+                "concurrency": self.concurrency,
+                "spacing_seconds": self.spacing,
+                "next_run": next_run.isoformat() if next_run is not None else None,
+                "current_pass": dict(self._current) if self._current else None,
+                "last_pass": dict(self._last_pass) if self._last_pass else None,
+                "tickers": {t: dict(v) for t, v in self._tickers.items()},
+                "totals": dict(self._stats),
+            }
+
+    def stats(self):
+        """Gauges for the metrics collector (outcome counts are the prewarm_tickers counter)"""
+        with self._lock:
+            next_run = self._next_run
+            stats = {"running": self._running, "watchlist": len(self.watchlist), "passes": self._stats["passes"]}
+        if next_run is not None:
+            stats["next_run_seconds"] = round(max(0.0, (next_run - datetime.now(MARKET_TIMEZONE)).total_seconds()))
+        return stats
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_prewarm_scheduler(submit=None, **kwargs):
+    """The process-wide scheduler; the first call must pass submit"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = PrewarmScheduler(submit, **kwargs)
+    return _scheduler
@@ -0,0 +1,123 @@
+# =====================================================================
+# serializers.py - Vectorized OHLCV Response Serialization
+# =====================================================================
+#
+# Builds the /api/stock-data payload with whole-column operations and
+# writes the JSON text directly, instead of iterating rows in Python.
+# Besides the default row layout, bars can be emitted as columnar JSON
+# (one array per field) or MessagePack.
+
+import json
+
+import numpy as np
+import pandas as pd
+
+try:
+    import msgpack
+except ImportError:  # Binary responses are optional
+    msgpack = None
+
+# Media types accepted by content negotiation, mapped to format names
+FORMAT_MEDIA_TYPES = {
+    "rows": "application/json",
+    "columnar": "application/vnd.stockai.columnar+json",
+    "msgpack": "application/x-msgpack",
+}
+
+BAR_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+def bars_frame(hist, date_format="%Y-%m-%d"):
+    """Convert a Date-indexed OHLCV frame to the StockData columns.
+
+    Rows with a missing price or volume are dropped, matching the rows the
+    old per-row loop skipped; percentChange is 0 when the open is not positive.
+    """
+    if "Date" in hist.columns:
+        hist = hist.set_index("Date")
+    hist = hist[hist[BAR_COLUMNS].notna().all(axis=1)]
+
+    open_ = hist["Open"].to_numpy(dtype=np.float64)
+    close = hist["Close"].to_numpy(dtype=np.float64)
+    change = close - open_
+    percent_change = np.zeros_like(change)
+    np.divide(change, open_, out=percent_change, where=open_ > 0)
+    percent_change *= 100
+
+    return pd.DataFrame({
+        "date": pd.DatetimeIndex(hist.index).strftime(date_format),
+        "open": open_,
+        "high": hist["High"].to_numpy(dtype=np.float64),
+        "low": hist["Low"].to_numpy(dtype=np.float64),
+        "close": close,
+        "volume": hist["Volume"].to_numpy(dtype=np.int64),
+        "change": change,
+        "percentChange": percent_change,
+    })
+
+
+def bars_to_json(hist, date_format="%Y-%m-%d"):
+    """Serialize bars to a JSON array of StockData row objects"""
+    return bars_frame(hist, date_format).to_json(orient="records", double_precision=15)
+
+
+def stock_data_json(hist, info, ticker, date_format="%Y-%m-%d"):
+    """Assemble the StockDataResponse JSON text without re-parsing the bar array"""
+    return '{"data":%s,"info":%s,"ticker":%s}' % (
+        bars_to_json(hist, date_format), json.dumps(info), json.dumps(ticker.upper())
+    )
+
+
+def batch_stock_data_json(results, period):
+    """Per-ticker bars or errors for the batch endpoint, as JSON text"""
+    entries = []
+    for ticker, result in results.items():
+        if isinstance(result, Exception):
+            entry = '{"error":%s}' % json.dumps(str(result))
+        else:
+            entry = '{"data":%s}' % bars_to_json(result)
+        entries.append('%s:%s' % (json.dumps(ticker), entry))
+    return '{"results":{%s},"period":%s}' % (",".join(entries), json.dumps(period))
+
+
+def stock_data_columnar_json(hist, info, ticker, date_format="%Y-%m-%d"):
+    """StockDataResponse with data as an object of per-field arrays"""
+    frame = bars_frame(hist, date_format)
+    columns = ",".join(
+        '"%s":%s' % (name, frame[name].to_json(orient="values", double_precision=15))
+        for name in frame.columns
+    )
+    return '{"data":{%s},"info":%s,"ticker":%s,"length":%d}' % (
+        columns, json.dumps(info), json.dumps(ticker.upper()), len(frame)
+    )
+
+
+def stock_data_msgpack(hist, info, ticker, date_format="%Y-%m-%d"):
+    """Columnar StockDataResponse encoded as MessagePack"""
+    if msgpack is None:
+        raise RuntimeError("msgpack is not installed")
+    frame = bars_frame(hist, date_format)
+    return msgpack.packb({
+        "data": {name: frame[name].tolist() for name in frame.columns},
+        "info": info,
+        "ticker": ticker.upper(),
+        "length": len(frame),
+    })
+
+
+def msgpack_available():
+    return msgpack is not None
+
+
+def negotiate_format(requested, accept_mimetypes):
+    """Pick a response format from ?format= or the Accept header (rows by default)"""
+    if requested:
+        return requested if requested in FORMAT_MEDIA_TYPES else None
+    best = accept_mimetypes.best_match(
+        [FORMAT_MEDIA_TYPES["rows"], FORMAT_MEDIA_TYPES["columnar"],
+         FORMAT_MEDIA_TYPES["msgpack"], "application/msgpack"],
+        default=FORMAT_MEDIA_TYPES["rows"]
+    )
+    if best == "application/msgpack":
+        return "msgpack"
+    return next(name for name, media_type in FORMAT_MEDIA_TYPES.items() if media_type == best)
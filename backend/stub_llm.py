@@ -0,0 +1,135 @@
+# =====================================================================
+# stub_llm.py - Local OpenAI-compatible Stub Server for Routing Checks
+# =====================================================================
+#
+# Answers /v1/chat/completions (plain and streamed) with a canned ReAct
+# final answer naming the model that was asked, after a per-model delay, so
+# model routing (model_router.py), escalation and the recorded latency and
+# cost can be exercised without an API key or network access.
+#
+#   python stub_llm.py [--port 8001] [--latency gpt-4o=1.5 --latency gpt-4o-mini=0.2]
+#                      [--escalate-model gpt-4o-mini]
+#   LLM_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=stub python app.py
+#
+# Tests start it in-process with StubLLM (see tests/test_model_router.py).
+
+import argparse
+import json
+import threading
+import time
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from model_router import ESCALATION_MARKER
+
+
+def make_handler(latency, escalate_model, requested=None):
+    """Request handler class; requested, if given, collects the model of each request"""
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            print(f"stub-llm: {format % args}")
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            model = body.get("model", "unknown")
+            if requested is not None:
+                requested.append(model)
+            time.sleep(latency.get(model, latency.get("*", 0.0)))
+
+            prompt = " ".join(str(m.get("content", "")) for m in body.get("messages", []))
+            if model == escalate_model:
+                answer = ESCALATION_MARKER
+            else:
+                answer = f"[{model}] Stub answer based on {len(prompt)} characters of prompt."
+            content = f"Thought: I now know the final answer\nFinal Answer: {answer}"
+            usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+            if body.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for i in range(0, len(content), 8):
+                    chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": model, "choices": [{"index": 0, "delta": {"content": content[i:i + 8]},
+                                                          "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                done = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+                self.wfile.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode())
+                return
+
+            payload = json.dumps({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return StubHandler
+
+
+class StubLLM:
+    """The stub server on a background thread; port 0 picks a free port"""
+
+    def __init__(self, port=0, latency=None, escalate_model=None):
+        self.requested = []
+        self.server = ThreadingHTTPServer(
+            ("127.0.0.1", port), make_handler(latency or {}, escalate_model, self.requested))
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        self._thread = threading.Thread(target=self.server.serve_forever, name="stub-llm", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def complete(self, model, prompt):
+        """One non-streamed chat completion; returns (answer content, usage)"""
+        request = urllib.request.Request(
+            f"{self.base_url}/chat/completions",
+            data=json.dumps({"model": model, "messages": [{"role": "user", "content": prompt}]}).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=10) as response:
+            body = json.loads(response.read())
+        return body["choices"][0]["message"]["content"], body["usage"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub LLM server")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", action="append", default=[],
+                        help="model=seconds delay before answering ('*' for any model)")
+    parser.add_argument("--escalate-model", default=None,
+                        help=f"model that always answers {ESCALATION_MARKER}")
+    args = parser.parse_args()
+
+    latency = {}
+    for item in args.latency:
+        model, seconds = item.rsplit("=", 1)
+        latency[model] = float(seconds)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(latency, args.escalate_model))
+    print(f"Stub LLM listening on http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
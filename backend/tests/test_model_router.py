@@ -0,0 +1,153 @@
+import pytest
+
+from model_router import (
+    LARGE_MODEL,
+    MODEL_PRICES,
+    SMALL_MODEL,
+    needs_escalation,
+    request_cost,
+    routed_chat,
+    router_stats,
+)
+from stub_llm import StubLLM
+
+CONTEXT = (
+    "## Technical Analysis\n"
+    "RSI reading is 62, momentum is positive and the price holds above the 50-day moving average. "
+    "Support sits near 180 and resistance near 195.\n"
+    "## Risk Assessment\n"
+    "Volatility is moderate; the main risk is concentration in iPhone revenue."
+)
+
+
+def ask(stub, ticker, question, context=CONTEXT):
+    """routed_chat (what app.run_chat runs) with the chat crews answered by the stub
+
+    Returns (text, timed_out, model info, events sent to the sink, per-model usage).
+    """
+    events = []
+    usage_by_model = {}
+
+    def kickoff(tier, timeout, report):
+        model = SMALL_MODEL if tier == "small" else LARGE_MODEL
+        answer, usage = stub.complete(model, f"{context}\n\nQuestion: {question}")
+        usage_by_model[model] = {"prompt_tokens": usage["prompt_tokens"],
+                                 "completion_tokens": usage["completion_tokens"]}
+        report["seconds"] = report.get("seconds", 0.0) + 0.01
+        counts = report.setdefault("usage", {}).setdefault(
+            model, {"prompt_tokens": 0, "completion_tokens": 0, "estimated": False})
+        counts["prompt_tokens"] += usage["prompt_tokens"]
+        counts["completion_tokens"] += usage["completion_tokens"]
+        return answer, False
+
+    text, timed_out, info = routed_chat(ticker, question, context, kickoff, timeout=30,
+                                        sink=lambda event, data: events.append(event))
+    return text, timed_out, info, events, usage_by_model
+
+
+def chat_route_stats(tier):
+    """Cumulative router_stats() counters for chat requests routed to a tier"""
+    entry = router_stats()["routes"].get("chat", {}).get(tier, {})
+    return {key: entry.get(key, 0) for key in ("requests", "escalations", "prompt_tokens", "completion_tokens")}
+
+
+@pytest.fixture
+def stub():
+    with StubLLM() as server:
+        yield server
+
+
+def test_question_covered_by_context_goes_to_small_model(stub):
+    before = chat_route_stats("small")
+    text, timed_out, info, events, usage = ask(stub, "AAPL", "What does the RSI reading say about momentum?")
+    assert stub.requested == [SMALL_MODEL]
+    assert f"[{SMALL_MODEL}]" in text
+    assert not timed_out
+    assert (info["tier"], info["model"], info["escalated"]) == ("small", SMALL_MODEL, False)
+    assert events == []
+    after = chat_route_stats("small")
+    assert after["requests"] == before["requests"] + 1
+    assert after["escalations"] == before["escalations"]
+    assert after["prompt_tokens"] == before["prompt_tokens"] + usage[SMALL_MODEL]["prompt_tokens"]
+
+
+def test_comparison_goes_to_large_model(stub):
+    before = chat_route_stats("large")
+    text, _, info, _, _ = ask(stub, "AAPL", "Compare AAPL momentum versus MSFT")
+    assert stub.requested == [LARGE_MODEL]
+    assert f"[{LARGE_MODEL}]" in text
+    assert info["tier"] == "large"
+    assert info["reason"].startswith("needs deeper analysis")
+    assert chat_route_stats("large")["requests"] == before["requests"] + 1
+
+
+@pytest.mark.parametrize("question", [
+    "What's the RSI today?",
+    "Any breaking news on the stock?",
+    "Where is the current price relative to support?",
+])
+def test_fresh_info_words_go_to_large_model(stub, question):
+    _, _, info, _, _ = ask(stub, "AAPL", question)
+    assert stub.requested == [LARGE_MODEL]
+    assert info["tier"] == "large"
+    assert info["reason"].startswith("needs fresh information")
+
+
+def test_low_context_coverage_goes_to_large_model(stub):
+    _, _, info, _, _ = ask(stub, "AAPL", "How large is the dividend payout ratio and buyback program?")
+    assert stub.requested == [LARGE_MODEL]
+    assert info["tier"] == "large"
+    assert info["reason"].startswith("low context coverage")
+
+
+def test_missing_context_goes_to_large_model(stub):
+    _, _, info, _, _ = ask(stub, "AAPL", "What does the RSI reading say?", context="No preloaded analysis available.")
+    assert stub.requested == [LARGE_MODEL]
+    assert info["reason"] == "no analysis context"
+
+
+def test_hedging_small_answer_escalates_to_large_model():
+    before = chat_route_stats("small")
+    with StubLLM(escalate_model=SMALL_MODEL) as stub:
+        text, timed_out, info, events, usage = ask(stub, "AAPL", "What does the RSI reading say about momentum?")
+    assert stub.requested == [SMALL_MODEL, LARGE_MODEL]
+    assert f"[{LARGE_MODEL}]" in text
+    assert not timed_out
+    assert events == ["escalated"]
+    assert info["tier"] == "small"
+    assert info["escalated"]
+    assert info["model"] == ", ".join(sorted([SMALL_MODEL, LARGE_MODEL]))
+    after = chat_route_stats("small")
+    assert after["requests"] == before["requests"] + 1
+    assert after["escalations"] == before["escalations"] + 1
+    assert after["completion_tokens"] == before["completion_tokens"] + sum(
+        counts["completion_tokens"] for counts in usage.values())
+
+
+def test_needs_escalation_only_near_the_start():
+    assert needs_escalation("NEEDS_RESEARCH")
+    assert not needs_escalation("RSI is 62, momentum is positive.")
+    assert not needs_escalation("x" * 300 + "NEEDS_RESEARCH")
+
+
+def test_cost_of_small_model_answer(stub):
+    _, _, info, _, usage = ask(stub, "AAPL", "What does the RSI reading say about momentum?")
+    price_in, price_out = MODEL_PRICES[SMALL_MODEL]
+    counts = usage[SMALL_MODEL]
+    expected = (counts["prompt_tokens"] * price_in + counts["completion_tokens"] * price_out) / 1e6
+    assert expected > 0
+    assert info["cost_usd"] == pytest.approx(round(expected, 6))
+
+
+def test_cost_of_escalated_answer_includes_both_models():
+    with StubLLM(escalate_model=SMALL_MODEL) as stub:
+        _, _, info, _, usage = ask(stub, "AAPL", "What does the RSI reading say about momentum?")
+    assert info["cost_usd"] == pytest.approx(round(
+        request_cost({SMALL_MODEL: usage[SMALL_MODEL]}) + request_cost({LARGE_MODEL: usage[LARGE_MODEL]}), 6))
+    assert info["cost_usd"] > request_cost({SMALL_MODEL: usage[SMALL_MODEL]})
+
+
+def test_request_cost_matches_dated_and_unknown_models():
+    usage = {"prompt_tokens": 1_000_000, "completion_tokens": 1_000_000}
+    assert request_cost({"gpt-4o-mini-2024-07-18": usage}) == pytest.approx(sum(MODEL_PRICES["gpt-4o-mini"]))
+    assert request_cost({"local-model": usage}) == 0.0
@@ -0,0 +1,286 @@
+# =====================================================================
+# tool_cache.py - Shared Cache for Search and Scrape Tool Calls
+# =====================================================================
+#
+# Agents of different crews issue near-identical searches and read the
+# same pages within seconds of each other. Tool results are cached under a
+# sha256 of the normalized request (query words or canonical URL), first in
+# a bounded in-memory LRU and then in a size-bounded SQLite file, with TTLs
+# chosen per source. Concurrent identical calls share one upstream request.
+#
+# Configuration:
+#   TOOL_CACHE_PATH, TOOL_CACHE_MEMORY_ENTRIES, TOOL_CACHE_DISK_MB,
+#   TOOL_CACHE_SEARCH_TTL, TOOL_CACHE_NEWS_TTL, TOOL_CACHE_SCRAPE_TTL
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from market_data import SingleFlight
+from metrics import histogram
+
+TOOL_CACHE_PATH = os.getenv(
+    "TOOL_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "tool_cache.sqlite")
+)
+TOOL_CACHE_MEMORY_ENTRIES = int(os.getenv("TOOL_CACHE_MEMORY_ENTRIES", "512"))
+TOOL_CACHE_DISK_BYTES = int(float(os.getenv("TOOL_CACHE_DISK_MB", "200")) * 1024 * 1024)
+
+SEARCH_TTL = int(os.getenv("TOOL_CACHE_SEARCH_TTL", "3600"))
+# Searches asking for recent news go stale faster
+NEWS_TTL = int(os.getenv("TOOL_CACHE_NEWS_TTL", "900"))
+SCRAPE_TTL = int(os.getenv("TOOL_CACHE_SCRAPE_TTL", "1800"))
+# Per-domain scrape TTLs (seconds); subdomains match their parent entry
+SCRAPE_DOMAIN_TTLS = {
+    "cnbc.com": NEWS_TTL,
+    "reuters.com": NEWS_TTL,
+    "bloomberg.com": NEWS_TTL,
+    "marketwatch.com": NEWS_TTL,
+    "finance.yahoo.com": NEWS_TTL,
+    "seekingalpha.com": SCRAPE_TTL,
+    "investopedia.com": 7 * 86400,
+    "wikipedia.org": 7 * 86400,
+}
+
+TOOL_CALL_SECONDS = histogram(
+    "tool_call_seconds", "Search/scrape tool call latency by source (cache, upstream, error)",
+    ["kind", "source"]
+)
+
+NEWS_WORDS = {"news", "today", "latest", "breaking", "headlines", "recent"}
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|gclid|fbclid|guccounter|guce_\w+|mc_cid|mc_eid|ref|cmpid)$", re.I)
+
+
+def normalize_query(query):
+    """Order-insensitive form of a search query: lowercase unique words, sorted"""
+    words = re.findall(r"[\w$.&'-]+", str(query).lower())
+    return " ".join(sorted(set(w.strip(".'-") for w in words) - {""}))
+
+
+def normalize_url(url):
+    """Canonical URL: lowercase scheme/host, no fragment, tracking params or trailing slash"""
+    parts = urlsplit(str(url).strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if not TRACKING_PARAMS.match(k)))
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(((parts.scheme or "https").lower(), host, path, query, ""))
+
+
+def search_ttl(normalized_query):
+    return NEWS_TTL if set(normalized_query.split()) & NEWS_WORDS else SEARCH_TTL
+
+
+def scrape_ttl(normalized_url):
+    host = urlsplit(normalized_url).netloc
+    for domain, ttl in SCRAPE_DOMAIN_TTLS.items():
+        if host == domain or host.endswith("." + domain):
+            return ttl
+    return SCRAPE_TTL
+
+
+def cache_key(kind, normalized):
+    return hashlib.sha256(f"{kind}\n{normalized}".encode("utf-8")).hexdigest()
+
+
+class ToolCache:
+    """Two-level (memory LRU, then SQLite) cache of tool results with expiry"""
+
+    def __init__(self, path=TOOL_CACHE_PATH, memory_entries=TOOL_CACHE_MEMORY_ENTRIES,
+                 disk_bytes=TOOL_CACHE_DISK_BYTES):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.disk_bytes = disk_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._stats = {}
+        with self._write_lock:
+            conn = self._conn()
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tool_cache (
+                    key TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS tool_cache_accessed ON tool_cache (accessed_at);
+            """)
+            conn.commit()
+
+    def _conn(self):
+        """One connection per thread; SQLite connections are not shareable"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, kind, stat, amount=1):
+        with self._lock:
+            counters = self._stats.setdefault(kind, {
+                "memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evicted": 0
+            })
+            counters[stat] += amount
+
+    def _remember(self, key, value, expires_at):
+        with self._lock:
+            self._memory[key] = (value, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, kind, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[1] > now:
+                self._memory.move_to_end(key)
+        if entry is not None and entry[1] > now:
+            self._count(kind, "memory_hits")
+            return entry[0]
+
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM tool_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] <= now:
+            self._count(kind, "misses")
+            return None
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute("UPDATE tool_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+        self._remember(key, row[0], row[1])
+        self._count(kind, "disk_hits")
+        return row[0]
+
+    def put(self, kind, key, value, ttl):
+        now = time.time()
+        expires_at = now + ttl
+        self._remember(key, value, expires_at)
+        size = len(value.encode("utf-8"))
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO tool_cache VALUES (?, ?, ?, ?, ?, ?)",
+                (key, kind, value, size, expires_at, now)
+            )
+            evicted = conn.execute("DELETE FROM tool_cache WHERE expires_at <= ?", (now,)).rowcount
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM tool_cache").fetchone()[0]
+            if total > self.disk_bytes:
+                # Drop least recently used entries until back under the byte budget
+                rows = conn.execute("SELECT key, size FROM tool_cache ORDER BY accessed_at").fetchall()
+                victims = []
+                for victim, victim_size in rows:
+                    if total <= self.disk_bytes:
+                        break
+                    victims.append((victim,))
+                    total -= victim_size
+                conn.executemany("DELETE FROM tool_cache WHERE key = ?", victims)
+                evicted += len(victims)
+            conn.commit()
+        self._count(kind, "writes")
+        if evicted > 0:
+            self._count(kind, "evicted", evicted)
+
+    def stats(self):
+        with self._lock:
+            stats = {kind: dict(counters) for kind, counters in self._stats.items()}
+            memory = len(self._memory)
+        for counters in stats.values():
+            lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+            counters["hit_rate"] = round((lookups - counters["misses"]) / lookups, 3) if lookups else None
+        entries, size = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM tool_cache"
+        ).fetchone()
+        return {
+            "kinds": stats,
+            "memory_entries": memory,
+            "memory_capacity": self.memory_entries,
+            "disk_entries": entries,
+            "disk_bytes": size,
+            "disk_capacity_bytes": self.disk_bytes,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+_flight = SingleFlight()
+
+
+def get_tool_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ToolCache()
+    return _cache
+
+
+def cached_tool_call(kind, normalized, ttl, fetch):
+    """Return the cached result for (kind, normalized request) or call fetch().
+
+    Only non-empty string results are stored, so provider errors and empty
+    pages are retried on the next call. Concurrent misses share one fetch().
+    """
+    started = time.monotonic()
+    cache = get_tool_cache()
+    key = cache_key(kind, normalized)
+    try:
+        value = cache.get(kind, key)
+    except Exception as e:
+        print(f"Tool cache read failed for {kind}: {e}")
+        value = None
+    if value is not None:
+        TOOL_CALL_SECONDS.observe(time.monotonic() - started, kind=kind, source="cache")
+        return value
+
+    def load():
+        result = fetch()
+        if isinstance(result, str) and result.strip():
+            try:
+                cache.put(kind, key, result, ttl)
+            except Exception as e:
+                print(f"Tool cache write failed for {kind}: {e}")
+        return result
+
+    source = "error"
+    try:
+        result = _flight.do((key, kind), load)
+        if isinstance(result, str) and result.strip():
+            source = "upstream"
+        return result
+    finally:
+        TOOL_CALL_SECONDS.observe(time.monotonic() - started, kind=kind, source=source)
+
+
+def cached_search(query, fetch, **options):
+    """Search through the cache; options (result count, locale...) are part of the key"""
+    normalized = normalize_query(query)
+    if options:
+        normalized += " |" + " ".join(f"{k}={v}" for k, v in sorted(options.items()))
+    return cached_tool_call("search", normalized, search_ttl(normalized), fetch)
+
+
+def cached_scrape(url, fetch):
+    normalized = normalize_url(url)
+    return cached_tool_call("scrape", normalized, scrape_ttl(normalized), fetch)
+
+
+def tool_cache_stats():
+    stats = get_tool_cache().stats()
+    stats["in_flight"] = _flight.stats()
+    return stats